@@ -0,0 +1,266 @@
+"""
+Admission control for the render endpoints.
+
+Renders are admitted against a budget of tags in flight rather than a
+number of requests, since a 10,000 row catalog takes as long as a hundred
+small ones. A render that does not fit waits up to ADMISSION_WAIT seconds
+for the renders ahead of it to finish, with at most ADMISSION_QUEUE_LIMIT
+renders waiting; past that, or once the wait is over, the request is
+refused with 429 Too Many Requests and a Retry-After of the seconds the
+tags in flight take to draw at ADMISSION_TAGS_PER_SECOND. Every client may
+also have at most CLIENT_CONCURRENCY renders in flight or waiting, so one
+branch sending its catalogs in parallel cannot take the whole budget.
+
+A catalog larger than the whole budget is refused outright, with 413
+Content Too Large, since it would never fit.
+
+The budget is kept in shared memory created at import time. Under gunicorn
+--preload that is in the master, before forking, so all workers share one
+budget; workers that import the app themselves each have a budget of their
+own. Every slot records the process holding it, so the tags of a worker
+that is killed mid-render, such as by the gunicorn timeout, are returned to
+the budget the next time it is checked.
+"""
+
+import contextlib
+import math
+import multiprocessing
+import os
+import time
+import zlib
+
+# Tags all renders in flight may add up to
+RENDER_BUDGET_TAGS = int(os.environ.get("RENDER_BUDGET_TAGS", 20000))
+# Renders of one client in flight or waiting
+CLIENT_CONCURRENCY = int(os.environ.get("CLIENT_CONCURRENCY", 2))
+# Renders waiting for room in the budget, and seconds each may wait
+ADMISSION_QUEUE_LIMIT = int(os.environ.get("ADMISSION_QUEUE_LIMIT", 8))
+ADMISSION_WAIT = float(os.environ.get("ADMISSION_WAIT", 2))
+# Drawing rate of one worker, from benchmark.py, for Retry-After
+ADMISSION_TAGS_PER_SECOND = int(os.environ.get("ADMISSION_TAGS_PER_SECOND", 3000))
+# Renders in flight or waiting that can be tracked at once
+ADMISSION_SLOTS = 256
+
+# The slot states
+FREE = 0
+WAITING = 1
+RUNNING = 2
+
+
+class Overloaded(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TooLarge(Exception):
+    pass
+
+
+def client_id(client):
+    # A non-zero number per client, shared by all workers
+    return zlib.crc32(client.encode("utf8")) or 1
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Taken by a process of another user, so not ours any more
+        return False
+    return True
+
+
+class AdmissionControl:
+    """
+    Admits renders within the tag budget and the per-client limits.
+    """
+
+    def __init__(
+        self,
+        budget=RENDER_BUDGET_TAGS,
+        client_concurrency=CLIENT_CONCURRENCY,
+        queue_limit=ADMISSION_QUEUE_LIMIT,
+        wait=ADMISSION_WAIT,
+        tags_per_second=ADMISSION_TAGS_PER_SECOND,
+        slots=ADMISSION_SLOTS,
+    ):
+        """
+        :param budget: The tags all renders in flight may add up to.
+        :param client_concurrency: The most renders of one client in flight
+            or waiting.
+        :param queue_limit: The most renders waiting for room in the budget.
+        :param wait: The seconds a render may wait for room.
+        :param tags_per_second: The drawing rate Retry-After is estimated
+            with.
+        :param slots: The most renders in flight or waiting at once.
+        """
+        self.budget = budget
+        self.client_concurrency = client_concurrency
+        self.queue_limit = queue_limit
+        self.wait = wait
+        self.tags_per_second = tags_per_second
+        # Forked, so the workers of a preloaded app share them
+        context = multiprocessing.get_context("fork")
+        self._condition = context.Condition()
+        # Per slot: its state, the process holding it, the client, the tags
+        # it was admitted for and when it started waiting, so waiting
+        # renders are admitted in order
+        self._states = context.RawArray("b", slots)
+        self._owners = context.RawArray("q", slots)
+        self._clients = context.RawArray("L", slots)
+        self._tags = context.RawArray("q", slots)
+        self._arrivals = context.RawArray("q", slots)
+        self._arrived = context.RawValue("q", 0)
+
+    def _slots(self, state=None, client=None):
+        return [
+            slot
+            for slot in range(len(self._states))
+            if self._states[slot] != FREE
+            and (state is None or self._states[slot] == state)
+            and (client is None or self._clients[slot] == client)
+        ]
+
+    def _in_flight(self):
+        return sum(self._tags[slot] for slot in self._slots(RUNNING))
+
+    def _retry_after(self, tags):
+        return max(1, math.ceil(tags / self.tags_per_second))
+
+    def _fits(self, tags):
+        return self._in_flight() + tags <= self.budget
+
+    def _reclaim(self):
+        # Frees the slots of workers that died without releasing them
+        reclaimed = False
+        for slot in self._slots():
+            if not _alive(self._owners[slot]):
+                self._states[slot] = FREE
+                self._tags[slot] = 0
+                reclaimed = True
+        if reclaimed:
+            self._condition.notify_all()
+
+    def _take_slot(self, state, client, tags):
+        for slot in range(len(self._states)):
+            if self._states[slot] == FREE:
+                self._states[slot] = state
+                self._owners[slot] = os.getpid()
+                self._clients[slot] = client
+                self._tags[slot] = tags
+                self._arrived.value += 1
+                self._arrivals[slot] = self._arrived.value
+                return slot
+        return None
+
+    def acquire(self, client, tags):
+        """
+        Admits a render, waiting for room in the budget if need be.
+
+        :param client: The client the request came from, such as its address.
+        :param tags: The estimated tags of the render.
+        :return: The slot to release once the render is done.
+        :raises TooLarge: When the render is larger than the whole budget.
+        :raises Overloaded: When the render is not admitted.
+        """
+        if tags > self.budget:
+            raise TooLarge(
+                f"The catalog has {tags} tags, more than the {self.budget} "
+                "that can be rendered at once"
+            )
+        client = client_id(client)
+        deadline = time.monotonic() + self.wait
+        with self._condition:
+            self._reclaim()
+            mine = self._slots(client=client)
+            if len(mine) >= self.client_concurrency:
+                pending = sum(self._tags[slot] for slot in mine)
+                raise Overloaded(
+                    f"{len(mine)} renders of this client are already in progress",
+                    self._retry_after(pending),
+                )
+
+            if self._fits(tags) and not self._slots(WAITING):
+                slot = self._take_slot(RUNNING, client, tags)
+                if slot is not None:
+                    return slot
+            waiting = len(self._slots(WAITING))
+            if waiting >= self.queue_limit:
+                raise Overloaded(
+                    f"{waiting} renders are already waiting",
+                    self._retry_after(self._in_flight() + tags - self.budget),
+                )
+            slot = self._take_slot(WAITING, client, tags)
+            if slot is None:
+                raise Overloaded(
+                    "Too many renders in progress", self._retry_after(tags)
+                )
+
+            # Admitted in the order they came, so a large catalog is not
+            # passed over by small ones for as long as they keep coming
+            while not (self._fits(tags) and self._first_waiting() == slot):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._release(slot)
+                    raise Overloaded(
+                        f"The render budget of {self.budget} tags is in use",
+                        self._retry_after(self._in_flight() + tags - self.budget),
+                    )
+                self._condition.wait(remaining)
+                self._reclaim()
+            self._states[slot] = RUNNING
+            # The next waiting render may fit as well
+            self._condition.notify_all()
+            return slot
+
+    def _first_waiting(self):
+        return min(self._slots(WAITING), key=self._arrivals.__getitem__)
+
+    def _release(self, slot):
+        self._states[slot] = FREE
+        self._tags[slot] = 0
+        self._condition.notify_all()
+
+    def release(self, slot):
+        with self._condition:
+            self._release(slot)
+
+    @contextlib.contextmanager
+    def admit(self, client, tags):
+        """
+        Holds the tags of a render in the budget while it runs.
+
+        :raises TooLarge, Overloaded: When the render is not admitted, see
+            acquire.
+        """
+        slot = self.acquire(client, tags)
+        try:
+            yield
+        finally:
+            self.release(slot)
+
+    def status(self):
+        """
+        :return: The budget, what is in flight and the renders waiting, as a
+            JSON serializable dict.
+        """
+        with self._condition:
+            self._reclaim()
+            running = self._slots(RUNNING)
+            waiting = self._slots(WAITING)
+            in_flight = self._in_flight()
+            clients = {self._clients[slot] for slot in running + waiting}
+            return {
+                "budget_tags": self.budget,
+                "in_flight_tags": in_flight,
+                "available_tags": max(0, self.budget - in_flight),
+                "renders": len(running),
+                "waiting": len(waiting),
+                "waiting_tags": sum(self._tags[slot] for slot in waiting),
+                "queue_limit": self.queue_limit,
+                "clients": len(clients),
+                "client_concurrency": self.client_concurrency,
+            }
@@ -1,52 +1,585 @@
-from flask import Flask, request, send_file
+import functools
+import io
+import itertools
+import os
+import re
+import time
+import zipfile
+
+# Counted into the warm start time reported at boot and by /ready
+BOOT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, jsonify, request, send_file
+from admission import AdmissionControl, Overloaded, TooLarge
 from bot import (
+    generate_batch,
     generate_children_pdf,
     generate_kids_pdf,
-    process_csv,
     generate_pdf,
+    tag_variant,
+    template_draw_tag,
 )  # Import your existing functions
+from assets import asset_version
+from cache import RenderCache, render_key
+from ingest import read_catalog
+from jobs import DONE, FAILED, JobRunner, QueueFull
+from pages import (
+    PAGE_MANIFEST_DIR,
+    PAGE_MANIFEST_DISK_BYTES,
+    PAGE_MANIFEST_MEMORY_BYTES,
+    PageSelection,
+    load_manifest,
+    save_manifest,
+)
+from preview import (
+    MAX_PREVIEW_DPI,
+    MAX_PREVIEW_ROWS,
+    MIN_PREVIEW_DPI,
+    PREVIEW_CACHE_BYTES,
+    PREVIEW_DPI,
+    can_preview,
+    preview_key,
+    render_preview,
+)
+from profiles import get_profile
+from stream import iter_file
+from telemetry import ENABLED as METRICS_ENABLED
+from telemetry import count, expose, phase, track_request, track_send
+from upload import UploadError, read_batch_upload, read_csv_upload
+from validation import count_rows, validate_csv
+from warmup import WARM_START, WARMUP, warm_up
 
 app = Flask(__name__)
+render_cache = RenderCache()
+page_manifests = RenderCache(
+    PAGE_MANIFEST_MEMORY_BYTES, PAGE_MANIFEST_DISK_BYTES, PAGE_MANIFEST_DIR, ".pages"
+)
+# Previews are cheap to draw again, so they are only kept in memory
+preview_cache = RenderCache(PREVIEW_CACHE_BYTES, 0, suffix=".png")
+job_runner = JobRunner()
+# Created before gunicorn forks, so all workers share the render budget
+admission = AdmissionControl()
 
+# Generator of every template a render job can ask for
+TEMPLATES = {
+    "regular": generate_pdf,
+    "kids": generate_kids_pdf,
+    "children": generate_children_pdf,
+}
 
-@app.route("/handle_csv", methods=["POST"])
-def handle_csv():
-    csv_data = request.form.get("data")
-    if not csv_data:
-        return "No CSV data received", 400
+# An ETag as sent by render_csv
+RENDER_KEY = re.compile(r"[0-9a-f]{64}")
+
+# Under gunicorn --preload this runs once in the master, before forking
+if WARM_START:
+    warm_up(BOOT_STARTED)
+
+
+def wants_stream():
+    # Streamed responses are sent in blocks from a spooled temporary file
+    return request.values.get("stream", "").lower() in ("1", "true", "yes")
+
+
+def wants_strict():
+    # Catalogs with problems are refused before any render time is spent
+    return request.values.get("strict", "").lower() in ("1", "true", "yes")
+
+
+def requested_profile():
+    # The output profile, or None with the request naming an unknown one
+    try:
+        return get_profile(request.values.get("profile"))
+    except KeyError:
+        return None
 
-    dataframe = process_csv(csv_data)
-    if dataframe is None:
-        return "Failed to process CSV", 400
 
-    pdf = generate_pdf(dataframe)
+def requested_since():
+    # The ETag of an earlier render, quoted as in the header or not
+    return request.values.get("since", "").strip().strip('"')
 
+
+def request_client():
+    # The address the request came from; a proxy in front of the app, such
+    # as the Heroku router, appends it to X-Forwarded-For
+    forwarded = request.headers.get("X-Forwarded-For", "")
+    return forwarded.rsplit(",", 1)[-1].strip() or request.remote_addr or ""
+
+
+def not_admitted(e):
+    # The response to a render refused by admission control
+    if isinstance(e, TooLarge):
+        return str(e), 413
+    return str(e), 429, {"Retry-After": str(e.retry_after)}
+
+
+def with_changed_pages(response, pages, etag):
+    # Numbered as in the full document of the new version
+    response.headers["X-Changed-Pages"] = ",".join(
+        str(page + 1) for page in pages.changed
+    )
+    response.headers["X-Page-Count"] = str(len(pages.page_keys))
+    # To be sent as since= with the next version
+    response.headers["X-Catalog-Version"] = etag
+    return response
+
+
+def with_report(response, report):
+    # The full report is served by /validate
+    if report.problem_count:
+        response.headers["X-Catalog-Problems"] = report.summary()
+    return response
+
+
+def send_pdf(pdf, stream=False, etag=None):
+    if stream:
+        headers = {"Content-Disposition": "attachment; filename=generated.pdf"}
+        if etag:
+            headers["ETag"] = f'"{etag}"'
+        return Response(iter_file(pdf), mimetype="application/pdf", headers=headers)
+
+    count("bytes", pdf.getbuffer().nbytes)
     return send_file(
         pdf,
         mimetype="application/pdf",
         as_attachment=True,
         download_name="generated.pdf",
+        etag=etag or False,
     )
 
 
+def send_zip(zip_file, etag=None, download_name="generated.zip"):
+    count("bytes", zip_file.getbuffer().nbytes)
+    return send_file(
+        zip_file,
+        mimetype="application/zip",
+        as_attachment=True,
+        download_name=download_name,
+        etag=etag or False,
+    )
+
+
+def instrumented(view):
+    """
+    Records the phase timings and counts of every request to the view,
+    labelled with its endpoint, for /metrics.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with track_request(request.endpoint) as record:
+            response = app.make_response(view(*args, **kwargs))
+            if record is not None:
+                record.status = response.status_code
+        # The body is written once the view has returned
+        return track_send(response, request.endpoint)
+
+    return wrapper
+
+
+def render_csv(template, generate):
+    """
+    Renders the posted CSV with the given generator, answering repeated
+    requests for the same catalog from the render cache.
+
+    With since=<ETag of an earlier render> only the pages that changed
+    since that render are sent, listed in the X-Changed-Pages header, or
+    204 No Content if none did.
+
+    Renders are admitted within the tag budget of admission.py, and refused
+    with 429 Too Many Requests when there is no room for them, or 413 when
+    they are larger than the whole budget.
+
+    :param template: The template name, part of the cache key.
+    :param generate: The generate_*pdf function to render with.
+    """
+    with phase("decode"):
+        try:
+            csv_data = read_csv_upload(request)
+        except UploadError as e:
+            return str(e), e.status
+    if not csv_data:
+        return "No CSV data received", 400
+    profile = requested_profile()
+    if profile is None:
+        return f"Unknown profile '{request.values.get('profile')}'", 400
+    since = requested_since()
+    if since and not RENDER_KEY.fullmatch(since):
+        return f"Invalid since '{since}', expected an ETag", 400
+
+    # The key only depends on the request, so a matching ETag needs no render
+    version = asset_version()
+    etag = render_key(csv_data, template, version, profile.name)
+    if not since and etag in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    with phase("validate"):
+        report = validate_csv(csv_data, template)
+    if report is None:
+        return "Failed to process CSV", 400
+    if report.problem_count and wants_strict():
+        return jsonify(report.to_dict()), 422
+
+    pdf_data = render_cache.get(etag) if not since else None
+    if pdf_data is not None:
+        return with_report(send_pdf(io.BytesIO(pdf_data), etag=etag), report)
+
+    # Only the header is read here, the rows are parsed as they are drawn
+    with phase("parse"):
+        catalog = read_catalog(csv_data)
+    if catalog is None:
+        return "Failed to process CSV", 400
+
+    stream = wants_stream()
+    # Pages are fingerprinted as they are drawn, so every render keeps its
+    # manifest for a later since= without reading the catalog ahead
+    if since:
+        previous = load_manifest(page_manifests, since)
+        pages = PageSelection(version, previous, changed_only=True)
+    else:
+        pages = PageSelection(version)
+    try:
+        # Every tag is counted, even those of unchanged pages that are skipped
+        with admission.admit(request_client(), report.tags):
+            pdf = generate(catalog, stream=stream, profile=profile, pages=pages)
+    except (TooLarge, Overloaded) as e:
+        return not_admitted(e)
+    save_manifest(page_manifests, etag, pages.page_keys)
+
+    if since:
+        if pages.changed:
+            response = send_pdf(pdf, stream)
+        else:
+            pdf.close()
+            response = Response(status=204)
+        return with_report(with_changed_pages(response, pages, etag), report)
+
+    if not stream:
+        render_cache.put(etag, pdf.getvalue())
+    return with_report(send_pdf(pdf, stream, etag), report)
+
+
+@app.route("/handle_csv", methods=["POST"])
+@instrumented
+def handle_csv():
+    return render_csv("regular", generate_pdf)
+
+
 @app.route("/handle_csv_children", methods=["POST"])
+@instrumented
 def handle_csv_children():
-    csv_data = request.form.get("data")
+    return render_csv("kids", generate_kids_pdf)
+
+
+def render_job(csv_data, template, profile, version, etag, slot):
+    def render(job):
+        # The job holds its tags in the render budget until it is done
+        try:
+            render_job_pdf(job)
+        finally:
+            admission.release(slot)
+
+    def render_job_pdf(job):
+        job.etag = etag
+        if render_cache.get(etag) is not None:
+            return
+
+        catalog = read_catalog(csv_data)
+        if catalog is None:
+            raise ValueError("Failed to process CSV")
+
+        generate = TEMPLATES[template]
+        # Kept so a later render can ask for the pages changed since this one
+        pages = PageSelection(version)
+        pdf_file = generate(
+            catalog, progress=job.progress, profile=profile, pages=pages
+        )
+        save_manifest(page_manifests, etag, pages.page_keys)
+        # Served from the render cache by whichever worker is asked for it
+        render_cache.put(etag, pdf_file.getvalue())
+
+    return render
+
+
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    try:
+        csv_data = read_csv_upload(request)
+    except UploadError as e:
+        return str(e), e.status
     if not csv_data:
         return "No CSV data received", 400
 
-    dataframe = process_csv(csv_data)
-    if dataframe is None:
+    template = request.values.get("template", "regular")
+    if template not in TEMPLATES:
+        return f"Unknown template '{template}'", 400
+    profile = requested_profile()
+    if profile is None:
+        return f"Unknown profile '{request.values.get('profile')}'", 400
+
+    report = validate_csv(csv_data, template)
+    if report is None:
         return "Failed to process CSV", 400
+    if report.problem_count and wants_strict():
+        return jsonify(report.to_dict()), 422
 
-    pdf = generate_kids_pdf(dataframe)
+    version = asset_version()
+    etag = render_key(csv_data, template, version, profile.name)
+    try:
+        slot = admission.acquire(request_client(), report.tags)
+    except (TooLarge, Overloaded) as e:
+        return not_admitted(e)
+    try:
+        job = job_runner.submit(
+            template,
+            render_job(csv_data, template, profile, version, etag, slot),
+            report.counts,
+        )
+    except QueueFull as e:
+        admission.release(slot)
+        return str(e), 503
 
-    return send_file(
-        pdf,
-        mimetype="application/pdf",
-        as_attachment=True,
-        download_name="generated.pdf",
-    )
+    return jsonify(job.to_dict()), 202, {"Location": f"/jobs/{job.id}"}
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """
+    Reports the status and progress of a render job, or sends its PDF once
+    it is done.
+    """
+    job = job_runner.get(job_id)
+    if job is None:
+        return "Unknown or expired job", 404
+
+    if job.status == DONE:
+        pdf_data = render_cache.get(job.etag)
+        if pdf_data is None:
+            return "The PDF of the job is no longer cached", 410
+        return send_pdf(io.BytesIO(pdf_data), etag=job.etag)
+    if job.status == FAILED:
+        return jsonify(job.to_dict()), 500
+    return jsonify(job.to_dict()), 202
+
+
+def render_zip(parts, keys, profile):
+    # Every catalog is its own PDF, shared with the single catalog endpoints
+    # through the render cache
+    zip_file = io.BytesIO()
+    # The PDFs are compressed already
+    with zipfile.ZipFile(zip_file, "w", zipfile.ZIP_STORED) as archive:
+        for (template, name, csv_data), key in zip(parts, keys):
+            pdf_data = render_cache.get(key)
+            if pdf_data is None:
+                with phase("parse"):
+                    catalog = read_catalog(csv_data)
+                pdf_file = TEMPLATES[template](catalog, profile=profile)
+                pdf_data = pdf_file.getvalue()
+                render_cache.put(key, pdf_data)
+            archive.writestr(f"{name}.pdf", pdf_data)
+    zip_file.seek(0)
+    return zip_file
+
+
+@app.route("/batch", methods=["POST"])
+@instrumented
+def batch():
+    """
+    Renders several catalogs in one request. Every catalog is a file part
+    of a multipart form, posted under the name of its template, such as
+    -F regular=@adult.csv -F kids=@kids.csv.
+
+    The catalogs are drawn into one PDF, each starting on a new page, with
+    the logos and fonts embedded once, or with output=zip into a zip of one
+    PDF per catalog, named after its file.
+    """
+    with phase("decode"):
+        try:
+            parts = read_batch_upload(request)
+        except UploadError as e:
+            return str(e), e.status
+    if not parts:
+        return "No CSV data received", 400
+    for template, name, _ in parts:
+        if template not in TEMPLATES:
+            return f"Unknown template '{template}' for '{name}'", 400
+    profile = requested_profile()
+    if profile is None:
+        return f"Unknown profile '{request.values.get('profile')}'", 400
+    output = request.values.get("output", "pdf")
+    if output not in ("pdf", "zip"):
+        return f"Unknown output '{output}', expected pdf or zip", 400
+
+    # One asset version for every catalog of the batch
+    version = asset_version()
+    keys = [
+        render_key(csv_data, template, version, profile.name)
+        for template, _, csv_data in parts
+    ]
+    etag = render_key("", f"batch.{output}", *keys)
+    if etag in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    with phase("validate"):
+        reports = {
+            name: validate_csv(csv_data, template) for template, name, csv_data in parts
+        }
+    for name, report in reports.items():
+        if report is None:
+            return f"Failed to process CSV '{name}'", 400
+    problems = {name: r for name, r in reports.items() if r.problem_count}
+    if problems and wants_strict():
+        return jsonify({name: r.to_dict() for name, r in problems.items()}), 422
+
+    # The catalogs of a batch are admitted together, as one render
+    tags = sum(report.tags for report in reports.values())
+    try:
+        if output == "zip":
+            with admission.admit(request_client(), tags):
+                zip_file = render_zip(parts, keys, profile)
+            response = send_zip(zip_file, etag)
+        else:
+            pdf_data = render_cache.get(etag)
+            if pdf_data is None:
+                with phase("parse"):
+                    catalogs = [
+                        (template, read_catalog(csv_data))
+                        for template, _, csv_data in parts
+                    ]
+                with admission.admit(request_client(), tags):
+                    pdf_data = generate_batch(catalogs, profile=profile).getvalue()
+                render_cache.put(etag, pdf_data)
+            response = send_pdf(io.BytesIO(pdf_data), etag=etag)
+    except (TooLarge, Overloaded) as e:
+        return not_admitted(e)
+
+    if problems:
+        response.headers["X-Catalog-Problems"] = "; ".join(
+            f"{name}: {r.summary()}" for name, r in problems.items()
+        )
+    return response
+
+
+def preview_png(draw_tag, tag, dpi, version):
+    key = preview_key(draw_tag, tag, dpi, version)
+    png = preview_cache.get(key)
+    if png is None:
+        with phase("draw"):
+            png = render_preview(
+                draw_tag, tag, tag_variant(draw_tag, tag), dpi, version
+            )
+        preview_cache.put(key, png)
+    return png
+
+
+@app.route("/preview", methods=["POST"])
+@instrumented
+def preview():
+    """
+    Draws one row of the posted catalog as a PNG, with template= regular,
+    kids or children, row= its 1-based number among the data rows (1 by
+    default) and dpi= the resolution. With row=all, sends a zip with the
+    PNG of every row instead, as thumbnails of the whole catalog.
+    """
+    if not can_preview():
+        return "Previews need PyMuPDF, which is not installed", 501
+    with phase("decode"):
+        try:
+            csv_data = read_csv_upload(request)
+        except UploadError as e:
+            return str(e), e.status
+    if not csv_data:
+        return "No CSV data received", 400
+
+    template = request.values.get("template", "regular")
+    if template not in TEMPLATES:
+        return f"Unknown template '{template}'", 400
+    try:
+        dpi = int(request.values.get("dpi", PREVIEW_DPI))
+    except ValueError:
+        return "The dpi must be a whole number", 400
+    if not MIN_PREVIEW_DPI <= dpi <= MAX_PREVIEW_DPI:
+        return f"The dpi must be from {MIN_PREVIEW_DPI} to {MAX_PREVIEW_DPI}", 400
+    row = request.values.get("row", "1")
+    if row != "all" and not (row.isdigit() and int(row) >= 1):
+        return "The row must be a row number or all", 400
+
+    with phase("parse"):
+        catalog = read_catalog(csv_data)
+    if catalog is None:
+        return "Failed to process CSV", 400
+    draw_tag = template_draw_tag(template, catalog)
+    version = asset_version()
+
+    if row != "all":
+        tag = next(itertools.islice(catalog, int(row) - 1, None), None)
+        if tag is None:
+            return f"The catalog has no row {row}", 404
+        return Response(preview_png(draw_tag, tag, dpi, version), mimetype="image/png")
+
+    # Counted before any is drawn, so a catalog too large is refused at once
+    rows = count_rows(csv_data)
+    if rows > MAX_PREVIEW_ROWS:
+        return f"Thumbnails are drawn for at most {MAX_PREVIEW_ROWS} rows", 413
+    zip_file = io.BytesIO()
+    try:
+        # A thumbnail per row, admitted as that many tags
+        with admission.admit(request_client(), rows):
+            # PNGs are compressed already
+            with zipfile.ZipFile(zip_file, "w", zipfile.ZIP_STORED) as archive:
+                for number, tag in enumerate(catalog, 1):
+                    png = preview_png(draw_tag, tag, dpi, version)
+                    archive.writestr(f"row{number:04d}.png", png)
+    except (TooLarge, Overloaded) as e:
+        return not_admitted(e)
+    zip_file.seek(0)
+    return send_zip(zip_file, download_name="thumbnails.zip")
+
+
+@app.route("/validate", methods=["POST"])
+def validate():
+    """
+    Checks the posted CSV without rendering it and reports the problems of
+    every row as JSON. With template=regular, kids or children only the
+    columns that template prints are checked.
+    """
+    try:
+        csv_data = read_csv_upload(request)
+    except UploadError as e:
+        return str(e), e.status
+    if not csv_data:
+        return "No CSV data received", 400
+    template = request.values.get("template")
+    if template is not None and template not in TEMPLATES:
+        return f"Unknown template '{template}'", 400
+
+    report = validate_csv(csv_data, template)
+    if report is None:
+        return "Failed to process CSV", 400
+    return jsonify(report.to_dict())
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    status = dict(WARMUP, warm_start=WARM_START)
+    # Forked workers report the pid of the master that warmed them up
+    status["preloaded"] = WARMUP["pid"] is not None and WARMUP["pid"] != os.getpid()
+    return jsonify(status), 200 if WARMUP["ready"] or not WARM_START else 503
+
+
+@app.route("/admission", methods=["GET"])
+def admission_status():
+    """
+    Reports the render budget of the render endpoints, what is in flight
+    and the renders waiting for room.
+    """
+    return jsonify(admission.status())
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    if not METRICS_ENABLED:
+        return "Metrics are disabled", 404
+    return Response(expose(), mimetype="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,422 @@
+import copy
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zlib
+
+from PIL import Image
+from reportlab import rl_config
+from reportlab.lib.boxstuff import aspectRatioFix
+from reportlab.lib.utils import ImageReader, _digester
+from reportlab.pdfbase import pdfdoc, pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+from telemetry import asset_failure
+
+ASSET_DIR = "logos1"
+# Downscaled images with pre-split alpha masks, written by prepare_assets.py
+PREPARED_ASSET_DIR = "logos1_prepared"
+PREPARED_MANIFEST = "manifest.json"
+FONT_DIR = "fonts"
+# Seconds between checks for added, changed or removed logos, 0 to never check
+ASSET_RELOAD_INTERVAL = float(os.environ.get("ASSET_RELOAD_INTERVAL", 5))
+# Looked up names remembered before the lookup cache is started over
+RESOLVE_CACHE_SIZE = 10_000
+FONTS = (
+    "Poppins-Bold",
+    "Poppins-Regular",
+    "Montserrat-Bold",
+    "Montserrat-SemiBold",
+    "Montserrat-Regular",
+    "Montserrat-Medium",
+)
+
+# Images, forms and fonts are written as binary streams: ASCII85 encoding
+# makes them a quarter larger and is slower to write
+rl_config.useA85 = 0
+
+
+def _load_asset(path):
+    """
+    Decodes a PNG into an image XObject (and its soft mask) ready to embed.
+
+    :param path: The path of the image file.
+    :return: The prepared PDFImageXObject.
+    """
+    name = _digester(f"{path}auto")
+    image = pdfdoc.PDFImageXObject(name, path, mask="auto")
+    image.name = name
+    # Read again by derive_asset
+    image.source_path = path
+    image.mask_path = None
+    return image
+
+
+def _load_prepared_asset(path, mask_path):
+    """
+    Loads an image written by prepare_assets.py, attaching its separate
+    alpha mask as the soft mask instead of splitting RGBA data at runtime.
+
+    :param path: The path of the prepared RGB image.
+    :param mask_path: The path of its grayscale alpha mask, if any.
+    :return: The prepared PDFImageXObject.
+    """
+    name = _digester(path)
+    image = pdfdoc.PDFImageXObject(name, path)
+    image.name = name
+    image.source_path = path
+    image.mask_path = None
+    if os.path.exists(mask_path):
+        image.mask_path = mask_path
+        smask = pdfdoc.PDFImageXObject(_digester(mask_path), mask_path)
+        smask._decode = [0, 1]
+        image._smask = smask
+    return image
+
+
+def _load_prepared_manifest(prepared_dir):
+    try:
+        with open(os.path.join(prepared_dir, PREPARED_MANIFEST)) as f:
+            return json.load(f).get("sources", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def load_assets(asset_dir=ASSET_DIR, prepared_dir=PREPARED_ASSET_DIR):
+    """
+    Decodes every image in the asset directory, preferring the prepared copy
+    when it was built from the current version of the source file.
+
+    :param asset_dir: The directory holding the logos and icons.
+    :param prepared_dir: The directory written by prepare_assets.py.
+    :return: A dict mapping the file name without extension to its XObject.
+    """
+    prepared = _load_prepared_manifest(prepared_dir)
+    assets = {}
+    for file_name in sorted(os.listdir(asset_dir)):
+        stem, ext = os.path.splitext(file_name)
+        if ext.lower() != ".png":
+            continue
+        source_path = os.path.join(asset_dir, file_name)
+        prepared_path = os.path.join(prepared_dir, file_name)
+        try:
+            if file_name in prepared and os.path.exists(prepared_path):
+                with open(source_path, "rb") as f:
+                    source_hash = hashlib.md5(f.read()).hexdigest()
+                if source_hash == prepared[file_name]:
+                    mask_path = os.path.join(prepared_dir, f"{stem}.mask.png")
+                    assets[stem] = _load_prepared_asset(prepared_path, mask_path)
+                    continue
+            assets[stem] = _load_asset(source_path)
+        except Exception as e:
+            print(f"Error loading asset {file_name}: {e}")
+    return assets
+
+
+def rgb_on_white(image):
+    """
+    The colors of a resampled RGBA image, white under its fully transparent
+    pixels as in the source logos. Resampling leaves black there, which
+    viewers blend into the edges of the logo when they scale the colors and
+    the soft mask apart.
+    """
+    rgb = image.convert("RGB")
+    clear = image.getchannel("A").point(lambda alpha: 255 if alpha == 0 else 0)
+    rgb.paste((255, 255, 255), mask=clear)
+    return rgb
+
+
+def derive_asset(image, scale=1.0, jpeg_quality=None):
+    """
+    Re-encodes a loaded asset for an output profile, from the same file it
+    was loaded from.
+
+    :param image: The loaded PDFImageXObject.
+    :param scale: The size of the copy, relative to the loaded image.
+    :param jpeg_quality: Encode the colors as JPEG at this quality instead
+        of losslessly. The alpha mask is always lossless.
+    :return: The new PDFImageXObject, with its soft mask if it has one.
+    """
+    name = _digester(f"{image.source_path}{scale}{jpeg_quality}")
+    with Image.open(image.source_path) as source:
+        source = source.convert("RGBA")
+    if image.mask_path:
+        with Image.open(image.mask_path) as mask:
+            source.putalpha(mask.convert("L"))
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    if size != source.size:
+        source = source.resize(size, Image.LANCZOS)
+
+    derived = pdfdoc.PDFImageXObject(name)
+    derived.name = name
+    rgb = rgb_on_white(source)
+    if jpeg_quality:
+        jpeg = io.BytesIO()
+        rgb.save(jpeg, "JPEG", quality=jpeg_quality, optimize=True)
+        jpeg.seek(0)
+        derived.loadImageFromJPEG(jpeg)
+    else:
+        derived.loadImageFromSRC(ImageReader(rgb))
+        derived.streamContent = zlib.compress(rgb.tobytes(), 9)
+
+    alpha = source.getchannel("A")
+    if alpha.getextrema() != (255, 255):
+        smask = pdfdoc.PDFImageXObject(_digester(f"{name}mask"))
+        smask.loadImageFromSRC(ImageReader(alpha))
+        smask.streamContent = zlib.compress(alpha.tobytes(), 9)
+        smask._decode = [0, 1]
+        derived._smask = smask
+    return derived
+
+
+def register_fonts():
+    # Every font is parsed once per process, however often this is called
+    registered = set(pdfmetrics.getRegisteredFontNames())
+    for font_name in FONTS:
+        if font_name not in registered:
+            path = os.path.join(FONT_DIR, f"{font_name}.ttf")
+            pdfmetrics.registerFont(TTFont(font_name, path))
+
+
+def compute_asset_version(asset_dirs=(ASSET_DIR, PREPARED_ASSET_DIR, FONT_DIR)):
+    """
+    Hashes every logo, prepared image and font, so cached renders can tell
+    when the artwork they were made with has changed.
+    """
+    digest = hashlib.md5()
+    for asset_dir in asset_dirs:
+        if not os.path.isdir(asset_dir):
+            continue
+        for file_name in sorted(os.listdir(asset_dir)):
+            path = os.path.join(asset_dir, file_name)
+            if not os.path.isfile(path):
+                continue
+            digest.update(path.encode("utf8"))
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def asset_key(name):
+    """
+    Normalizes an asset or brand name, so that case, spaces and punctuation
+    do not matter: "Earth Runners" finds EARTHRUNNERS.png.
+    """
+    return "".join(char for char in name.casefold() if char.isalnum())
+
+
+class AssetIndex:
+    """
+    The decoded assets by normalized name.
+
+    Every name looked up is remembered with its asset, or with None if
+    there is none, so drawing a tag is a single dictionary lookup. The asset
+    directories are only looked at again by refresh(), which reloads the
+    assets when a file was added, changed or removed.
+    """
+
+    def __init__(
+        self,
+        asset_dir=ASSET_DIR,
+        prepared_dir=PREPARED_ASSET_DIR,
+        reload_interval=ASSET_RELOAD_INTERVAL,
+    ):
+        """
+        :param asset_dir: The directory holding the logos and icons.
+        :param prepared_dir: The directory written by prepare_assets.py.
+        :param reload_interval: The least number of seconds between two
+            checks for changed files, 0 to never check.
+        """
+        self.asset_dir = asset_dir
+        self.prepared_dir = prepared_dir
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._checked = time.monotonic()
+        self._signature = self._scan()
+        self._load()
+
+    def _scan(self):
+        # The path, modification time and size of every file
+        signature = []
+        for directory in (self.asset_dir, self.prepared_dir):
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        signature.append((entry.path, stat.st_mtime_ns, stat.st_size))
+        return sorted(signature)
+
+    def _load(self):
+        assets = {}
+        for name, image in load_assets(self.asset_dir, self.prepared_dir).items():
+            key = asset_key(name)
+            if key in assets:
+                print(f"Error loading asset {name}: another asset has the same name")
+                continue
+            assets[key] = image
+        self.version = compute_asset_version(
+            (self.asset_dir, self.prepared_dir, FONT_DIR)
+        )
+        # Swapped in one step, so a lookup never mixes two versions
+        self._index = (assets, {}, {})
+
+    def get(self, name, variant=None):
+        """
+        Finds the asset of a name, ignoring case, spaces and punctuation.
+
+        :param name: The asset file name without the extension, or a brand.
+        :param variant: The (scale, JPEG quality) of an output profile, or
+            None for the asset as loaded.
+        :return: The prepared XObject, or None if there is no such asset.
+        """
+        assets, resolved, variants = self._index
+        try:
+            image = resolved[name]
+        except KeyError:
+            if len(resolved) >= RESOLVE_CACHE_SIZE:
+                resolved.clear()
+            image = resolved[name] = assets.get(asset_key(name))
+        if variant is None or image is None:
+            return image
+
+        derived = variants.get((image.name, variant))
+        if derived is None:
+            derived = variants[image.name, variant] = derive_asset(image, *variant)
+        return derived
+
+    def warm(self, variant):
+        """
+        Derives every asset for an output profile ahead of its first use.
+        """
+        assets = self._index[0]
+        for key in assets:
+            try:
+                self.get(key, variant)
+            except Exception as e:
+                print(f"Error loading asset {key}: {e}")
+
+    def refresh(self, force=False):
+        """
+        Reloads the assets if a file was added, changed or removed since the
+        last check, checking at most once per reload interval.
+
+        :param force: Check now, whatever the interval.
+        :return: True if the assets were reloaded.
+        """
+        if not force and (
+            self.reload_interval <= 0
+            or time.monotonic() - self._checked < self.reload_interval
+        ):
+            return False
+        # Another thread is already checking
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._checked = time.monotonic()
+            signature = self._scan()
+            if signature == self._signature:
+                return False
+            self._signature = signature
+            self._load()
+            print(f"Assets reloaded from {self.asset_dir}")
+            return True
+        finally:
+            self._lock.release()
+
+
+# Decoded once per process and shared by every document
+register_fonts()
+ASSET_INDEX = AssetIndex()
+
+
+def asset_version():
+    """
+    Picks up changed logos, then returns the version of the assets in use.
+    Called once per request, before rendering, so that a document is never
+    drawn with two versions of the assets.
+    """
+    ASSET_INDEX.refresh()
+    return ASSET_INDEX.version
+
+
+def has_asset(name):
+    return ASSET_INDEX.get(name) is not None
+
+
+_logged_errors = set()
+
+
+def log_asset_error(what, error):
+    """
+    Prints an asset that failed to draw once per process, rather than once
+    for every tag it is on.
+    """
+    message = f"Error loading {what}: {error}"
+    if message not in _logged_errors:
+        _logged_errors.add(message)
+        print(message)
+
+
+def _register_asset(c, image):
+    """
+    Registers a copy of the prepared XObject with the canvas document the
+    first time the document uses it and returns its internal name.
+    """
+    reg_name = c._doc.getXObjectName(image.name)
+    if c._doc.idToObject.get(reg_name) is None:
+        doc_image = copy.copy(image)
+        smask = getattr(doc_image, "_smask", None)
+        c._setXObjects(doc_image)
+        c._doc.Reference(doc_image, reg_name)
+        c._doc.addForm(image.name, doc_image)
+        if smask is not None:
+            del doc_image._smask
+            mask_reg_name = c._doc.getXObjectName(smask.name)
+            if c._doc.idToObject.get(mask_reg_name) is None:
+                smask = copy.copy(smask)
+                c._setXObjects(smask)
+                doc_image.smask = c._doc.Reference(smask, mask_reg_name)
+            else:
+                doc_image.smask = pdfdoc.PDFObjectReference(mask_reg_name)
+    return reg_name
+
+
+def draw_asset(c, name, x, y, width, height, preserveAspectRatio=False):
+    """
+    Draws a preloaded asset, the same way c.drawImage(path, ..., mask="auto")
+    would, without reading or decoding the file again.
+
+    :param c: The canvas object to draw on.
+    :param name: The asset file name without the extension, in any case.
+    :param x: The x-coordinate of the image box.
+    :param y: The y-coordinate of the image box.
+    :param width: The width of the image box.
+    :param height: The height of the image box.
+    :param preserveAspectRatio: Fit the image into the box keeping its ratio.
+    """
+    # Set by profiles.new_canvas for profiles that re-encode the assets
+    image = ASSET_INDEX.get(name, getattr(c, "asset_variant", None))
+    if image is None:
+        asset_failure(name)
+        raise KeyError(f"Unknown asset '{name}'")
+
+    reg_name = _register_asset(c, image)
+    x, y, width, height, _ = aspectRatioFix(
+        preserveAspectRatio, "c", x, y, width, height, image.width, image.height
+    )
+
+    c._currentPageHasImages = 1
+    counts = getattr(c, "operator_counts", None)
+    if counts is not None:
+        counts["image"] += 1
+    c.saveState()
+    c.translate(x, y)
+    c.scale(width, height)
+    c._code.append(f"/{reg_name} Do")
+    c.restoreState()
+    c._formsinuse.append(image.name)
@@ -0,0 +1,253 @@
+"""
+Benchmarks the tag renderers on synthetic catalogs.
+
+Every template is rendered from generated catalogs of 10, 1,000 and 10,000
+rows, each case in a fresh process, and the tags per second, peak RSS and
+PDF size are compared against the stored baseline. The run fails if any of
+them regressed by more than the threshold.
+
+    python benchmark.py [--sizes 10 1000 10000] [--threshold 0.2]
+    python benchmark.py --profiles fast balanced compact
+    python benchmark.py --update-baseline
+
+Cases of the default output profile are named template/rows, those of the
+other profiles template/rows@profile.
+
+Baselines are only comparable on the machine they were recorded on; record
+a new one with --update-baseline before comparing changes elsewhere.
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+BASELINE_FILE = "benchmark_baseline.json"
+SIZES = (10, 1000, 10000)
+
+# Catalog columns and generator of every benchmarked template
+TEMPLATES = {
+    "regular": ("generate_pdf", True),
+    "kids": ("generate_kids_pdf", False),
+    "kids_discount": ("generate_kids_pdf", True),
+    "children": ("generate_children_pdf", False),
+}
+
+MODELS = [
+    "PRIMUS LITE III",
+    "GEO COURT",
+    "TRACKER FOREST ESC",
+    "PRIO NEO",
+    "ZELEN",
+    "PRIMAL 2",
+    "MESA TRAIL",
+    "HANA",
+    "LOW TOP CANVAS",
+    "ULTRA RAPTOR II",
+]
+COLORS = ["black", "obsidian", "red suede", "forest green", "sand", "navy"]
+BRANDS = ["VIVOBAREFOOT", "XERO", "MERRELL", "LEMS", "SAGUARO", "FREET", "VFF"]
+# Brands without a logo in logos1/, drawn as text or left out
+UNKNOWN_BRANDS = ["NOLOGO", "BAREFOOT CO"]
+PRICES = ["249", "399", "549.9", "649", "899", "1299"]
+KIDS_SIZES = ["20-22", "23-25", "26-28", "29-31"]
+
+
+def synthetic_catalog(rows, discount=True, seed=0):
+    """
+    Generates a catalog CSV with a realistic mix of rows: about a third on
+    sale, some with a kids size table, vegan and grounding flags and brands
+    that have no logo.
+
+    :param rows: The number of rows.
+    :param discount: Include the discount column.
+    :param seed: The random seed, so every run renders the same catalog.
+    :return: The CSV text.
+    """
+    rng = random.Random(seed)
+    header = ["דגם", "צבע", "מחיר"]
+    if discount:
+        header.append("הנחה")
+    header += ["מותג", "עובי", "טבעוני", "הארקה"]
+    for i in range(1, 5):
+        header += [f"מידות{i}", f"מחיר{i}"]
+
+    lines = [",".join(header)]
+    for _ in range(rows):
+        row = [rng.choice(MODELS), rng.choice(COLORS), rng.choice(PRICES)]
+        if discount:
+            row.append(str(rng.choice([10, 20, 30, 50])) if rng.random() < 0.3 else "")
+        brands = UNKNOWN_BRANDS if rng.random() < 0.1 else BRANDS
+        row += [
+            rng.choice(brands),
+            str(rng.choice([4, 5.5, 6, 8])),
+            "yes" if rng.random() < 0.4 else "no",
+            "yes" if rng.random() < 0.3 else "no",
+        ]
+        sizes = rng.randint(0, 4) if rng.random() < 0.6 else 0
+        for i in range(4):
+            if i < sizes:
+                row += [KIDS_SIZES[i], str(150 + 10 * i)]
+            else:
+                row += ["", ""]
+        lines.append(",".join(row))
+    return "\n".join(lines) + "\n"
+
+
+def _run_case(template, rows, repeat, profile_name=None):
+    # Runs in a fresh process, so the peak RSS is this case's own
+    os.environ.setdefault("RENDER_PROCESSES", "1")
+    os.environ.setdefault("WARM_START", "0")
+    import bot
+    from ingest import read_catalog
+    from profiles import get_profile
+
+    generator_name, discount = TEMPLATES[template]
+    generate = getattr(bot, generator_name)
+    profile = get_profile(profile_name)
+    csv_data = synthetic_catalog(rows, discount)
+
+    # Warm the fonts, logos and code paths before timing
+    warm_catalog = read_catalog(synthetic_catalog(5, discount, seed=1))
+    generate(warm_catalog, profile=profile).getvalue()
+
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        pdf = generate(read_catalog(csv_data), profile=profile)
+        pdf_bytes = len(pdf.getvalue())
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    return {
+        "tags_per_sec": round(rows / best, 1),
+        "peak_rss_mb": round(peak_rss / (1024 * 1024), 1),
+        "pdf_bytes": pdf_bytes,
+    }
+
+
+def _run_case_quietly(template, rows, repeat, profile_name=None):
+    # The renderers' per-tag log lines would be timed too
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return _run_case(template, rows, repeat, profile_name)
+
+
+def run_case(template, rows, profile_name=None):
+    repeat = max(1, min(5, 2000 // rows))
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(_run_case_quietly, (template, rows, repeat, profile_name))
+
+
+def compare(results, baseline, threshold):
+    """
+    Lists every metric that is worse than the baseline by more than the
+    threshold, a fraction of the baseline value.
+    """
+    regressions = []
+    for case, metrics in results.items():
+        base = baseline.get(case)
+        if base is None:
+            continue
+        if metrics["tags_per_sec"] < base["tags_per_sec"] * (1 - threshold):
+            regressions.append(
+                f"{case}: {metrics['tags_per_sec']} tags/s, "
+                f"baseline {base['tags_per_sec']}"
+            )
+        if metrics["peak_rss_mb"] > base["peak_rss_mb"] * (1 + threshold):
+            regressions.append(
+                f"{case}: {metrics['peak_rss_mb']} MB peak RSS, "
+                f"baseline {base['peak_rss_mb']}"
+            )
+        if metrics["pdf_bytes"] > base["pdf_bytes"] * (1 + threshold):
+            regressions.append(
+                f"{case}: {metrics['pdf_bytes']} PDF bytes, "
+                f"baseline {base['pdf_bytes']}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument(
+        "--templates", nargs="+", choices=list(TEMPLATES), default=list(TEMPLATES)
+    )
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        default=[None],
+        help="output profiles to render with, the default profile if not given",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="largest allowed regression, as a fraction of the baseline",
+    )
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="store the results as the new baseline instead of comparing",
+    )
+    args = parser.parse_args()
+
+    from profiles import DEFAULT_PROFILE, PROFILES
+
+    for profile_name in args.profiles:
+        if profile_name is not None and profile_name not in PROFILES:
+            parser.error(f"unknown profile '{profile_name}'")
+
+    results = {}
+    for template in args.templates:
+        for rows in args.sizes:
+            for profile_name in args.profiles:
+                case = f"{template}/{rows}"
+                if profile_name not in (None, DEFAULT_PROFILE):
+                    case = f"{case}@{profile_name}"
+                results[case] = run_case(template, rows, profile_name)
+                metrics = results[case]
+                print(
+                    f"{case}: {metrics['tags_per_sec']} tags/s, "
+                    f"{metrics['peak_rss_mb']} MB peak RSS, "
+                    f"{metrics['pdf_bytes']} bytes"
+                )
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update-baseline first")
+        return 1
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if regressions:
+        return 1
+    print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
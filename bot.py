@@ -1,33 +1,29 @@
-import os
-import pandas as pd
 import io
-
-# import telebot
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.units import cm
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
+from collections import Counter
+
+try:
+    import pandas as pd
+except ImportError:  # The web endpoints read the CSV with ingest.py instead
+    pd = None
+
+from fragments import FragmentCache
+from ingest import CsvCatalog
+from layout import GridLayout, render_grid
+from metrics import prime_tags
+from parallel import render_parallel, should_render_in_parallel
+from profiles import new_canvas
+from records import DISCOUNT_COLUMN, expand_copies, iter_copies, normalize_catalog
+from stream import render_spooled
+from telemetry import count, count_operators, count_tags, phase
 from utils import (
+    MEASURED_TEXT,
+    draw_children_price_tag,
     draw_kids_discount_price_tag,
     draw_kids_price_tag,
     draw_price_tag,
     draw_discount_price_tag,
 )
 
-# Register the Poppins font
-pdfmetrics.registerFont(TTFont("Poppins-Bold", "fonts/Poppins-Bold.ttf"))
-pdfmetrics.registerFont(TTFont("Poppins-Regular", "fonts/Poppins-Regular.ttf"))
-pdfmetrics.registerFont(TTFont("Montserrat-Bold", "fonts/Montserrat-Bold.ttf"))
-pdfmetrics.registerFont(TTFont("Montserrat-SemiBold", "fonts/Montserrat-SemiBold.ttf"))
-pdfmetrics.registerFont(TTFont("Montserrat-Regular", "fonts/Montserrat-Regular.ttf"))
-
-# BOT_TOKEN = os.environ.get("BOT_TOKEN")
-
-# bot = telebot.TeleBot(BOT_TOKEN)
-
 
 def process_csv(csv_data):
     try:
@@ -38,321 +34,223 @@ def process_csv(csv_data):
         return None
 
 
-def generate_pdf(dataframe):
-    pdf_file = io.BytesIO()
-    c = canvas.Canvas(pdf_file, pagesize=A4)
-    width, height = A4
-    c.setPageSize((height, width))
-
-    cell_width = 24.3 * cm
-    cell_height = 3.3 * cm
-    x_start = 1 * cm
-    y_start = width - cell_height - 1 * cm
-
-    for index, row in dataframe.iterrows():
-        # Set the stroke color to light grey
-        light_grey = colors.Color(0.85, 0.85, 0.85)  # RGB values for light grey
-        c.setStrokeColor(light_grey)
-
-        # Set the line style to dotted
-        c.setDash(1, 2)  # 1 unit on, 2 units off for a dotted line pattern
-
-        # Draw the cell border with the new settings
-        c.rect(x_start, y_start, cell_width, cell_height, stroke=1, fill=0)
-
-        # Reset the line settings for the rest of the content
-        c.setDash([])
-
-        discount = str(row.get("הנחה", "N/A"))
-        # Draw the price tag content
-        if discount == "nan":
-            draw_price_tag(c, x_start, y_start, cell_width, cell_height, row)
-        else:
-            draw_discount_price_tag(c, x_start, y_start, cell_width, cell_height, row)
-
-        # Move to the next cell or next page if necessary
-        x_start += cell_width  # Move to the next cell
-        if (
-            x_start + cell_width > height - 1 * cm
-        ):  # Check if the next cell fits on the current row
-            x_start = 1 * cm
-            y_start -= cell_height  # Move to the next row with no extra spacing
-
-        if y_start < 1 * cm:  # Check if we need to move to the next page
-            c.showPage()
-            x_start = 1 * cm
-            y_start = width - cell_height - 1 * cm
-
-    c.save()
+def draw_adult_price_tag(c, x_start, y_start, cell_width, cell_height, tag):
+    # Tags with a discount get the sale template
+    if tag.discount is None:
+        draw_price_tag(c, x_start, y_start, cell_width, cell_height, tag)
+    else:
+        draw_discount_price_tag(c, x_start, y_start, cell_width, cell_height, tag)
+
+
+def tag_variant(draw_tag, tag):
+    # The adult template picks the sale variant per tag
+    if draw_tag is draw_adult_price_tag:
+        return "price_tag" if tag.discount is None else "discount_price_tag"
+    return draw_tag.__name__[len("draw_") :]
+
+
+def render_tags(
+    tags, draw_tag, layout=None, pdf_file=None, progress=None, profile=None
+):
+    """
+    Renders the tag records into a PDF in this process.
+
+    :param tags: The normalized tag records, a list or an iterator.
+    :param draw_tag: The draw_* function for a single tag.
+    :param layout: The GridLayout to place the tags with.
+    :param pdf_file: The binary file to write to, a new BytesIO by default.
+    :param progress: Called as progress(rendered, total) after every page.
+    :param profile: The OutputProfile, the default profile if None.
+    :return: The rewound PDF file.
+    """
+    layout = layout or GridLayout()
+    pdf_file = pdf_file if pdf_file is not None else io.BytesIO()
+    c = new_canvas(pdf_file, layout.pagesize, profile)
+    rendered = _draw_tags(c, tags, draw_tag, layout, progress)
+    count("pages", layout.page_count(rendered))
+
+    with phase("save"):
+        c.save()
     pdf_file.seek(0)  # Rewind the file to the beginning
     return pdf_file
 
 
-def generate_kids_pdf(dataframe):
-    pdf_file = io.BytesIO()
-    c = canvas.Canvas(pdf_file, pagesize=A4)
-    width, height = A4
-    c.setPageSize((height, width))
-
-    cell_width = 24.3 * cm
-    cell_height = 3.3 * cm
-    x_start = 1 * cm
-    y_start = width - cell_height - 1 * cm
-
-    for index, row in dataframe.iterrows():
-        # Set the stroke color to light grey
-        light_grey = colors.Color(0.85, 0.85, 0.85)  # RGB values for light grey
-        c.setStrokeColor(light_grey)
-
-        # Set the line style to dotted
-        c.setDash(1, 2)  # 1 unit on, 2 units off for a dotted line pattern
-
-        # Draw the cell border with the new settings
-        c.rect(x_start, y_start, cell_width, cell_height, stroke=1, fill=0)
-
-        # Reset the line settings for the rest of the content
-        c.setDash([])
-
-        discount = str(row.get("הנחה", "N/A"))
-        # Draw the price tag content
-        if discount == "N/A":
-            draw_kids_price_tag(c, x_start, y_start, cell_width, cell_height, row)
-        else:
-            draw_kids_discount_price_tag(
-                c, x_start, y_start, cell_width, cell_height, row
-            )
-
-        # Move to the next cell or next page if necessary
-        x_start += cell_width  # Move to the next cell
-        if (
-            x_start + cell_width > height - 1 * cm
-        ):  # Check if the next cell fits on the current row
-            x_start = 1 * cm
-            y_start -= cell_height  # Move to the next row with no extra spacing
-
-        if y_start < 1 * cm:  # Check if we need to move to the next page
+def _draw_tags(c, tags, draw_tag, layout, progress=None):
+    # Draws the tags from the top of the current page and returns their count
+    if isinstance(tags, list):
+        # Measure the text of every tag in one batch per font
+        prime_tags(tags, MEASURED_TEXT)
+        fragments = FragmentCache(draw_tag, tags)
+    else:
+        # Tags from an iterator are counted for the fragment cache as they come
+        fragments = FragmentCache(draw_tag)
+    operators = Counter(getattr(c, "operator_counts", ()))
+    with phase("draw"):
+        rendered = render_grid(c, layout, tags, fragments, progress)
+    if hasattr(c, "operator_counts"):
+        # Only those of this template, the canvas may hold others
+        operators = c.operator_counts - operators
+        count_operators(draw_tag.__name__[len("draw_") :], operators)
+    return rendered
+
+
+def render_batch(parts, layout=None, pdf_file=None, profile=None):
+    """
+    Renders several catalogs into one PDF, each starting on a new page, so
+    the logos, fonts and repeated tags they share are embedded once.
+
+    :param parts: The (tags, draw_tag) of every catalog, in print order,
+        with the tags as lists.
+    :param layout: The GridLayout to place the tags with.
+    :param pdf_file: The binary file to write to, a new BytesIO by default.
+    :param profile: The OutputProfile, the default profile if None.
+    :return: The rewound PDF file.
+    """
+    layout = layout or GridLayout()
+    pdf_file = pdf_file if pdf_file is not None else io.BytesIO()
+    c = new_canvas(pdf_file, layout.pagesize, profile)
+    pages = 0
+    for tags, draw_tag in parts:
+        if not tags:
+            continue
+        if pages:
             c.showPage()
-            x_start = 1 * cm
-            y_start = width - cell_height - 1 * cm
+        pages += layout.page_count(_draw_tags(c, tags, draw_tag, layout))
+    count("pages", max(1, pages))
 
-    c.save()
+    with phase("save"):
+        c.save()
     pdf_file.seek(0)  # Rewind the file to the beginning
     return pdf_file
 
 
-def generate_children_pdf(dataframe):
-    pdf_file = io.BytesIO()
-    c = canvas.Canvas(pdf_file, pagesize=A4)
-    width, height = A4
-    c.setPageSize((height, width))
-
-    cell_width = 24.3 * cm
-    cell_height = 3.3 * cm
-    x_start = 1 * cm
-    y_start = width - cell_height - 1 * cm
-
-    for index, row in dataframe.iterrows():
-        model_name = str(row.get("דגם", "N/A")).upper()
-        color = str(row.get("צבע", "N/A")).upper()
-        sole_thickness = str(row.get("עובי", "N/A"))
-        price = str(row.get("מחיר", "N/A"))
-        brand_name = str(row.get("מותג"))
-        vegan = str(row.get("טבעוני", "No")).lower()
-        grounding = str(row.get("הארקה", "No")).lower()
-
-        # Construct the path to the brand logo
-        brand_logo_path = f"logos1/{brand_name}.png" if brand_name else None
-
-        # Draw cell border
-        c.setStrokeColor(colors.black)
-        c.setDash(1, 3)
-        c.rect(x_start, y_start, cell_width, cell_height, stroke=1, fill=0)
-
-        # Draw the brand logo on the left side with scaling if the file exists
-        if brand_logo_path and os.path.exists(brand_logo_path):
-            try:
-                max_logo_width = 3.5 * cm
-                max_logo_height = 2.5 * cm
-                c.drawImage(
-                    brand_logo_path,
-                    x_start + 0.4 * cm,
-                    y_start + 0.4 * cm,
-                    width=max_logo_width,
-                    height=max_logo_height,
-                    preserveAspectRatio=True,
-                    mask="auto",
-                )
-            except Exception as e:
-                print(f"Error loading brand logo: {e}")
-        else:
-            # If logo does not exist, print the brand name as text
-            c.setFont("Poppins-Bold", 15)
-            c.drawString(
-                x_start + 0.5 * cm, y_start + cell_height - 1.3 * cm, brand_name
-            )
-
-        # Draw the model name at the top center using Poppins-Bold
-        c.setFont("Poppins-Bold", 32)
-        model_name_position = x_start + cell_width / 2 - 1 * cm
-        c.drawCentredString(
-            model_name_position, y_start + cell_height - 1.3 * cm, model_name
+def _catalog_tags(dataframe):
+    # The tag records of every printed copy, and their number if known
+    if isinstance(dataframe, CsvCatalog):
+        return iter_copies(dataframe), dataframe.size_hint
+    with phase("normalize"):
+        tags = expand_copies(normalize_catalog(dataframe))
+    return tags, len(tags)
+
+
+def _count_rows(dataframe):
+    count(
+        "rows", dataframe.rows if isinstance(dataframe, CsvCatalog) else len(dataframe)
+    )
+
+
+def _render_pdf(
+    dataframe,
+    draw_tag,
+    layout=None,
+    stream=False,
+    progress=None,
+    profile=None,
+    pages=None,
+):
+    """
+    Renders every row of the catalog into a PDF with the given template,
+    sharding large catalogs across the render process pool.
+
+    :param dataframe: The catalog as read from the CSV, a DataFrame or a
+        CsvCatalog whose rows are drawn as they are parsed.
+    :param draw_tag: The draw_* function for a single tag.
+    :param layout: The GridLayout to place the tags with.
+    :param stream: Render into a spooled temporary file, to be sent in
+        blocks, see stream.py.
+    :param progress: Called as progress(rendered, total) as tags are drawn.
+    :param profile: The OutputProfile, the default profile if None.
+    :param pages: A PageSelection that fingerprints the pages and picks the
+        ones to draw, see pages.py.
+    :return: The rewound PDF file.
+    """
+    layout = layout or GridLayout()
+    tags, tag_count = _catalog_tags(dataframe)
+    if pages is not None:
+        # Pages are fingerprinted as they are drawn
+        tags = pages.select(tags, draw_tag, layout, profile)
+        if pages.changed_only:
+            # Known once every page has been compared
+            tag_count = None
+    tags = count_tags(tags, lambda tag: tag_variant(draw_tag, tag))
+
+    if stream:
+        pdf_file = render_spooled(
+            render_tags, tags, draw_tag, layout, progress, profile
+        )
+    elif tag_count is not None and should_render_in_parallel(tag_count):
+        tags = list(tags)
+        count("pages", layout.page_count(len(tags)))
+        pdf_file = render_parallel(
+            render_tags, tags, draw_tag, layout, progress, profile
+        )
+    else:
+        pdf_file = render_tags(
+            tags, draw_tag, layout, progress=progress, profile=profile
         )
 
-        # Add vegan "V" icon in green if applicable, right after the model name
-        vegan_icon_x = None
-        if vegan in ["yes", "true", "1"]:
-            try:
-                vegan_icon_path = "logos1/VEGAN.png"  # Path to your VEGAN.png file
-                name_width = c.stringWidth(model_name, "Poppins-Bold", 36)
-                vegan_icon_x = model_name_position + name_width / 2 + 10
-                c.drawImage(
-                    vegan_icon_path,
-                    vegan_icon_x,
-                    y_start + cell_height - 1.4 * cm,
-                    width=1.2 * cm,
-                    height=1.2 * cm,
-                    preserveAspectRatio=True,
-                    mask="auto",
-                )
-            except Exception as e:
-                print(f"Error loading vegan icon: {e}")
-
-        # Add grounding icon next to the vegan icon if applicable
-        if grounding in ["yes", "true", "1"] and vegan_icon_x:
-            try:
-                grounding_icon_path = (
-                    "logos1/GROUNDING.png"  # Path to your GROUNDING.png file
-                )
-                grounding_icon_x = vegan_icon_x + 1.5 * cm
-                c.drawImage(
-                    grounding_icon_path,
-                    grounding_icon_x,
-                    y_start + cell_height - 1.4 * cm,
-                    width=1.2 * cm,
-                    height=1.2 * cm,
-                    preserveAspectRatio=True,
-                    mask="auto",
-                )
-            except Exception as e:
-                print(f"Error loading grounding icon: {e}")
-
-        # Calculate the total width of the color and sole thickness together
-        c.setFont("Poppins-Bold", 22)
-        color_width = c.stringWidth(f"{color}", "Poppins-Bold", 22)
-
-        c.setFont("Poppins-Regular", 22)
-        thickness_text = f" | {sole_thickness}mm"
-        thickness_width = c.stringWidth(thickness_text, "Poppins-Regular", 22)
-
-        # Total width of the combined text
-        total_text_width = color_width + thickness_width
-
-        # Calculate the starting point to center the combined text
-        start_x = x_start + (cell_width - total_text_width) / 2 - 1 * cm
-
-        # Draw the color in bold
-        c.setFont("Poppins-Bold", 22)
-        c.drawString(start_x, y_start + 0.7 * cm, f"{color}")
-
-        # Draw the sole thickness in regular right after the color
-        c.setFont("Poppins-Regular", 22)
-        c.drawString(start_x + color_width, y_start + 0.7 * cm, thickness_text)
-
-        # Determine the number of valid size ranges
-        valid_size_prices = []
-        for i in range(1, 5):
-            size_column = f"מידות{i}"
-            price_column = f"מחיר{i}"
-            size_range = str(row.get(size_column, "")).strip()
-            price_value = str(row.get(price_column, "")).strip()
-            if (
-                size_range
-                and price_value
-                and size_range.lower() != "nan"
-                and price_value.lower() != "nan"
-            ):
-                valid_size_prices.append((size_range, price_value))
-
-        # Only draw the table if there are valid size ranges
-        if valid_size_prices:
-            # Set table position on the right side of the cell
-            table_x_start = x_start + cell_width - 5.5 * cm
-
-            # Adjust cell size and font size based on the number of valid size-price pairs
-            if len(valid_size_prices) == 4:
-                table_y_start = y_start + cell_height - 0.65 * cm
-                font_size = 14
-                row_height = 0.69 * cm
-            elif len(valid_size_prices) == 3:
-                table_y_start = y_start + cell_height - 0.675 * cm
-                font_size = 16
-                row_height = 0.95 * cm
-            else:
-                table_y_start = y_start + cell_height - 1 * cm
-                font_size = 18
-                row_height = 1.2 * cm
-
-            # Set stroke color and dash style for the table border
-            c.setStrokeColor(colors.grey)
-            c.setDash(1, 3)
-
-            # Draw size ranges and prices as table rows
-            for size_range, price_value in valid_size_prices:
-                # Set font size for size range
-                c.setFont("Poppins-Regular", font_size)
-
-                # Calculate the vertical position to center the text within the row
-                text_height = (
-                    font_size * 0.3527
-                )  # Convert font size to points height (approximation)
-                vertical_center_y = table_y_start - (row_height - text_height) / 2
-
-                # Draw size range and price, centered vertically in the row
-                c.drawCentredString(
-                    table_x_start + 1.2 * cm, vertical_center_y + 0.1 * cm, size_range
-                )
-
-                # Set font size for price value
-                c.setFont("Poppins-Bold", font_size)
-                c.drawCentredString(
-                    table_x_start + 4.2 * cm,
-                    vertical_center_y + 0.1 * cm,
-                    f"{price_value}₪",
-                )
-
-                # Draw dotted rectangle around the table row
-                c.rect(
-                    table_x_start - 0.2 * cm,
-                    table_y_start - row_height / 2,
-                    5.5 * cm,
-                    row_height,
-                )
-
-                # Draw the vertical line between columns
-                c.line(
-                    table_x_start
-                    + 2.75 * cm,  # Middle point of the row (split columns)
-                    table_y_start + row_height / 2,
-                    table_x_start + 2.75 * cm,
-                    table_y_start - row_height / 2,
-                )
-
-                # Move down for the next row
-                table_y_start -= row_height
-
-        # Move to the next cell or next page if necessary
-        x_start += cell_width  # Move to the next cell
-        if (
-            x_start + cell_width > height - 1 * cm
-        ):  # Check if the next cell fits on the current row
-            x_start = 1 * cm
-            y_start -= cell_height  # Move to the next row with no extra spacing
-
-        if y_start < 1 * cm:  # Check if we need to move to the next page
-            c.showPage()
-            x_start = 1 * cm
-            y_start = width - cell_height - 1 * cm
-
-    c.save()
-    pdf_file.seek(0)  # Rewind the file to the beginning
+    _count_rows(dataframe)
     return pdf_file
+
+
+def generate_pdf(
+    dataframe, layout=None, stream=False, progress=None, profile=None, pages=None
+):
+    return _render_pdf(
+        dataframe, draw_adult_price_tag, layout, stream, progress, profile, pages
+    )
+
+
+def generate_kids_pdf(
+    dataframe, layout=None, stream=False, progress=None, profile=None, pages=None
+):
+    draw_tag = template_draw_tag("kids", dataframe)
+    return _render_pdf(dataframe, draw_tag, layout, stream, progress, profile, pages)
+
+
+def generate_children_pdf(
+    dataframe, layout=None, stream=False, progress=None, profile=None, pages=None
+):
+    return _render_pdf(
+        dataframe, draw_children_price_tag, layout, stream, progress, profile, pages
+    )
+
+
+def template_draw_tag(template, dataframe):
+    """
+    :param template: The template name, "regular", "kids" or "children".
+    :param dataframe: The catalog, a DataFrame or a CsvCatalog.
+    :return: The draw_* function the template draws the catalog's tags with.
+    :raises KeyError: When there is no template of that name.
+    """
+    if template == "kids":
+        # Catalogs with a discount column get the single price template,
+        # the others get the size table template
+        if DISCOUNT_COLUMN in dataframe.columns:
+            return draw_kids_discount_price_tag
+        return draw_kids_price_tag
+    if template == "regular":
+        return draw_adult_price_tag
+    if template == "children":
+        return draw_children_price_tag
+    raise KeyError(f"Unknown template '{template}'")
+
+
+def generate_batch(catalogs, layout=None, profile=None):
+    """
+    Renders several catalogs into a single PDF with render_batch.
+
+    :param catalogs: The (template, dataframe) of every catalog, in print
+        order.
+    :param layout: The GridLayout to place the tags with.
+    :param profile: The OutputProfile, the default profile if None.
+    :return: The rewound PDF file.
+    """
+    parts = []
+    for template, dataframe in catalogs:
+        draw_tag = template_draw_tag(template, dataframe)
+        tags, _ = _catalog_tags(dataframe)
+        tags = list(count_tags(tags, lambda tag: tag_variant(draw_tag, tag)))
+        _count_rows(dataframe)
+        parts.append((tags, draw_tag))
+    return render_batch(parts, layout, profile=profile)
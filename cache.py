@@ -0,0 +1,170 @@
+"""
+Content-addressed cache of rendered PDFs.
+
+Renders are keyed on a hash of the normalized CSV text, the template and
+the asset-set version. Recently used PDFs are kept in memory; older ones
+are moved to an on-disk tier. Both tiers are bounded in bytes and evict the
+least recently used entries first.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+RENDER_CACHE_MEMORY_BYTES = int(
+    os.environ.get("RENDER_CACHE_MEMORY_BYTES", 64 * 1024 * 1024)
+)
+RENDER_CACHE_DISK_BYTES = int(
+    os.environ.get("RENDER_CACHE_DISK_BYTES", 512 * 1024 * 1024)
+)
+RENDER_CACHE_DIR = os.environ.get(
+    "RENDER_CACHE_DIR", os.path.join(tempfile.gettempdir(), "price_tag_cache")
+)
+
+
+def normalize_csv(csv_data):
+    # Line endings and trailing blank space do not change the rendered tags
+    lines = csv_data.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def render_key(csv_data, template, asset_version, *extra):
+    """
+    Builds the cache key of a render.
+
+    :param csv_data: The CSV text as received.
+    :param template: The name of the template it is rendered with.
+    :param asset_version: The version of the logos and fonts in use.
+    :param extra: Any other render options that change the output.
+    :return: A hex digest, also used as the response ETag.
+    """
+    digest = hashlib.sha256()
+    for part in (template, asset_version, *extra):
+        digest.update(str(part).encode("utf8"))
+        digest.update(b"\0")
+    digest.update(normalize_csv(csv_data).encode("utf8"))
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """
+    Two-tier LRU cache of rendered PDF bytes, or any other bytes.
+    """
+
+    def __init__(
+        self,
+        memory_bytes=RENDER_CACHE_MEMORY_BYTES,
+        disk_bytes=RENDER_CACHE_DISK_BYTES,
+        cache_dir=RENDER_CACHE_DIR,
+        suffix=".pdf",
+    ):
+        """
+        :param memory_bytes: The size of the in-memory tier.
+        :param disk_bytes: The size of the on-disk tier, 0 to keep none.
+        :param cache_dir: The directory of the on-disk tier.
+        :param suffix: The file name suffix of the entries on disk, so
+            caches of different data can share a directory.
+        """
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.cache_dir = cache_dir
+        self.suffix = suffix
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        if disk_bytes:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    def get(self, key):
+        """
+        Returns the cached bytes for the key, or None.
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+
+        if not self.disk_bytes:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        # Mark the file as recently used and promote it to memory; another
+        # worker may have evicted it since it was read
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        self._put_memory(key, data)
+        return data
+
+    def put(self, key, data):
+        self._put_memory(key, data)
+        if self.disk_bytes and len(data) <= self.disk_bytes:
+            self._put_disk(key, data)
+
+    def _put_memory(self, key, data):
+        if len(data) > self.memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory_size -= len(self._memory.pop(key))
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def _put_disk(self, key, data):
+        # Write under a temporary name so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Error writing render cache: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(self.suffix):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    # Evicted by another worker meanwhile
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+        if self.disk_bytes and os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(self.suffix):
+                    os.remove(entry.path)
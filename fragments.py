@@ -0,0 +1,66 @@
+import hashlib
+from collections import Counter
+
+# Fewest copies of a tag for which a shared form is smaller than drawing it
+REPEAT_THRESHOLD = 3
+
+
+class FragmentCache:
+    """
+    Draw function wrapper that renders every tag appearing at least
+    REPEAT_THRESHOLD times into a form XObject the first time it is drawn,
+    and stamps that form into every later slot with the same tag. Rarer
+    tags are drawn directly.
+
+    When the tags are only known as they arrive, each tag is counted as it
+    is drawn and its form is made on its REPEAT_THRESHOLD-th copy.
+    """
+
+    def __init__(self, draw_tag, tags=None):
+        """
+        :param draw_tag: The draw_* function for a single tag.
+        :param tags: All tags of the document, to find the repeated ones, or
+            None to count them while drawing.
+        """
+        self.draw_tag = draw_tag
+        self._seen = None if tags is not None else Counter()
+        counts = Counter(tag.key() for tag in tags) if tags is not None else {}
+        self._form_names = {
+            key: None for key, count in counts.items() if count >= REPEAT_THRESHOLD
+        }
+
+    def _form_name(self, key, cell_width, cell_height):
+        name = self._form_names[key]
+        if name is None:
+            digest = hashlib.md5(
+                repr((self.draw_tag.__name__, cell_width, cell_height, key)).encode(
+                    "utf8"
+                )
+            ).hexdigest()
+            name = self._form_names[key] = f"tag_{digest}"
+        return name
+
+    def __call__(self, c, x_start, y_start, cell_width, cell_height, tag):
+        key = tag.key()
+        if self._seen is not None and key not in self._form_names:
+            self._seen[key] += 1
+            if self._seen[key] >= REPEAT_THRESHOLD:
+                del self._seen[key]
+                self._form_names[key] = None
+        if key not in self._form_names:
+            self.draw_tag(c, x_start, y_start, cell_width, cell_height, tag)
+            return
+
+        form_name = self._form_name(key, cell_width, cell_height)
+        if not c.hasForm(form_name):
+            # Leave room for content that runs past the cell edges
+            c.beginForm(
+                form_name, -cell_width, -cell_height, 2 * cell_width, 2 * cell_height
+            )
+            self.draw_tag(c, 0, 0, cell_width, cell_height, tag)
+            c.endForm()
+
+        c.saveState()
+        c.translate(x_start, y_start)
+        c.doForm(form_name)
+        c.restoreState()
@@ -0,0 +1,171 @@
+"""
+Canvas that drops graphics state changes which would not change anything.
+
+The draw functions set the stroke color, dash, line width and font for every
+tag, and reportlab writes each call to the content stream even when the
+value is already current. The canvas keeps the last value of every state
+operator, per saveState level, and leaves out the ones that repeat it. Fonts
+are set inside every text object for TrueType fonts, so the Tf of a text
+object is dropped when it repeats the font the text state already has.
+
+The state is only known from what this canvas wrote itself: a new page
+starts from the PDF defaults and a form starts from nothing, since it runs
+in the state of whatever page draws it.
+
+It also counts the operators it writes, so the templates that bloat the
+content stream can be found in /metrics.
+"""
+
+import os
+import re
+from collections import Counter
+
+from stream import CompactingCanvas
+
+TRACK_GRAPHICS_STATE = os.environ.get("PDF_STATE_TRACKING", "1").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# The state every page starts with, as reportlab writes it
+PAGE_DEFAULTS = {
+    "fill": "0 0 0 rg",
+    "stroke": "0 0 0 RG",
+    "line_width": "1 w",
+    "dash": "[] 0 d",
+    "line_cap": "0 J",
+    "line_join": "0 j",
+}
+
+# Operators that change the state of the keys above when written by other
+# means, such as a text object
+STATE_OPERATORS = frozenset(
+    ("rg", "RG", "k", "K", "g", "G", "cs", "CS", "scn", "SCN", "sc", "SC")
+    + ("w", "d", "J", "j", "M", "gs")
+)
+
+# A literal string, which reportlab writes with its parentheses escaped
+_STRING = re.compile(r"(\((?:\\.|[^\\()])*\))", re.S)
+_FONT = re.compile(r"/\S+ \S+ Tf \S+ TL ?")
+
+
+class StateTrackingCanvas(CompactingCanvas):
+    """
+    CompactingCanvas that leaves out redundant state changes and counts the
+    state changes, text objects, images and forms it writes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.operator_counts = Counter()
+        self._state = dict(PAGE_DEFAULTS)
+        self._state_stack = []
+        super().__init__(*args, **kwargs)
+
+    def _track(self, key, method, *args, **kwargs):
+        code = self._code
+        start = len(code)
+        method(*args, **kwargs)
+        operator = " ".join(code[start:])
+        if not operator:
+            return
+        if "gs" in operator.split():
+            # Transparency is not tracked
+            self._state.pop(key, None)
+        elif self._state.get(key) == operator:
+            del code[start:]
+            self.operator_counts["dropped"] += 1
+            return
+        else:
+            self._state[key] = operator
+        self.operator_counts["state"] += 1
+
+    def _font_operator(self, match):
+        operator = match.group(0).strip()
+        if self._state.get("font") == operator:
+            self.operator_counts["dropped"] += 1
+            return ""
+        self._state["font"] = operator
+        self.operator_counts["state"] += 1
+        return match.group(0)
+
+    def _drop_font_operators(self, code):
+        pieces = _STRING.split(code)
+        for i in range(0, len(pieces), 2):
+            if STATE_OPERATORS.intersection(pieces[i].split()):
+                # Set by hand inside the text object, so no longer known
+                for key in PAGE_DEFAULTS:
+                    self._state.pop(key, None)
+            pieces[i] = _FONT.sub(self._font_operator, pieces[i])
+        return "".join(pieces)
+
+    def setFillColor(self, aColor, alpha=None):
+        self._track("fill", super().setFillColor, aColor, alpha)
+
+    def setStrokeColor(self, aColor, alpha=None):
+        self._track("stroke", super().setStrokeColor, aColor, alpha)
+
+    def setFillGray(self, gray, alpha=None):
+        self._track("fill", super().setFillGray, gray, alpha)
+
+    def setStrokeGray(self, gray, alpha=None):
+        self._track("stroke", super().setStrokeGray, gray, alpha)
+
+    def setLineWidth(self, width):
+        self._track("line_width", super().setLineWidth, width)
+
+    def setDash(self, array=[], phase=0):
+        self._track("dash", super().setDash, array, phase)
+
+    def setLineCap(self, mode):
+        self._track("line_cap", super().setLineCap, mode)
+
+    def setLineJoin(self, mode):
+        self._track("line_join", super().setLineJoin, mode)
+
+    def setFont(self, psfontname, size, leading=None):
+        code = self._code
+        start = len(code)
+        super().setFont(psfontname, size, leading)
+        # Only fonts that are not embedded write their own BT Tf TL ET
+        if len(code) > start:
+            code[start:] = [
+                text
+                for text in map(self._drop_font_operators, code[start:])
+                if text.split() != ["BT", "ET"]
+            ]
+
+    def drawText(self, aTextObject):
+        self.operator_counts["text"] += 1
+        self._code.append(self._drop_font_operators(str(aTextObject.getCode())))
+
+    def drawImage(self, *args, **kwargs):
+        self.operator_counts["image"] += 1
+        return super().drawImage(*args, **kwargs)
+
+    def doForm(self, name):
+        self.operator_counts["form"] += 1
+        super().doForm(name)
+
+    def saveState(self):
+        self._state_stack.append(dict(self._state))
+        super().saveState()
+
+    def restoreState(self):
+        self._state = self._state_stack.pop()
+        super().restoreState()
+
+    def beginForm(self, *args, **kwargs):
+        # A form is drawn in the state of the page that uses it
+        self._state_stack.append(self._state)
+        self._state = {}
+        super().beginForm(*args, **kwargs)
+
+    def endForm(self, **extra_attributes):
+        super().endForm(**extra_attributes)
+        self._state = self._state_stack.pop()
+
+    def showPage(self):
+        super().showPage()
+        self._state = dict(PAGE_DEFAULTS)
+        self._state_stack = []
@@ -0,0 +1,168 @@
+"""
+Streaming CSV ingestion that does not need pandas.
+
+The catalog is parsed row by row with the csv module and every row is
+normalized into a TagRecord as it is read, following the same rules as
+records.normalize_catalog, so the first page can be drawn before the last
+line is parsed.
+
+Unlike pandas, cells are kept as typed instead of being coerced to numbers
+first, so a size price of 150 prints as "150" even when other rows leave it
+empty, rather than as "150.0".
+"""
+
+import csv
+import io
+import math
+
+from records import (
+    BRAND_COLUMN,
+    COLOR_COLUMN,
+    DISCOUNT_COLUMN,
+    GROUNDING_COLUMN,
+    MAX_COPIES,
+    MODEL_COLUMN,
+    PRICE_COLUMN,
+    QUANTITY_COLUMN,
+    SIZE_COLUMNS,
+    SIZE_PRICE_COLUMNS,
+    THICKNESS_COLUMN,
+    TRUE_FLAGS,
+    VEGAN_COLUMN,
+    TagRecord,
+)
+
+# Cells pandas.read_csv treats as missing, read as "nan" like it does
+NA_VALUES = frozenset(
+    (
+        "",
+        "#N/A",
+        "#N/A N/A",
+        "#NA",
+        "-1.#IND",
+        "-1.#QNAN",
+        "-NaN",
+        "-nan",
+        "1.#IND",
+        "1.#QNAN",
+        "<NA>",
+        "N/A",
+        "NA",
+        "NULL",
+        "NaN",
+        "None",
+        "n/a",
+        "nan",
+        "null",
+    )
+)
+
+
+def parse_number(text):
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+    return value if math.isfinite(value) else None
+
+
+class CsvCatalog:
+    """
+    A catalog read lazily from CSV text. Iterating it yields one TagRecord
+    per row as the rows are parsed; it can only be iterated once.
+    """
+
+    def __init__(self, lines, size_hint=None):
+        """
+        :param lines: An iterable of CSV text lines, such as a text file.
+        :param size_hint: The approximate number of rows, if known.
+        :raises ValueError: When the CSV has no header row.
+        """
+        self._reader = csv.reader(lines)
+        header = next(self._reader, None)
+        if not header:
+            raise ValueError("The CSV has no header row")
+        header[0] = header[0].lstrip("\ufeff")
+
+        self.columns = header
+        self.size_hint = size_hint
+        self.rows = 0  # Rows read so far
+        self._index = {}
+        for i, column in enumerate(header):
+            self._index.setdefault(column, i)
+
+    def _cell(self, row, column, default):
+        i = self._index.get(column)
+        if i is None:
+            return default
+        value = row[i] if i < len(row) else ""
+        return "nan" if value in NA_VALUES else value
+
+    def _number(self, row, column):
+        if column not in self._index:
+            return None
+        return parse_number(self._cell(row, column, ""))
+
+    def _flag(self, row, column):
+        return self._cell(row, column, "").strip().lower() in TRUE_FLAGS
+
+    def _size_price_pairs(self, row):
+        pairs = []
+        for size_column, price_column in zip(SIZE_COLUMNS, SIZE_PRICE_COLUMNS):
+            if size_column not in self._index or price_column not in self._index:
+                continue
+            size_range = self._cell(row, size_column, "").strip()
+            price_value = self._cell(row, price_column, "").strip()
+            if (
+                size_range
+                and price_value
+                and size_range.lower() != "nan"
+                and price_value.lower() != "nan"
+            ):
+                pairs.append((size_range, price_value))
+        return pairs
+
+    def _record(self, row):
+        price = self._number(row, PRICE_COLUMN)
+        thickness = self._number(row, THICKNESS_COLUMN)
+        discount = self._number(row, DISCOUNT_COLUMN)
+        copies = self._number(row, QUANTITY_COLUMN)
+        return TagRecord(
+            self._cell(row, MODEL_COLUMN, "N/A").upper(),
+            self._cell(row, COLOR_COLUMN, "N/A").upper(),
+            (
+                f"{price:,.2f}"
+                if price is not None
+                else self._cell(row, PRICE_COLUMN, "N/A")
+            ),
+            self._cell(row, BRAND_COLUMN, "None"),
+            f"{thickness:.1f}" if thickness is not None else "N/A",
+            self._cell(row, THICKNESS_COLUMN, "N/A"),
+            self._flag(row, VEGAN_COLUMN),
+            self._flag(row, GROUNDING_COLUMN),
+            str(int(discount)) if discount is not None else None,
+            self._size_price_pairs(row),
+            min(MAX_COPIES, max(0, int(copies))) if copies is not None else 1,
+        )
+
+    def __iter__(self):
+        for row in self._reader:
+            # Blank lines are skipped, like pandas does
+            if row:
+                self.rows += 1
+                yield self._record(row)
+
+
+def read_catalog(csv_data):
+    """
+    Reads the header of the CSV text and returns the catalog, whose rows are
+    parsed as it is iterated.
+
+    :param csv_data: The CSV text.
+    :return: A CsvCatalog, or None if the CSV has no header.
+    """
+    try:
+        return CsvCatalog(io.StringIO(csv_data), size_hint=csv_data.count("\n"))
+    except (csv.Error, ValueError) as e:
+        print(f"Error processing CSV: {e}")
+        return None
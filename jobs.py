@@ -0,0 +1,231 @@
+"""
+Background render jobs for catalogs too large to render within a request.
+
+Jobs run in a bounded thread pool inside the web process that accepted
+them. Their state is kept as a JSON file per job in JOB_DIR, so any worker
+can report on a job, and the finished PDF is stored in the render cache
+under the job's ETag rather than with the job; serving it needs the disk
+tier of the render cache, which all workers share. A job is forgotten
+JOB_TTL seconds after it last changed, and at most JOB_RETAIN finished jobs
+are kept, the oldest dropped first.
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import RENDER_CACHE_DIR
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+# Most jobs that may be queued or running at once in one web process
+JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", 16))
+JOB_TTL = int(os.environ.get("JOB_TTL", 60 * 60))
+# Most finished jobs whose state is kept
+JOB_RETAIN = int(os.environ.get("JOB_RETAIN", 256))
+JOB_DIR = os.environ.get("JOB_DIR", os.path.join(RENDER_CACHE_DIR, "jobs"))
+# Seconds between saves of the progress of a running job
+JOB_SAVE_INTERVAL = 0.5
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# A job id as made by Job
+JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """
+    State of a single render job.
+    """
+
+    def __init__(self, template, job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.template = template
+        self.status = QUEUED
+        self.rendered = 0  # Tags drawn so far
+        self.total = None  # Tags in the catalog, known once it is parsed
+        self.error = None
+        self.problems = {}  # Count of catalog problems by kind
+        self.etag = None  # The render cache key of the PDF
+        self.created = time.time()
+        self.finished = None
+        self.save = None  # Set by the JobRunner to store the state
+        self._saved = 0
+
+    def progress(self, rendered, total):
+        self.rendered = rendered
+        self.total = total
+        now = time.monotonic()
+        if self.save is not None and now - self._saved >= JOB_SAVE_INTERVAL:
+            self._saved = now
+            self.save(self)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "template": self.template,
+            "status": self.status,
+            "rendered": self.rendered,
+            "total": self.total,
+            "error": self.error,
+            "problems": self.problems,
+        }
+
+    def state(self):
+        # Everything to_dict has, and what is needed to restore the job
+        return dict(
+            self.to_dict(), etag=self.etag, created=self.created, finished=self.finished
+        )
+
+
+def _restore(state):
+    job = Job(state["template"], state["id"])
+    for name in ("status", "rendered", "total", "error", "problems", "etag"):
+        setattr(job, name, state[name])
+    job.created = state["created"]
+    job.finished = state["finished"]
+    return job
+
+
+class JobRunner:
+    """
+    Runs render jobs in a bounded worker pool and keeps their state on disk
+    until it expires.
+    """
+
+    def __init__(
+        self,
+        workers=JOB_WORKERS,
+        queue_limit=JOB_QUEUE_LIMIT,
+        ttl=JOB_TTL,
+        retain=JOB_RETAIN,
+        job_dir=JOB_DIR,
+    ):
+        self.queue_limit = queue_limit
+        self.ttl = ttl
+        self.retain = retain
+        self.job_dir = job_dir
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="render-job"
+        )
+        # The jobs of this process that are queued or running
+        self._pending = {}
+        self._lock = threading.Lock()
+        os.makedirs(job_dir, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.json")
+
+    def _save(self, job):
+        # Write under a temporary name so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.job_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(job.state(), f)
+            os.replace(tmp_path, self._path(job.id))
+        except OSError as e:
+            print(f"Error saving job {job.id}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _load(self, job_id):
+        try:
+            with open(self._path(job_id)) as f:
+                return _restore(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _expire(self):
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.job_dir):
+            if entry.name.endswith(".json"):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    continue
+        finished = 0
+        # Newest first, so the oldest finished jobs are the ones dropped
+        for mtime, path in sorted(entries, reverse=True):
+            job_id = os.path.basename(path)[: -len(".json")]
+            if job_id in self._pending:
+                continue
+            if now - mtime <= self.ttl:
+                job = self._load(job_id)
+                if job is None or job.finished is None:
+                    continue
+                finished += 1
+                if finished <= self.retain:
+                    continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def submit(self, template, render, problems=None):
+        """
+        Queues a render job.
+
+        :param template: The template name, reported back with the job.
+        :param render: Called as render(job) in a worker; stores the PDF in
+            the render cache under job.etag and updates the job through
+            job.progress.
+        :param problems: The count of catalog problems by kind, reported
+            back with the job.
+        :return: The new Job.
+        :raises QueueFull: When JOB_QUEUE_LIMIT jobs of this process are
+            already pending.
+        """
+        job = Job(template)
+        job.problems = problems or {}
+        job.save = self._save
+        with self._lock:
+            self._expire()
+            pending = len(self._pending)
+            if pending >= self.queue_limit:
+                raise QueueFull(f"{pending} render jobs are already pending")
+            self._pending[job.id] = job
+
+        self._save(job)
+        self._executor.submit(self._run, job, render)
+        return job
+
+    def _run(self, job, render):
+        job.status = RUNNING
+        self._save(job)
+        try:
+            render(job)
+            job.status = DONE
+        except Exception as e:
+            print(f"Error rendering job {job.id}: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        job.finished = time.time()
+        self._save(job)
+        with self._lock:
+            del self._pending[job.id]
+
+    def get(self, job_id):
+        """
+        :return: The job, from whichever process runs it, or None if it is
+            unknown or expired.
+        """
+        if not JOB_ID.fullmatch(job_id):
+            return None
+        job = self._load(job_id)
+        if job is None:
+            return None
+        if time.time() - (job.finished or job.created) > self.ttl:
+            return None
+        return job
@@ -0,0 +1,136 @@
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.units import cm
+
+# Size of the price tag cell every template is designed for
+TAG_WIDTH = 24.3 * cm
+TAG_HEIGHT = 3.3 * cm
+
+CUT_MARK_LENGTH = 0.4 * cm
+
+
+class GridLayout:
+    """
+    Precomputed slot table for placing tags on a page grid.
+
+    Slots are filled left to right, then top to bottom, starting at the top
+    left margin. The page size, margins, cell size and the gutter between
+    cells can be changed to fit a different tag size or more tags per page.
+    """
+
+    def __init__(
+        self,
+        pagesize=landscape(A4),
+        cell_width=TAG_WIDTH,
+        cell_height=TAG_HEIGHT,
+        margin=1 * cm,
+        gutter=0,
+        cut_marks=False,
+    ):
+        """
+        :param pagesize: The (width, height) of the page.
+        :param cell_width: The width of a tag cell.
+        :param cell_height: The height of a tag cell.
+        :param margin: The page margin on every side.
+        :param gutter: The space between neighbouring cells.
+        :param cut_marks: Draw crop marks in the margins at the cell edges.
+        """
+        self.pagesize = pagesize
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.margin = margin
+        self.gutter = gutter
+        self.cut_marks = cut_marks
+
+        page_width, page_height = pagesize
+        self.columns = int((page_width - 2 * margin + gutter) // (cell_width + gutter))
+        self.rows = int((page_height - 2 * margin + gutter) // (cell_height + gutter))
+        if self.columns < 1 or self.rows < 1:
+            raise ValueError("The tag cell does not fit on the page")
+
+        top = page_height - margin - cell_height
+        self.slots = [
+            (
+                margin + column * (cell_width + gutter),
+                top - row * (cell_height + gutter),
+            )
+            for row in range(self.rows)
+            for column in range(self.columns)
+        ]
+
+    @property
+    def per_page(self):
+        return len(self.slots)
+
+    def page_count(self, tag_count):
+        return max(1, -(-tag_count // self.per_page))
+
+    def draw_cut_marks(self, c):
+        """
+        Draws short crop marks in the page margins in line with every cell
+        edge.
+        """
+        page_width, page_height = self.pagesize
+        left = self.margin
+        right = left + self.columns * self.cell_width + (self.columns - 1) * self.gutter
+        top = page_height - self.margin
+        bottom = top - self.rows * self.cell_height - (self.rows - 1) * self.gutter
+
+        xs = set()
+        for column in range(self.columns):
+            x = left + column * (self.cell_width + self.gutter)
+            xs.update((x, x + self.cell_width))
+        ys = set()
+        for row in range(self.rows):
+            y = top - row * (self.cell_height + self.gutter)
+            ys.update((y, y - self.cell_height))
+
+        c.saveState()
+        c.setLineWidth(0.5)
+        c.setStrokeGray(0)
+        for x in sorted(xs):
+            c.line(x, top + 2, x, top + 2 + CUT_MARK_LENGTH)
+            c.line(x, bottom - 2, x, bottom - 2 - CUT_MARK_LENGTH)
+        for y in sorted(ys):
+            c.line(left - 2, y, left - 2 - CUT_MARK_LENGTH, y)
+            c.line(right + 2, y, right + 2 + CUT_MARK_LENGTH, y)
+        c.restoreState()
+
+
+def render_grid(c, layout, tags, draw_tag, progress=None):
+    """
+    Draws every tag into the next free slot of the layout, starting a new
+    page whenever the current one is full.
+
+    :param c: The canvas object to draw on.
+    :param layout: The GridLayout to place the tags with.
+    :param tags: The tag records to draw, a list or any iterable.
+    :param draw_tag: Called as draw_tag(c, x, y, cell_width, cell_height, tag).
+    :param progress: Called as progress(rendered, total) after every page.
+    :return: The number of tags drawn.
+    """
+    slots = layout.slots
+    per_page = len(slots)
+    cell_width = layout.cell_width
+    cell_height = layout.cell_height
+
+    # Tags read lazily are only counted once the last one is drawn
+    total = len(tags) if hasattr(tags, "__len__") else None
+    rendered = 0
+    slot = 0
+    for tag in tags:
+        if slot == per_page:
+            c.showPage()
+            slot = 0
+            if progress is not None:
+                progress(rendered, total)
+        if slot == 0 and layout.cut_marks:
+            layout.draw_cut_marks(c)
+
+        x_start, y_start = slots[slot]
+        draw_tag(c, x_start, y_start, cell_width, cell_height, tag)
+        slot += 1
+        rendered += 1
+
+    if progress is not None:
+        progress(rendered, rendered)
+    return rendered
@@ -0,0 +1,147 @@
+"""
+Glyph advance tables for the registered fonts, batched string measurement
+and auto-fitting of text to a box.
+
+Each font's advance widths are read once into a lookup table indexed by
+code point. A whole column of strings is measured in one pass with numpy,
+and every measured width is remembered per font, so fitting the same model
+name, color or price again costs a dictionary lookup.
+"""
+
+import os
+
+from reportlab.pdfbase import pdfmetrics
+
+try:
+    import numpy as np
+except ImportError:  # Strings are then measured one at a time
+    np = None
+
+# Shrink model names, colors and prices that do not fit their box
+AUTO_FIT = os.environ.get("TAG_AUTO_FIT", "1").lower() in ("1", "true", "yes")
+# Smallest fraction of the design font size auto-fit shrinks text to
+MIN_FIT_SCALE = 0.4
+# Widths remembered per font before the cache is started over
+WIDTH_CACHE_SIZE = 100_000
+
+BMP_SIZE = 0x10000
+
+_fonts = {}
+
+
+class FontMetrics:
+    """
+    Advance widths of one font, in thousandths of the font size.
+    """
+
+    def __init__(self, font_name):
+        face = pdfmetrics.getFont(font_name).face
+        self.font_name = font_name
+        self.char_widths = face.charWidths
+        self.default_width = face.defaultWidth
+        self._cache = {}
+
+        self.table = None
+        if np is not None:
+            # Characters outside the basic plane get the default width
+            self.table = np.full(BMP_SIZE + 1, self.default_width, dtype=np.float64)
+            for code, width in self.char_widths.items():
+                if code < BMP_SIZE:
+                    self.table[code] = width
+
+    def _measure_one(self, text):
+        get = self.char_widths.get
+        default = self.default_width
+        return sum(get(ord(char), default) for char in text)
+
+    def measure(self, texts):
+        """
+        Measures every string in one pass and remembers the widths.
+
+        :param texts: The strings to measure.
+        :return: The list of widths in thousandths of the font size.
+        """
+        # The result is built from the widths found here rather than read
+        # back from the cache, which another thread may clear meanwhile
+        cache = self._cache
+        widths = {}
+        missing = []
+        for text in set(texts):
+            units = cache.get(text)
+            if units is None:
+                missing.append(text)
+            else:
+                widths[text] = units
+        if missing:
+            if self.table is not None:
+                codes = np.frombuffer(
+                    "".join(missing).encode("utf-32-le"), dtype=np.uint32
+                )
+                advances = self.table[np.minimum(codes, BMP_SIZE)]
+                # Each width is the difference of the running total at the
+                # end and at the start of its string
+                totals = np.concatenate(([0.0], np.cumsum(advances)))
+                lengths = np.fromiter(map(len, missing), dtype=np.int64)
+                ends = np.cumsum(lengths)
+                starts = ends - lengths
+                measured = dict(zip(missing, (totals[ends] - totals[starts]).tolist()))
+            else:
+                measured = {text: self._measure_one(text) for text in missing}
+            widths.update(measured)
+            if len(cache) + len(measured) > WIDTH_CACHE_SIZE:
+                cache.clear()
+            cache.update(measured)
+        return [widths[text] for text in texts]
+
+    def width(self, text, size):
+        units = self._cache.get(text)
+        if units is None:
+            if len(self._cache) >= WIDTH_CACHE_SIZE:
+                self._cache.clear()
+            units = self._cache[text] = self._measure_one(text)
+        return units * size / 1000
+
+
+def font_metrics(font_name):
+    metrics = _fonts.get(font_name)
+    if metrics is None:
+        metrics = _fonts[font_name] = FontMetrics(font_name)
+    return metrics
+
+
+def string_width(text, font_name, size):
+    """
+    Same result as canvas.stringWidth, from the cached advance table.
+    """
+    return font_metrics(font_name).width(text, size)
+
+
+def fit_font_size(text, font_name, size, max_width):
+    """
+    Calculates the font size at which the text fits the width.
+
+    :param text: The text to draw.
+    :param font_name: The name of a registered TrueType font.
+    :param size: The design font size, never exceeded.
+    :param max_width: The width of the box the text is drawn in.
+    :return: The design size if the text fits or auto-fit is off, otherwise
+        the size that fills the width, but at least MIN_FIT_SCALE of it.
+    """
+    if not AUTO_FIT:
+        return size
+    width = string_width(text, font_name, size)
+    if width <= max_width:
+        return size
+    return max(size * max_width / width, size * MIN_FIT_SCALE)
+
+
+def prime_tags(tags, fonts):
+    """
+    Measures the text of every tag up front, one batch per field, so the
+    draw functions only look the widths up.
+
+    :param tags: The list of tag records.
+    :param fonts: Pairs of (TagRecord attribute, font name) to measure.
+    """
+    for attribute, font_name in fonts:
+        font_metrics(font_name).measure([getattr(tag, attribute) for tag in tags])
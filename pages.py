@@ -0,0 +1,146 @@
+"""
+Incremental reprints of the pages that changed between catalog versions.
+
+Every page of a render is fingerprinted by the normalized tag records placed
+on it, together with the template, layout, output profile and asset version
+it is drawn with. The fingerprints of a render are kept as its page
+manifest, stored under the render's ETag. A render of a new catalog version
+that names an earlier one (since=<ETag>) compares the two manifests page by
+page and draws only the tags of the pages that differ, each on a page of its
+own, so staff reprint only those. A page that moves, because rows were added
+or removed before it, counts as changed: its printed sheet is different.
+
+Rendered pages are not cached to be spliced into full documents: merging
+them with pypdf was measured at 5 s for a 1,000 tag catalog that renders in
+0.3 s, with the fonts of every page embedded again. Full documents are drawn
+whole or served from the render cache as before, and the page manifests are
+what is cached.
+"""
+
+import hashlib
+import itertools
+import os
+
+from cache import RENDER_CACHE_DIR
+from profiles import get_profile
+
+PAGE_MANIFEST_DIR = os.environ.get(
+    "PAGE_MANIFEST_DIR", os.path.join(RENDER_CACHE_DIR, "pages")
+)
+PAGE_MANIFEST_MEMORY_BYTES = int(
+    os.environ.get("PAGE_MANIFEST_MEMORY_BYTES", 4 * 1024 * 1024)
+)
+PAGE_MANIFEST_DISK_BYTES = int(
+    os.environ.get("PAGE_MANIFEST_DISK_BYTES", 64 * 1024 * 1024)
+)
+
+
+def render_digest(draw_tag, layout, profile, asset_version):
+    """
+    Hashes what every page of a render is drawn with.
+
+    :param draw_tag: The draw_* function for a single tag.
+    :param layout: The GridLayout to place the tags with.
+    :param profile: The OutputProfile, the default profile if None.
+    :param asset_version: The version of the logos and fonts in use.
+    :return: The hash object, to be copied for each page.
+    """
+    render = hashlib.sha256()
+    for part in (
+        draw_tag.__name__,
+        (profile or get_profile()).name,
+        asset_version,
+        layout.pagesize,
+        layout.cell_width,
+        layout.cell_height,
+        layout.margin,
+        layout.gutter,
+        layout.cut_marks,
+    ):
+        render.update(repr(part).encode("utf8"))
+        render.update(b"\0")
+    return render
+
+
+def page_key(render, page_tags):
+    """
+    :param render: The hash object made by render_digest.
+    :param page_tags: The tag records placed on the page.
+    :return: The hex digest of the page.
+    """
+    digest = render.copy()
+    for tag in page_tags:
+        digest.update(repr(tag.key()).encode("utf8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class PageSelection:
+    """
+    Picks the pages of a render that changed since a previous version, and
+    records the page manifest of the new one.
+    """
+
+    def __init__(self, asset_version, previous=None, changed_only=False):
+        """
+        :param asset_version: The version of the logos and fonts in use.
+        :param previous: The page manifest of the previous version, or None
+            if it is not known, in which case every page has changed.
+        :param changed_only: Draw only the changed pages instead of all.
+        """
+        self.asset_version = asset_version
+        self.previous = previous
+        self.changed_only = changed_only
+        self.page_keys = []
+        self.changed = []
+
+    def select(self, tags, draw_tag, layout, profile=None):
+        """
+        Fingerprints the pages of the render as their tags are read, so
+        tags parsed lazily are still drawn as they come. The page manifest
+        and the changed pages are complete once the tags returned are all
+        read.
+
+        :param tags: The tag records, copies expanded, as any iterable.
+        :param draw_tag: The draw_* function for a single tag.
+        :param layout: The GridLayout to place the tags with.
+        :param profile: The OutputProfile, the default profile if None.
+        :return: An iterator over the tags to draw: all of them, or those of
+            the changed pages when only those are asked for.
+        """
+        render = render_digest(draw_tag, layout, profile, self.asset_version)
+        previous = self.previous or []
+        per_page = layout.per_page
+        tags = iter(tags)
+        while True:
+            page_tags = list(itertools.islice(tags, per_page))
+            if not page_tags:
+                return
+            page = len(self.page_keys)
+            key = page_key(render, page_tags)
+            self.page_keys.append(key)
+            changed = page >= len(previous) or previous[page] != key
+            if changed:
+                self.changed.append(page)
+            if changed or not self.changed_only:
+                yield from page_tags
+
+
+def save_manifest(manifests, etag, keys):
+    """
+    Stores the page manifest of a render under its ETag.
+
+    :param manifests: The RenderCache holding the manifests.
+    """
+    manifests.put(etag, "\n".join(keys).encode("ascii"))
+
+
+def load_manifest(manifests, etag):
+    """
+    :param manifests: The RenderCache holding the manifests.
+    :return: The page manifest stored under the ETag, or None.
+    """
+    data = manifests.get(etag)
+    if data is None:
+        return None
+    return data.decode("ascii").split("\n")
@@ -0,0 +1,161 @@
+"""
+Page-sharded rendering of large catalogs in a pool of worker processes.
+
+The normalized tags are split into chunks that each fill whole pages, every
+chunk is rendered into its own PDF by a worker and the chunks are merged in
+order. Catalogs below PARALLEL_THRESHOLD tags are rendered in-process.
+
+The workers are spawned rather than forked, since the web process may
+already be running render job threads when the pool starts. If a worker
+dies, such as killed for running out of memory, the pool is dropped, the
+catalog is rendered in-process instead and the next large catalog starts a
+new pool.
+"""
+
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from telemetry import collect, count_operators, phase
+
+try:
+    from pypdf import PdfWriter
+except ImportError:  # Parallel rendering needs pypdf to merge the chunks
+    PdfWriter = None
+
+# Smallest catalog, in tags, worth the cost of sharding across processes
+PARALLEL_THRESHOLD = int(os.environ.get("PARALLEL_RENDER_THRESHOLD", 1000))
+RENDER_PROCESSES = int(os.environ.get("RENDER_PROCESSES", os.cpu_count() or 1))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _warm_up():
+    # Register the fonts and decode the assets before the first chunk arrives
+    import bot  # noqa: F401
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            pool = ProcessPoolExecutor(
+                max_workers=RENDER_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_up,
+            )
+            # Start every worker now rather than on the first large request
+            try:
+                for future in [pool.submit(os.getpid) for _ in range(RENDER_PROCESSES)]:
+                    future.result()
+            except BrokenProcessPool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+            _pool = pool
+        return _pool
+
+
+def _drop_pool(pool):
+    # Another thread may have replaced the broken pool already
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def should_render_in_parallel(tag_count):
+    return (
+        PdfWriter is not None
+        and RENDER_PROCESSES > 1
+        and tag_count >= PARALLEL_THRESHOLD
+    )
+
+
+def split_pages(tags, per_page, chunk_count):
+    """
+    Splits the tags into at most chunk_count chunks that each start on a new
+    page, so the merged chunks have the same layout as a single render.
+
+    :param tags: The list of tag records.
+    :param per_page: The number of tags on a full page.
+    :param chunk_count: The maximum number of chunks.
+    :return: A list of tag lists.
+    """
+    pages = -(-len(tags) // per_page)
+    pages_per_chunk = max(1, -(-pages // chunk_count))
+    chunk_size = pages_per_chunk * per_page
+    return [tags[i : i + chunk_size] for i in range(0, len(tags), chunk_size)]
+
+
+def _render_chunk(render_tags, tags, draw_tag, layout, profile):
+    # The operator counts are returned to the process serving the request
+    with collect() as record:
+        pdf_data = render_tags(tags, draw_tag, layout, profile=profile).getvalue()
+    return pdf_data, dict(record.operators) if record is not None else {}
+
+
+def _render_chunks(pool, render_tags, tags, draw_tag, layout, progress, profile):
+    chunks = split_pages(tags, layout.per_page, RENDER_PROCESSES)
+    futures = [
+        pool.submit(_render_chunk, render_tags, chunk, draw_tag, layout, profile)
+        for chunk in chunks
+    ]
+
+    with phase("draw"):
+        if progress is not None:
+            chunk_sizes = {f: len(chunk) for f, chunk in zip(futures, chunks)}
+            rendered = 0
+            for future in as_completed(futures):
+                rendered += chunk_sizes[future]
+                progress(rendered, len(tags))
+        chunk_pdfs = []
+        for future in futures:
+            pdf_data, operators = future.result()
+            for (template, operator), value in operators.items():
+                count_operators(template, {operator: value})
+            chunk_pdfs.append(pdf_data)
+    return chunk_pdfs
+
+
+def render_parallel(render_tags, tags, draw_tag, layout, progress=None, profile=None):
+    """
+    Renders the tags in page-aligned chunks across the worker pool.
+
+    :param render_tags: The single-process renderer, called in each worker as
+        render_tags(tags, draw_tag, layout, profile=profile) and returning
+        a BytesIO.
+    :param tags: The list of tag records.
+    :param draw_tag: The draw_* function for a single tag.
+    :param layout: The GridLayout to place the tags with.
+    :param progress: Called as progress(rendered, total) as chunks finish.
+    :param profile: The OutputProfile of every chunk.
+    :return: The merged PDF as a rewound BytesIO.
+    """
+    pool = None
+    try:
+        pool = _get_pool()
+        chunk_pdfs = _render_chunks(
+            pool, render_tags, tags, draw_tag, layout, progress, profile
+        )
+    except BrokenProcessPool as e:
+        print(f"Error rendering in the process pool, rendering in-process: {e}")
+        if pool is not None:
+            _drop_pool(pool)
+        return render_tags(tags, draw_tag, layout, progress=progress, profile=profile)
+
+    with phase("merge"):
+        writer = PdfWriter()
+        for chunk_pdf in chunk_pdfs:
+            writer.append(io.BytesIO(chunk_pdf))
+        # Images shared by the chunks are stored once
+        writer.compress_identical_objects()
+
+        pdf_file = io.BytesIO()
+        writer.write(pdf_file)
+    pdf_file.seek(0)  # Rewind the file to the beginning
+    return pdf_file
@@ -0,0 +1,126 @@
+"""
+Prepares the logos1/ images for embedding.
+
+Every image is resampled down to the largest size any tag template draws it
+at (for the given print DPI) and its alpha channel is split into a separate
+grayscale mask, so assets.py can embed both without decoding RGBA at runtime.
+
+Re-run after adding or changing a logo:
+
+    python prepare_assets.py [--dpi 300]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+
+from PIL import Image
+
+from assets import ASSET_DIR, PREPARED_ASSET_DIR, PREPARED_MANIFEST, rgb_on_white
+
+CM_PER_INCH = 2.54
+
+# Largest box (width cm, height cm, keeps aspect ratio) each asset is drawn in
+ASSET_SIZES = {
+    "BACKGROUND": (19.7, 3.3, False),
+    "BRUSH": (4.7, 0.2, False),
+    "strip": (11.3, 1.65, False),
+    "VEGAN": (2.1, 1.2, True),
+    "GROUNDING": (2.1, 1.2, True),
+    "vegan_white": (2.1, 0.75, True),
+    "grounding_white": (2.1, 0.75, True),
+    "shekel": (0.42, 0.35, True),
+    "white_Shekel": (0.42, 0.35, True),
+    "store_logo": (2.1, 2.1, True),
+    "store_logo_kids": (2.1, 3.0, True),
+}
+
+# Brand logos: 4.2 x 2.7 cm on adult/kids tags, 3.5 x 2.5 cm on children tags
+BRAND_LOGO_SIZE = (4.2, 2.7, True)
+
+
+def target_size(image_size, box, dpi):
+    """
+    Calculates the pixel size needed to print an image in its box.
+
+    :param image_size: The (width, height) of the source image in pixels.
+    :param box: The (width cm, height cm, keeps aspect ratio) draw box.
+    :param dpi: The print resolution.
+    :return: The target (width, height), never larger than the source.
+    """
+    width, height = image_size
+    box_width = box[0] / CM_PER_INCH * dpi
+    box_height = box[1] / CM_PER_INCH * dpi
+    if box[2]:
+        scale = min(box_width / width, box_height / height, 1.0)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+    return (
+        max(1, min(width, round(box_width))),
+        max(1, min(height, round(box_height))),
+    )
+
+
+def prepare_asset(source_path, output_dir, box, dpi):
+    """
+    Writes the resampled RGB image and, if it has any transparency, its
+    alpha mask as <name>.mask.png.
+    """
+    file_name = os.path.basename(source_path)
+    stem = os.path.splitext(file_name)[0]
+
+    image = Image.open(source_path)
+    image = image.convert("RGBA")
+    size = target_size(image.size, box, dpi)
+    if size != image.size:
+        image = image.resize(size, Image.LANCZOS)
+
+    rgb_on_white(image).save(os.path.join(output_dir, file_name), optimize=True)
+
+    mask_path = os.path.join(output_dir, f"{stem}.mask.png")
+    alpha = image.getchannel("A")
+    if alpha.getextrema() != (255, 255):
+        alpha.save(mask_path, optimize=True)
+    elif os.path.exists(mask_path):
+        os.remove(mask_path)
+
+    return size
+
+
+def prepare_assets(
+    asset_dir=ASSET_DIR, output_dir=PREPARED_ASSET_DIR, dpi=300, verbose=True
+):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {"dpi": dpi, "sources": {}}
+
+    for file_name in sorted(os.listdir(asset_dir)):
+        stem, ext = os.path.splitext(file_name)
+        if ext.lower() != ".png":
+            continue
+
+        source_path = os.path.join(asset_dir, file_name)
+        box = ASSET_SIZES.get(stem, BRAND_LOGO_SIZE)
+        size = prepare_asset(source_path, output_dir, box, dpi)
+
+        with open(source_path, "rb") as f:
+            manifest["sources"][file_name] = hashlib.md5(f.read()).hexdigest()
+
+        if verbose:
+            before = os.path.getsize(source_path)
+            after = os.path.getsize(os.path.join(output_dir, file_name))
+            mask_path = os.path.join(output_dir, f"{stem}.mask.png")
+            if os.path.exists(mask_path):
+                after += os.path.getsize(mask_path)
+            print(f"{file_name}: {size[0]}x{size[1]}, {before} -> {after} bytes")
+
+    with open(os.path.join(output_dir, PREPARED_MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dpi", type=int, default=300, help="print resolution")
+    parser.add_argument("--asset-dir", default=ASSET_DIR)
+    parser.add_argument("--output-dir", default=PREPARED_ASSET_DIR)
+    args = parser.parse_args()
+    prepare_assets(args.asset_dir, args.output_dir, args.dpi)
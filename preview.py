@@ -0,0 +1,128 @@
+"""
+PNG previews of single tags, drawn by the same draw_* functions as the PDFs.
+
+A tag is drawn alone into a one-page PDF the size of its cell and
+rasterized with PyMuPDF. Most of the rasterizing time goes to the static
+layer of the template, whose background is the largest image of the tag, so
+the static layer is rasterized once per template and resolution and kept:
+a preview only draws the content of the tag itself, rasterizes it over a
+transparent background and lays it over the cached layer. The logos are
+drawn pre-scaled to the preview resolution, as the output profiles do.
+
+PyMuPDF is licensed under the AGPL, so it is not in requirements.txt; it
+has to be installed separately, and /preview answers 501 Not Implemented
+without it.
+"""
+
+import functools
+import hashlib
+import io
+import os
+
+from PIL import Image
+from reportlab.lib.units import cm
+
+from layout import TAG_HEIGHT, TAG_WIDTH
+from profiles import OutputProfile, new_canvas
+from utils import STATIC_LAYERS, draw_static_layer
+
+try:
+    import pymupdf
+except ImportError:  # Previews are only served when PyMuPDF is installed
+    pymupdf = None
+
+PREVIEW_DPI = int(os.environ.get("PREVIEW_DPI", 150))
+MIN_PREVIEW_DPI = 24
+MAX_PREVIEW_DPI = 300
+PREVIEW_CACHE_BYTES = int(os.environ.get("PREVIEW_CACHE_BYTES", 16 * 1024 * 1024))
+# Most rows drawn as thumbnails for one request
+MAX_PREVIEW_ROWS = int(os.environ.get("MAX_PREVIEW_ROWS", 1000))
+# The resolution prepare_assets.py resamples the logos for
+ASSET_DPI = 300
+
+# Room around the cell for the border stroke and content past its edges
+PADDING = 0.1 * cm
+PAGE_SIZE = (TAG_WIDTH + 2 * PADDING, TAG_HEIGHT + 2 * PADDING)
+
+
+def can_preview():
+    return pymupdf is not None
+
+
+def preview_profile(dpi):
+    """
+    The output profile of a preview: uncompressed, since the PDF is only
+    read back once, with the logos scaled down to the preview resolution in
+    steps of a quarter, so there are at most four sets of them.
+    """
+    scale = min(4, max(1, round(4 * dpi / ASSET_DPI))) / 4
+    return OutputProfile(
+        f"preview@{scale}", compression_level=0, track_state=False, asset_scale=scale
+    )
+
+
+def preview_key(draw_tag, tag, dpi, asset_version):
+    """
+    The cache key of a preview.
+    """
+    digest = hashlib.sha256()
+    for part in (draw_tag.__name__, tag.key(), dpi, asset_version):
+        digest.update(repr(part).encode("utf8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _rasterize(pdf_data, dpi, alpha):
+    page = pymupdf.open(stream=pdf_data, filetype="pdf")[0]
+    pixmap = page.get_pixmap(dpi=dpi, alpha=alpha)
+    mode = "RGBA" if alpha else "RGB"
+    return Image.frombytes(mode, (pixmap.width, pixmap.height), pixmap.samples)
+
+
+@functools.lru_cache(maxsize=64)
+def static_layer(template, dpi, asset_version):
+    """
+    Rasterizes the static layer of a template, or a white cell for
+    templates that have none.
+
+    :param template: The STATIC_LAYERS key of the template.
+    :param dpi: The resolution.
+    :param asset_version: The version of the assets drawn, so a changed
+        logo is drawn again.
+    :return: The RGBA image of the cell with its padding.
+    """
+    pdf_file = io.BytesIO()
+    c = new_canvas(pdf_file, PAGE_SIZE, preview_profile(dpi))
+    if template in STATIC_LAYERS:
+        draw_static_layer(c, template, PADDING, PADDING, TAG_WIDTH, TAG_HEIGHT)
+    # A page is written even when it is blank
+    c.showPage()
+    c.save()
+    return _rasterize(pdf_file.getvalue(), dpi, alpha=False).convert("RGBA")
+
+
+def render_preview(draw_tag, tag, template, dpi=PREVIEW_DPI, asset_version=None):
+    """
+    Draws one tag as a PNG.
+
+    :param draw_tag: The draw_* function for a single tag.
+    :param tag: The normalized TagRecord.
+    :param template: The STATIC_LAYERS key of the variant the tag is drawn
+        with, see bot.tag_variant.
+    :param dpi: The resolution, at most MAX_PREVIEW_DPI.
+    :param asset_version: The version of the assets in use.
+    :return: The PNG bytes.
+    """
+    pdf_file = io.BytesIO()
+    c = new_canvas(pdf_file, PAGE_SIZE, preview_profile(dpi))
+    # Read by utils.draw_static_layer
+    c.skip_static_layers = True
+    draw_tag(c, PADDING, PADDING, TAG_WIDTH, TAG_HEIGHT, tag)
+    c.save()
+
+    image = static_layer(template, dpi, asset_version).copy()
+    image.alpha_composite(_rasterize(pdf_file.getvalue(), dpi, alpha=True))
+    png = io.BytesIO()
+    # Fast to encode rather than small, previews are not stored for long
+    image.convert("RGB").save(png, "PNG", compress_level=1)
+    return png.getvalue()
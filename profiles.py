@@ -0,0 +1,146 @@
+"""
+Output profiles, trading render speed against PDF size.
+
+Every render picks one by name, from the "profile" form field of a request
+or PDF_PROFILE for the default:
+
+- fast: page streams compressed at zlib level 1, no graphics state
+  tracking, the logos as loaded. For a printer on the local network.
+- balanced: zlib level 6 with the redundant state operators dropped, the
+  logos as loaded. The default.
+- compact: zlib level 9, the logos resampled to half their size and their
+  colors stored as JPEG, and the font subsets numbered from 0 instead of
+  keeping ASCII characters readable in the file, which packs more glyphs
+  into each subset. For sending to a remote store.
+
+reportlab always embeds TrueType fonts as subsets of the glyphs used, so
+the subset numbering is the only font setting a profile has.
+
+The fast profile writes the PDF about a quarter faster; compact makes small
+catalogs, where the logos are most of the file, less than a third of the
+size, and large ones, where the page streams are, a few percent smaller.
+Measured with python benchmark.py --profiles fast balanced compact on the
+regular template, in tags per second and PDF size:
+
+    rows    fast              balanced          compact
+    10       965/s    275 KB   898/s    275 KB  1259/s     82 KB
+    1000    4235/s    672 KB  3318/s    653 KB  3332/s    429 KB
+    10000   4181/s   3790 KB  3430/s   3601 KB  3391/s   3467 KB
+
+The fast profile does not count the operators it writes into /metrics.
+"""
+
+import os
+
+from reportlab.pdfbase import pdfmetrics
+
+from assets import FONTS
+from gstate import TRACK_GRAPHICS_STATE, StateTrackingCanvas
+from stream import CompactingCanvas
+
+
+class OutputProfile:
+    """
+    The encoder settings of a named output profile.
+    """
+
+    def __init__(
+        self,
+        name,
+        compression_level,
+        track_state,
+        asset_scale=1.0,
+        jpeg_quality=None,
+        ascii_readable=True,
+    ):
+        """
+        :param name: The name requests select the profile by.
+        :param compression_level: The zlib level of the page streams, 0 to
+            leave them uncompressed.
+        :param track_state: Drop redundant graphics state operators, see
+            gstate.py.
+        :param asset_scale: The size of the logos relative to the prepared
+            assets.
+        :param jpeg_quality: Store the logo colors as JPEG at this quality
+            instead of losslessly.
+        :param ascii_readable: Keep ASCII characters at their own codes in
+            the font subsets.
+        """
+        self.name = name
+        self.compression_level = compression_level
+        self.track_state = track_state
+        self.asset_scale = asset_scale
+        self.jpeg_quality = jpeg_quality
+        self.ascii_readable = ascii_readable
+
+    @property
+    def asset_variant(self):
+        """
+        The (scale, JPEG quality) to re-encode the assets with, or None to
+        use them as loaded.
+        """
+        if self.asset_scale == 1.0 and not self.jpeg_quality:
+            return None
+        return self.asset_scale, self.jpeg_quality
+
+
+PROFILES = {
+    "fast": OutputProfile("fast", compression_level=1, track_state=False),
+    "balanced": OutputProfile("balanced", compression_level=6, track_state=True),
+    "compact": OutputProfile(
+        "compact",
+        compression_level=9,
+        track_state=True,
+        asset_scale=0.5,
+        jpeg_quality=85,
+        ascii_readable=False,
+    ),
+}
+
+DEFAULT_PROFILE = os.environ.get("PDF_PROFILE", "balanced")
+
+
+def get_profile(name=None):
+    """
+    :param name: The profile name, or None for the default profile.
+    :return: The OutputProfile.
+    :raises KeyError: When there is no profile of that name.
+    """
+    name = name or DEFAULT_PROFILE
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise KeyError(f"Unknown profile '{name}'") from None
+
+
+def new_canvas(pdf_file, pagesize, profile=None):
+    """
+    Creates the canvas to render tags with, set up for the output profile.
+
+    :param pdf_file: The binary file to write to.
+    :param pagesize: The page size.
+    :param profile: The OutputProfile, the default profile if None.
+    :return: A StateTrackingCanvas, or a plain CompactingCanvas when the
+        profile or PDF_STATE_TRACKING turns state tracking off.
+    """
+    profile = profile or get_profile()
+    if TRACK_GRAPHICS_STATE and profile.track_state:
+        canvas_class = StateTrackingCanvas
+    else:
+        canvas_class = CompactingCanvas
+    c = canvas_class(
+        pdf_file, pagesize=pagesize, pageCompression=int(profile.compression_level > 0)
+    )
+    c.compression_level = profile.compression_level
+    # Read by assets.draw_asset
+    c.asset_variant = profile.asset_variant
+    c.profile = profile
+
+    for font_name in FONTS:
+        try:
+            font = pdfmetrics.getFont(font_name)
+        except KeyError:
+            continue
+        # The subsets of this document are numbered as the profile asks
+        font._assignState(c._doc, asciiReadable=int(profile.ascii_readable))
+    return c
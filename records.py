@@ -0,0 +1,212 @@
+import os
+
+try:
+    import pandas as pd
+except ImportError:  # Only needed to normalize DataFrames, see ingest.py
+    pd = None
+
+# Hebrew column names of the catalog CSV
+MODEL_COLUMN = "דגם"
+COLOR_COLUMN = "צבע"
+PRICE_COLUMN = "מחיר"
+DISCOUNT_COLUMN = "הנחה"
+BRAND_COLUMN = "מותג"
+THICKNESS_COLUMN = "עובי"
+VEGAN_COLUMN = "טבעוני"
+GROUNDING_COLUMN = "הארקה"
+QUANTITY_COLUMN = "כמות"
+SIZE_COLUMNS = [f"מידות{i}" for i in range(1, 5)]
+SIZE_PRICE_COLUMNS = [f"מחיר{i}" for i in range(1, 5)]
+
+TRUE_FLAGS = ("yes", "true", "1")
+
+# Most copies printed of one row; larger quantities are printed this many
+# times and reported by validate_csv
+MAX_COPIES = int(os.environ.get("MAX_COPIES", 100))
+
+
+class TagRecord:
+    """
+    The normalized, ready-to-draw content of a single price tag.
+    """
+
+    __slots__ = (
+        "model_name",
+        "color",
+        "price",
+        "brand_name",
+        "sole_thickness",
+        "thickness_text",
+        "vegan",
+        "grounding",
+        "discount",
+        "size_prices",
+        "copies",
+    )
+
+    def __init__(
+        self,
+        model_name,
+        color,
+        price,
+        brand_name,
+        sole_thickness,
+        thickness_text,
+        vegan,
+        grounding,
+        discount,
+        size_prices,
+        copies=1,
+    ):
+        self.model_name = model_name  # Upper-cased model name
+        self.color = color  # Upper-cased color
+        self.price = price  # Formatted as 1,234.00 when numeric
+        self.brand_name = brand_name
+        self.sole_thickness = sole_thickness  # One digit after the dot, or N/A
+        self.thickness_text = thickness_text  # As typed in the catalog
+        self.vegan = vegan
+        self.grounding = grounding
+        self.discount = discount  # Whole percent as a string, or None
+        self.size_prices = size_prices  # List of (size range, price) pairs
+        self.copies = copies  # How many of this tag to print
+
+    def key(self):
+        """
+        The printed content of the tag, equal for tags that look the same.
+        """
+        return (
+            self.model_name,
+            self.color,
+            self.price,
+            self.brand_name,
+            self.sole_thickness,
+            self.thickness_text,
+            self.vegan,
+            self.grounding,
+            self.discount,
+            tuple(self.size_prices),
+        )
+
+    def __repr__(self):
+        return f"TagRecord({self.model_name!r}, {self.color!r}, {self.price!r})"
+
+
+def _as_text(series):
+    # Same text as str(value) per cell, including "nan" for empty cells
+    return series.astype(str).fillna("nan")
+
+
+def _text_column(dataframe, column, default):
+    if column not in dataframe.columns:
+        return pd.Series(default, index=dataframe.index, dtype=object)
+    return _as_text(dataframe[column])
+
+
+def _flag_column(dataframe, column):
+    if column not in dataframe.columns:
+        return pd.Series(False, index=dataframe.index)
+    return _as_text(dataframe[column]).str.strip().str.lower().isin(TRUE_FLAGS)
+
+
+def _format_prices(dataframe):
+    raw = _text_column(dataframe, PRICE_COLUMN, "N/A")
+    if PRICE_COLUMN not in dataframe.columns:
+        return raw
+    numeric = pd.to_numeric(dataframe[PRICE_COLUMN], errors="coerce")
+    formatted = numeric.map(lambda value: f"{value:,.2f}", na_action="ignore")
+    # Fall back to the original text if the price is not a number
+    return formatted.where(numeric.notna(), raw)
+
+
+def _format_thickness(dataframe):
+    if THICKNESS_COLUMN not in dataframe.columns:
+        return pd.Series("N/A", index=dataframe.index, dtype=object)
+    numeric = pd.to_numeric(dataframe[THICKNESS_COLUMN], errors="coerce")
+    return numeric.map(lambda value: f"{value:.1f}", na_action="ignore").fillna("N/A")
+
+
+def _format_discounts(dataframe):
+    if DISCOUNT_COLUMN not in dataframe.columns:
+        return pd.Series([None] * len(dataframe), index=dataframe.index, dtype=object)
+    numeric = pd.to_numeric(dataframe[DISCOUNT_COLUMN], errors="coerce")
+    discounts = numeric.map(lambda value: str(int(value)), na_action="ignore")
+    return discounts.astype(object).where(numeric.notna(), None)
+
+
+def _copies(dataframe):
+    # Rows without a quantity print once, zero or negative ones not at all
+    if QUANTITY_COLUMN not in dataframe.columns:
+        return pd.Series(1, index=dataframe.index)
+    numeric = pd.to_numeric(dataframe[QUANTITY_COLUMN], errors="coerce")
+    return numeric.fillna(1).clip(lower=0, upper=MAX_COPIES).astype(int)
+
+
+def _size_price_pairs(dataframe):
+    """
+    Collects the valid (size range, price) pairs of every row. A pair is
+    valid when both the size range and the price are present.
+    """
+    pairs = [[] for _ in range(len(dataframe))]
+    for size_column, price_column in zip(SIZE_COLUMNS, SIZE_PRICE_COLUMNS):
+        if (
+            size_column not in dataframe.columns
+            or price_column not in dataframe.columns
+        ):
+            continue
+        sizes = _as_text(dataframe[size_column]).str.strip()
+        prices = _as_text(dataframe[price_column]).str.strip()
+        valid = (
+            (sizes != "")
+            & (prices != "")
+            & (sizes.str.lower() != "nan")
+            & (prices.str.lower() != "nan")
+        )
+        for i, size_range, price_value in zip(
+            valid.to_numpy().nonzero()[0], sizes[valid], prices[valid]
+        ):
+            pairs[i].append((size_range, price_value))
+    return pairs
+
+
+def normalize_catalog(dataframe):
+    """
+    Normalizes the whole catalog column by column into tag records.
+
+    :param dataframe: The catalog as read from the CSV.
+    :return: A list of TagRecord objects, one per row.
+    """
+    columns = zip(
+        _text_column(dataframe, MODEL_COLUMN, "N/A").str.upper().tolist(),
+        _text_column(dataframe, COLOR_COLUMN, "N/A").str.upper().tolist(),
+        _format_prices(dataframe).tolist(),
+        _text_column(dataframe, BRAND_COLUMN, "None").tolist(),
+        _format_thickness(dataframe).tolist(),
+        _text_column(dataframe, THICKNESS_COLUMN, "N/A").tolist(),
+        _flag_column(dataframe, VEGAN_COLUMN).tolist(),
+        _flag_column(dataframe, GROUNDING_COLUMN).tolist(),
+        _format_discounts(dataframe).tolist(),
+        _size_price_pairs(dataframe),
+        _copies(dataframe).tolist(),
+    )
+    return [TagRecord(*values) for values in columns]
+
+
+def expand_copies(tags):
+    """
+    Repeats every tag record as many times as its copies column asks for.
+
+    :param tags: The normalized tag records.
+    :return: A list with one entry per printed tag.
+    """
+    if all(tag.copies == 1 for tag in tags):
+        return tags
+    return [tag for tag in tags for _ in range(tag.copies)]
+
+
+def iter_copies(tags):
+    """
+    Lazy version of expand_copies for tags that are read as they are drawn.
+    """
+    for tag in tags:
+        for _ in range(tag.copies):
+            yield tag
@@ -0,0 +1,81 @@
+"""
+Spooled rendering for PDF responses sent in blocks.
+
+Finished pages are compressed as soon as they are complete, which keeps the
+pages held until save() small. reportlab still builds the whole document in
+memory when it is saved, so the memory a render takes grows with the
+catalog either way. The saved PDF is written to a spooled temporary file
+that moves to disk once it outgrows PDF_SPOOL_MAX_SIZE, and the response is
+sent from it in fixed-size blocks.
+"""
+
+import os
+import tempfile
+import zlib
+
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfgen import canvas
+
+SPOOL_MAX_SIZE = int(os.environ.get("PDF_SPOOL_MAX_SIZE", 8 * 1024 * 1024))
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class CompactingCanvas(canvas.Canvas):
+    """
+    Canvas that compresses every finished page right away, so a long
+    document only keeps compressed page streams in memory until save().
+    """
+
+    # Set per render by the output profile
+    compression_level = zlib.Z_DEFAULT_COMPRESSION
+
+    def showPage(self):
+        super().showPage()
+        page = self._doc.Pages.pages[-1]
+        if page.compression and page.stream:
+            content = page.stream
+            if isinstance(content, str):
+                content = content.encode("utf8")
+            content = zlib.compress(content, self.compression_level)
+            stream = pdfdoc.PDFStream(content=content)
+            stream.dictionary["Filter"] = pdfdoc.PDFArray(
+                [pdfdoc.PDFName("FlateDecode")]
+            )
+            stream.__Comment__ = "page stream"
+            page.Contents = stream
+            page.stream = None
+
+
+def spooled_file():
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+
+def render_spooled(render_tags, tags, draw_tag, layout, progress=None, profile=None):
+    """
+    Renders the tags into a spooled temporary file.
+
+    :param render_tags: The single-process renderer, called as
+        render_tags(tags, draw_tag, layout, pdf_file, progress, profile).
+    :param tags: The list of tag records.
+    :param draw_tag: The draw_* function for a single tag.
+    :param layout: The GridLayout to place the tags with.
+    :param progress: Called as progress(rendered, total) after every page.
+    :param profile: The OutputProfile, the default profile if None.
+    :return: The rewound spooled file, to be closed by the caller.
+    """
+    return render_tags(tags, draw_tag, layout, spooled_file(), progress, profile)
+
+
+def iter_file(pdf_file, block_size=STREAM_BLOCK_SIZE):
+    """
+    Yields the file in blocks for a streamed response and closes it once
+    the last block is sent.
+    """
+    try:
+        while True:
+            block = pdf_file.read(block_size)
+            if not block:
+                break
+            yield block
+    finally:
+        pdf_file.close()
@@ -0,0 +1,360 @@
+"""
+Telegram bot front end for the tag renderer.
+
+Users send a catalog CSV (or .csv.gz) as a document, with the template as its
+caption ("regular", "kids" or "children", "regular" if there is none), and
+get the PDF back as a reply.
+
+The bot runs on one asyncio event loop that long-polls the Bot API and
+serves every chat at once; the Bot API calls are made in threads, so a slow
+upload never holds up the loop. Renders run in a pool of BOT_RENDER_WORKERS
+processes, each rendering a whole catalog on its own, and every chat may
+have at most CHAT_CONCURRENCY of its catalogs in the pool and
+CHAT_QUEUE_LIMIT waiting, so a large catalog from one chat only ever takes
+its own share of the workers.
+
+    BOT_TOKEN=... python telegram_bot.py
+
+TELEGRAM_API_URL points the bot at another Bot API server, such as a local
+fake one to test against.
+"""
+
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from upload import read_text
+
+BOT_TOKEN = os.environ.get("BOT_TOKEN")
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")
+BOT_RENDER_WORKERS = int(os.environ.get("BOT_RENDER_WORKERS", os.cpu_count() or 1))
+# Catalogs of one chat rendering at once, and waiting to be rendered
+CHAT_CONCURRENCY = int(os.environ.get("CHAT_CONCURRENCY", 1))
+CHAT_QUEUE_LIMIT = int(os.environ.get("CHAT_QUEUE_LIMIT", 4))
+# Seconds a getUpdates call waits for new messages
+POLL_TIMEOUT = 30
+# Largest file the Bot API lets a bot download
+MAX_DOCUMENT_BYTES = 20 * 1024 * 1024
+
+# Generator in bot.py of every template, by the caption that selects it
+TEMPLATES = {
+    "regular": "generate_pdf",
+    "kids": "generate_kids_pdf",
+    "children": "generate_children_pdf",
+}
+
+HELP_TEXT = (
+    "Send a catalog CSV as a document to get its price tags as a PDF. "
+    "Caption it kids or children for those templates."
+)
+
+
+class BotApiError(Exception):
+    pass
+
+
+class BotApi:
+    """
+    Minimal Telegram Bot API client. Every call runs in a thread of the
+    event loop's default executor.
+    """
+
+    def __init__(self, token, api_url=TELEGRAM_API_URL):
+        self.token = token
+        self.api_url = api_url.rstrip("/")
+
+    def _request(self, url, data=None, headers=None, timeout=60, api_errors=False):
+        request = urllib.request.Request(url, data=data, headers=headers or {})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if api_errors:
+                # The Bot API describes the error in the body
+                return e.read()
+            raise BotApiError(f"HTTP {e.code} {e.reason}") from None
+
+    def _call(self, method, params, files, timeout):
+        url = f"{self.api_url}/bot{self.token}/{method}"
+        if files:
+            data, content_type = _multipart(params, files)
+        else:
+            data, content_type = json.dumps(params).encode("utf8"), "application/json"
+        body = self._request(
+            url, data, {"Content-Type": content_type}, timeout, api_errors=True
+        )
+        try:
+            reply = json.loads(body)
+        except ValueError:
+            raise BotApiError(f"{method}: the response is not JSON") from None
+        if not reply.get("ok"):
+            raise BotApiError(f"{method}: {reply.get('description')}")
+        return reply["result"]
+
+    async def call(self, method, params=None, files=None, timeout=60):
+        """
+        Calls a Bot API method.
+
+        :param method: The method name, such as "sendMessage".
+        :param params: The parameters.
+        :param files: Files to upload, as {field: (file name, bytes)}.
+        :param timeout: Seconds to wait for the response.
+        :return: The result of the call.
+        :raises BotApiError: When the call fails.
+        """
+        return await asyncio.to_thread(self._call, method, params or {}, files, timeout)
+
+    async def download(self, file_id):
+        """
+        :return: The content of a file sent to the bot.
+        :raises BotApiError: When the file cannot be downloaded.
+        """
+        file = await self.call("getFile", {"file_id": file_id})
+        url = f"{self.api_url}/file/bot{self.token}/{file['file_path']}"
+        try:
+            return await asyncio.to_thread(self._request, url)
+        except BotApiError as e:
+            raise BotApiError(f"download: {e}") from None
+
+
+def _multipart(params, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in params.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n".encode("utf8")
+        )
+    for name, (file_name, data) in files.items():
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: form-data; "
+            f'name="{name}"; filename="{file_name}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode("utf8")
+        )
+        parts.append(data)
+        parts.append(b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode("utf8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _init_worker():
+    # A worker renders whole catalogs; sharding one over more processes
+    # would take the cores the other chats' catalogs are rendered on
+    os.environ["RENDER_PROCESSES"] = "1"
+    # Register the fonts and decode the logos before the first catalog
+    import bot  # noqa: F401
+
+
+def render_document(csv_data, template):
+    """
+    Checks and renders one catalog, in a render worker.
+
+    :param csv_data: The CSV text.
+    :param template: The TEMPLATES key.
+    :return: The PDF bytes and the summary of the catalog's problems, which
+        is empty if it has none.
+    :raises ValueError: When the CSV cannot be read.
+    """
+    import bot
+    from ingest import read_catalog
+    from validation import validate_csv
+
+    report = validate_csv(csv_data, template)
+    catalog = read_catalog(csv_data) if report is not None else None
+    if catalog is None:
+        raise ValueError("Failed to process CSV")
+    pdf = getattr(bot, TEMPLATES[template])(catalog)
+    return pdf.getvalue(), report.summary()
+
+
+def caption_template(caption):
+    """
+    :return: The template a document's caption asks for, "regular" if it
+        names none, or None if it names an unknown one.
+    """
+    words = (caption or "").split()
+    template = words[0].lstrip("/").lower() if words else "regular"
+    return template if template in TEMPLATES else None
+
+
+class ChatQueue:
+    """
+    The catalogs of one chat that are waiting or rendering.
+    """
+
+    def __init__(self, concurrency):
+        self.slots = asyncio.Semaphore(concurrency)
+        self.pending = 0
+
+
+class TagBot:
+    """
+    Serves the chats: receives their catalogs, renders them in the worker
+    pool within the limits of every chat and replies with the PDFs.
+    """
+
+    def __init__(
+        self,
+        api,
+        workers=BOT_RENDER_WORKERS,
+        chat_concurrency=CHAT_CONCURRENCY,
+        chat_queue_limit=CHAT_QUEUE_LIMIT,
+    ):
+        """
+        :param api: The BotApi to serve.
+        :param workers: The number of render processes.
+        :param chat_concurrency: The most catalogs of one chat rendering at
+            once.
+        :param chat_queue_limit: The most catalogs of one chat waiting or
+            rendering; more are refused.
+        """
+        self.api = api
+        self.chat_concurrency = chat_concurrency
+        self.chat_queue_limit = chat_queue_limit
+        # Spawned, so the workers import the renderer with their own settings
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        self._chats = {}
+        self._tasks = set()
+
+    async def reply(self, message, text):
+        try:
+            await self.api.call(
+                "sendMessage",
+                {
+                    "chat_id": message["chat"]["id"],
+                    "text": text,
+                    "reply_to_message_id": message["message_id"],
+                },
+            )
+        except BotApiError as e:
+            print(f"Error replying to chat {message['chat']['id']}: {e}")
+
+    async def handle(self, update):
+        """
+        Answers a command, or queues the render of a document.
+        """
+        message = update.get("message")
+        if not message:
+            return
+        document = message.get("document")
+        if document is None:
+            if message.get("text", "").startswith(("/start", "/help")):
+                await self.reply(message, HELP_TEXT)
+            return
+
+        template = caption_template(message.get("caption"))
+        if template is None:
+            await self.reply(
+                message, f"Unknown template, caption it one of {', '.join(TEMPLATES)}"
+            )
+            return
+        if document.get("file_size", 0) > MAX_DOCUMENT_BYTES:
+            await self.reply(message, "The file is too large, the limit is 20 MB")
+            return
+
+        chat_id = message["chat"]["id"]
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = ChatQueue(self.chat_concurrency)
+        if chat.pending >= self.chat_queue_limit:
+            await self.reply(
+                message,
+                f"{chat.pending} catalogs of this chat are already being rendered, "
+                "send this one again once they are done",
+            )
+            return
+
+        chat.pending += 1
+        task = asyncio.create_task(self._render(chat_id, chat, message, template))
+        # Keep a reference until the task is done, or it may be collected
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _render(self, chat_id, chat, message, template):
+        document = message["document"]
+        try:
+            async with chat.slots:
+                data = await self.api.download(document["file_id"])
+                file_name = document.get("file_name", "")
+                gzipped = file_name.lower().endswith(".gz") or document.get(
+                    "mime_type"
+                ) in ("application/gzip", "application/x-gzip")
+                csv_data = await asyncio.to_thread(read_text, io.BytesIO(data), gzipped)
+
+                loop = asyncio.get_running_loop()
+                pdf_data, problems = await loop.run_in_executor(
+                    self._pool, render_document, csv_data, template
+                )
+
+            caption = f"Catalog problems: {problems}" if problems else None
+            params = {
+                "chat_id": chat_id,
+                "reply_to_message_id": message["message_id"],
+            }
+            if caption:
+                params["caption"] = caption
+            await self.api.call(
+                "sendDocument",
+                params,
+                files={"document": ("generated.pdf", pdf_data)},
+                timeout=300,
+            )
+        except ValueError as e:
+            # Including UploadError, for catalogs that cannot be read
+            await self.reply(message, str(e))
+        except Exception as e:
+            print(f"Error rendering for chat {chat_id}: {e}")
+            await self.reply(message, "Failed to render the catalog")
+        finally:
+            chat.pending -= 1
+            if chat.pending == 0:
+                del self._chats[chat_id]
+
+    async def run(self):
+        """
+        Long-polls the Bot API for updates and handles them until cancelled.
+        """
+        params = {"timeout": POLL_TIMEOUT, "allowed_updates": ["message"]}
+        while True:
+            try:
+                updates = await self.api.call(
+                    "getUpdates", params, timeout=POLL_TIMEOUT + 10
+                )
+            except (BotApiError, OSError) as e:
+                print(f"Error polling for updates: {e}")
+                await asyncio.sleep(5)
+                continue
+            for update in updates:
+                # Confirms the update on the next call
+                params["offset"] = update["update_id"] + 1
+                await self.handle(update)
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def main():
+    if not BOT_TOKEN:
+        print("Error starting the bot: BOT_TOKEN is not set")
+        return
+    bot = TagBot(BotApi(BOT_TOKEN))
+    try:
+        await bot.run()
+    finally:
+        bot.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
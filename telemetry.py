@@ -0,0 +1,341 @@
+"""
+Per-request render metrics in the Prometheus text format.
+
+Every /handle_csv* request is tracked from form decoding to sending the
+PDF. The time spent in each phase, the catalog rows, pages and response
+bytes are recorded as histograms labelled with the endpoint, and the tags
+drawn per template variant and failed asset loads as counters. The values
+live in the process that served the request.
+
+With RENDER_METRICS=0 nothing is recorded: the request tracker and phase
+timers return right away and /metrics is not served.
+"""
+
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from collections import defaultdict
+
+ENABLED = os.environ.get("RENDER_METRICS", "1").lower() in ("1", "true", "yes")
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROW_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000, 50000)
+PAGE_BUCKETS = (1, 2, 5, 10, 50, 100, 500, 1000, 5000)
+BYTE_BUCKETS = (1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+# The request being served by the current thread, if it is tracked
+_current = contextvars.ContextVar("render_request", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            self._values[key] += amount
+
+    def expose(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.label_names = label_names
+        # Per label values: [count per bucket..., count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def expose(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            for key, counts in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    labels = _format_labels(self.label_names, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.label_names, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {counts[-2]}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(counts[-1])}")
+                lines.append(f"{self.name}_count{labels} {counts[-2]}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "price_tags_request_seconds",
+    "Time to serve a render request.",
+    SECONDS_BUCKETS,
+    ("endpoint",),
+)
+PHASE_SECONDS = Histogram(
+    "price_tags_phase_seconds",
+    "Time spent in each phase of a render request.",
+    SECONDS_BUCKETS,
+    ("endpoint", "phase"),
+)
+ROWS = Histogram(
+    "price_tags_rows", "Catalog rows per render.", ROW_BUCKETS, ("endpoint",)
+)
+PAGES = Histogram(
+    "price_tags_pages", "PDF pages per render.", PAGE_BUCKETS, ("endpoint",)
+)
+RESPONSE_BYTES = Histogram(
+    "price_tags_response_bytes",
+    "Size of the PDF responses that are not streamed.",
+    BYTE_BUCKETS,
+    ("endpoint",),
+)
+REQUESTS = Counter(
+    "price_tags_requests_total", "Render requests served.", ("endpoint", "status")
+)
+TAGS = Counter(
+    "price_tags_tags_total", "Tags drawn per template variant.", ("endpoint", "variant")
+)
+ASSET_FAILURES = Counter(
+    "price_tags_asset_failures_total", "Logos that failed to draw.", ("asset",)
+)
+OPERATORS = Counter(
+    "price_tags_pdf_operators_total",
+    "Content stream operators per template: state changes written and "
+    "dropped as redundant, text objects, images and forms.",
+    ("endpoint", "template", "operator"),
+)
+
+METRICS = (
+    REQUEST_SECONDS,
+    PHASE_SECONDS,
+    ROWS,
+    PAGES,
+    RESPONSE_BYTES,
+    REQUESTS,
+    TAGS,
+    ASSET_FAILURES,
+    OPERATORS,
+)
+
+
+class RequestRecord:
+    """
+    The measurements of one request, reported when it finishes.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.status = None
+        self.phases = defaultdict(float)
+        self.counts = {}
+        self.variants = defaultdict(int)
+        self.operators = defaultdict(int)
+
+
+@contextlib.contextmanager
+def track_request(endpoint):
+    """
+    Tracks a request, recording its measurements when the block exits.
+
+    :param endpoint: The endpoint label.
+    :return: The RequestRecord, or None when metrics are disabled.
+    """
+    if not ENABLED:
+        yield None
+        return
+
+    record = RequestRecord(endpoint)
+    token = _current.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        _current.reset(token)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, status=record.status or 500)
+        for name, seconds in record.phases.items():
+            PHASE_SECONDS.observe(seconds, endpoint=endpoint, phase=name)
+        for histogram, name in ((ROWS, "rows"), (PAGES, "pages")):
+            if name in record.counts:
+                histogram.observe(record.counts[name], endpoint=endpoint)
+        if "bytes" in record.counts:
+            RESPONSE_BYTES.observe(record.counts["bytes"], endpoint=endpoint)
+        for variant, tags in record.variants.items():
+            TAGS.inc(tags, endpoint=endpoint, variant=variant)
+        for (template, operator), value in record.operators.items():
+            OPERATORS.inc(
+                value, endpoint=endpoint, template=template, operator=operator
+            )
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Adds the time spent in the block to the named phase of the current
+    request, if there is one.
+    """
+    record = _current.get()
+    if record is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.phases[name] += time.perf_counter() - started
+
+
+def track_send(response, endpoint):
+    """
+    Records the time the server takes to write the body of a response as
+    the send phase of its endpoint. It is counted from when the view
+    returns to when the server has read the last block of the body, so it
+    is reported after the rest of the request.
+
+    :param response: The response returned by the view.
+    :param endpoint: The endpoint label.
+    :return: The response.
+    """
+    if not ENABLED:
+        return response
+
+    started = time.perf_counter()
+    body = response.response
+
+    def sent():
+        # The body itself, as send_file responses are passed through to the
+        # server without the response closing it
+        try:
+            yield from body
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+            seconds = time.perf_counter() - started
+            PHASE_SECONDS.observe(seconds, endpoint=endpoint, phase="send")
+
+    response.response = sent()
+    return response
+
+
+def count(name, value):
+    record = _current.get()
+    if record is not None:
+        record.counts[name] = record.counts.get(name, 0) + value
+
+
+def count_operators(template, counts):
+    """
+    Adds the operator counts of a rendered canvas to the current request.
+
+    :param template: The template name.
+    :param counts: The count per operator kind.
+    """
+    record = _current.get()
+    if record is not None:
+        for operator, value in counts.items():
+            record.operators[template, operator] += value
+
+
+@contextlib.contextmanager
+def collect():
+    """
+    Gathers the measurements of work done for a request in another process,
+    such as a render worker, to be added to it with count_operators.
+
+    :return: The RequestRecord, or None when metrics are disabled.
+    """
+    if not ENABLED:
+        yield None
+        return
+
+    record = RequestRecord(None)
+    token = _current.set(record)
+    try:
+        yield record
+    finally:
+        _current.reset(token)
+
+
+def count_tags(tags, variant_of):
+    """
+    Passes the tags through, counting them per template variant for the
+    current request. Returns the tags unchanged when no request is tracked.
+
+    :param tags: The tags to draw, a list or an iterator.
+    :param variant_of: Called as variant_of(tag) for the variant name.
+    """
+    record = _current.get()
+    if record is None:
+        return tags
+    if isinstance(tags, list):
+        for tag in tags:
+            record.variants[variant_of(tag)] += 1
+        return tags
+
+    def counted():
+        variants = record.variants
+        for tag in tags:
+            variants[variant_of(tag)] += 1
+            yield tag
+
+    return counted()
+
+
+def asset_failure(name):
+    if ENABLED:
+        ASSET_FAILURES.inc(asset=name)
+
+
+def expose():
+    """
+    Renders every metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionControl, Overloaded, TooLarge
+
+
+def control(**kwargs):
+    options = dict(budget=100, client_concurrency=2, queue_limit=2, wait=0)
+    options.update(kwargs)
+    return AdmissionControl(tags_per_second=10, **options)
+
+
+def test_acquire_and_release():
+    admission = control()
+    slot = admission.acquire("a", 60)
+    assert admission.status()["in_flight_tags"] == 60
+
+    with pytest.raises(Overloaded) as e:
+        admission.acquire("b", 60)
+    # The 20 tags over the budget, at 10 a second
+    assert e.value.retry_after == 2
+
+    admission.release(slot)
+    status = admission.status()
+    assert status["in_flight_tags"] == 0
+    assert status["waiting"] == 0
+    with admission.admit("b", 60):
+        assert admission.status()["renders"] == 1
+    assert admission.status()["renders"] == 0
+
+
+def test_larger_than_budget():
+    admission = control()
+    with pytest.raises(TooLarge):
+        admission.acquire("a", 101)
+    # Refused even when nothing else is in flight
+    assert admission.status()["in_flight_tags"] == 0
+    admission.release(admission.acquire("a", 100))
+
+
+def test_client_concurrency():
+    admission = control(client_concurrency=1)
+    slot = admission.acquire("a", 10)
+    with pytest.raises(Overloaded):
+        admission.acquire("a", 10)
+    other = admission.acquire("b", 10)
+    admission.release(slot)
+    admission.release(admission.acquire("a", 10))
+    admission.release(other)
+
+
+def test_waits_for_room():
+    admission = control(wait=5)
+    slot = admission.acquire("a", 80)
+    admitted = []
+
+    def render():
+        with admission.admit("b", 50):
+            admitted.append(time.monotonic())
+
+    thread = threading.Thread(target=render)
+    thread.start()
+    while admission.status()["waiting"] == 0:
+        time.sleep(0.01)
+    released = time.monotonic()
+    admission.release(slot)
+    thread.join()
+    assert admitted and admitted[0] >= released
+
+
+def test_queue_limit():
+    admission = control(queue_limit=0)
+    slot = admission.acquire("a", 80)
+    with pytest.raises(Overloaded) as e:
+        admission.acquire("b", 50)
+    assert "waiting" in str(e.value)
+    admission.release(slot)
+
+
+def _die_holding(admission):
+    admission.acquire("a", 90)
+    os._exit(0)
+
+
+def test_dead_owner_is_reclaimed():
+    admission = control()
+    worker = multiprocessing.get_context("fork").Process(
+        target=_die_holding, args=(admission,)
+    )
+    worker.start()
+    worker.join()
+
+    # The tags and client slot of the dead worker are free again
+    slot = admission.acquire("a", 50)
+    status = admission.status()
+    assert status["in_flight_tags"] == 50
+    assert status["renders"] == 1
+    admission.release(slot)
@@ -0,0 +1,104 @@
+import io
+import os
+
+import pytest
+
+from cache import RenderCache, render_key
+
+CSV = "דגם,צבע,מחיר,מותג\nTRAIL,BLACK,349,XERO\n"
+
+
+def test_render_key():
+    key = render_key(CSV, "regular", "v1")
+    # Line endings and trailing blanks do not change the render
+    assert render_key(CSV.replace("\n", " \r\n") + "\n", "regular", "v1") == key
+    assert render_key(CSV, "kids", "v1") != key
+    assert render_key(CSV, "regular", "v2") != key
+    assert render_key(CSV, "regular", "v1", "print") != key
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = RenderCache(memory_bytes=10, disk_bytes=0)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa"
+    # Larger than the whole tier, so never kept
+    cache.put("d", b"d" * 11)
+    assert cache.get("d") is None
+
+
+def test_disk_tier(tmp_path):
+    cache = RenderCache(memory_bytes=4, disk_bytes=10, cache_dir=str(tmp_path))
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    # Only b fits in memory, a is read back from disk
+    assert cache.get("a") == b"aaaa"
+    os.utime(tmp_path / "b.pdf", (0, 0))
+    cache.put("c", b"cccc")
+    # The least recently used file is removed to stay within disk_bytes
+    assert sorted(os.listdir(tmp_path)) == ["a.pdf", "c.pdf"]
+    # Another cache on the same directory, as in another worker
+    other = RenderCache(memory_bytes=0, disk_bytes=10, cache_dir=str(tmp_path))
+    assert other.get("c") == b"cccc"
+    assert other.get("b") is None
+
+
+def test_file_evicted_while_read(tmp_path, monkeypatch):
+    cache = RenderCache(memory_bytes=0, disk_bytes=10, cache_dir=str(tmp_path))
+    cache.put("a", b"aaaa")
+
+    def evicted(path, *args):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, "utime", evicted)
+    assert cache.get("a") == b"aaaa"
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    import app
+
+    monkeypatch.setattr(
+        app, "render_cache", RenderCache(cache_dir=str(tmp_path / "renders"))
+    )
+    monkeypatch.setattr(
+        app,
+        "page_manifests",
+        RenderCache(cache_dir=str(tmp_path / "pages"), suffix=".pages"),
+    )
+    return app
+
+
+def post_csv(app, headers=None):
+    return app.app.test_client().post(
+        "/handle_csv",
+        data={"file": (io.BytesIO(CSV.encode("utf8")), "catalog.csv")},
+        content_type="multipart/form-data",
+        headers=headers,
+    )
+
+
+def test_etag_and_not_modified(app, monkeypatch):
+    first = post_csv(app)
+    assert first.status_code == 200
+    assert first.data.startswith(b"%PDF")
+    etag = first.headers["ETag"]
+
+    def render_again(*args, **kwargs):
+        raise AssertionError("rendered again")
+
+    monkeypatch.setattr(app, "generate_pdf", render_again)
+    # Answered from the render cache
+    again = post_csv(app)
+    assert again.status_code == 200
+    assert again.headers["ETag"] == etag
+    assert again.data == first.data
+
+    # Answered from the request alone
+    not_modified = post_csv(app, {"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+    assert not_modified.data == b""
@@ -0,0 +1,63 @@
+import io
+
+from reportlab.pdfgen import canvas
+
+from fragments import REPEAT_THRESHOLD, FragmentCache
+from records import TagRecord
+
+
+def tag(model_name):
+    return TagRecord(
+        model_name, "BLACK", "349.00", "XERO", "4.0", "4", False, False, None, []
+    )
+
+
+class Drawing:
+    """
+    A draw_* function that records where it draws which tag.
+    """
+
+    __name__ = "draw_test_tag"
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, c, x_start, y_start, cell_width, cell_height, tag):
+        self.calls.append((tag.model_name, x_start, y_start))
+        c.rect(x_start, y_start, cell_width, cell_height)
+
+
+def stamp(fragments, tags):
+    c = canvas.Canvas(io.BytesIO())
+    stamped = []
+    do_form = c.doForm
+    c.doForm = lambda name: stamped.append(name) or do_form(name)
+    for i, tag in enumerate(tags):
+        fragments(c, 0, i * 10, 100, 10, tag)
+    return stamped
+
+
+def test_repeated_tags_known_up_front():
+    tags = [tag("A")] * REPEAT_THRESHOLD + [tag("B")] * (REPEAT_THRESHOLD - 1)
+    draw_tag = Drawing()
+    stamped = stamp(FragmentCache(draw_tag, tags), tags)
+
+    # A is drawn once, into its form at the origin, and stamped everywhere
+    assert len(stamped) == REPEAT_THRESHOLD
+    assert len(set(stamped)) == 1
+    assert draw_tag.calls.count(("A", 0, 0)) == 1
+    # B is too rare for a form, and drawn where it goes
+    assert [call for call in draw_tag.calls if call[0] == "B"] == [
+        ("B", 0, i * 10) for i in range(REPEAT_THRESHOLD, len(tags))
+    ]
+
+
+def test_repeated_tags_counted_while_drawing():
+    tags = [tag("A")] * (REPEAT_THRESHOLD + 2) + [tag("B")]
+    draw_tag = Drawing()
+    stamped = stamp(FragmentCache(draw_tag), tags)
+
+    # Stamped from the copy that reaches the threshold onwards
+    assert len(stamped) == 3
+    assert [call[0] for call in draw_tag.calls] == ["A"] * REPEAT_THRESHOLD + ["B"]
+    assert draw_tag.calls[REPEAT_THRESHOLD - 1] == ("A", 0, 0)
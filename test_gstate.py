@@ -0,0 +1,90 @@
+import io
+
+from reportlab.lib import colors
+from reportlab.pdfgen import canvas
+
+from assets import register_fonts
+from gstate import StateTrackingCanvas
+
+
+def tracking_canvas():
+    register_fonts()
+    return StateTrackingCanvas(io.BytesIO())
+
+
+def test_repeated_state_is_dropped():
+    c = tracking_canvas()
+    # Black is already the stroke color of a new page
+    c.setStrokeColor(colors.black)
+    c.setStrokeColor(colors.red)
+    c.setStrokeColor(colors.red)
+    c.setLineWidth(2)
+    c.setLineWidth(2)
+    c.setDash(3, 1)
+    c.setDash(3, 1)
+    c.setDash()
+    assert c._code == ["1 0 0 RG", "2 w", "[3 1] 0 d", "[] 0 d"]
+    assert c.operator_counts["dropped"] == 4
+
+
+def test_state_is_restored_with_restore_state():
+    c = tracking_canvas()
+    c.setStrokeColor(colors.red)
+    c.saveState()
+    c.setStrokeColor(colors.blue)
+    c.restoreState()
+    # Red again after Q, so setting it writes nothing
+    c.setStrokeColor(colors.red)
+    c.setStrokeColor(colors.blue)
+    assert c._code == ["1 0 0 RG", "q", "0 0 1 RG", "Q", "0 0 1 RG"]
+
+
+def test_pages_and_forms_start_over():
+    c = tracking_canvas()
+    c.setLineWidth(2)
+    c.showPage()
+    c.setLineWidth(2)
+    assert c._code == ["2 w"]
+
+    c.beginForm("tag")
+    # A form runs in the state of whichever page draws it
+    c.setStrokeColor(colors.black)
+    c.setLineWidth(2)
+    c.endForm()
+    c.setLineWidth(2)
+    assert c._code == ["2 w"]
+    c.doForm("tag")
+    assert c.operator_counts["form"] == 1
+
+
+def test_repeated_fonts_are_dropped_from_text_objects():
+    c = tracking_canvas()
+    c.setFont("Poppins-Bold", 12)
+    c.drawString(0, 0, "a 12 Tf")
+    c.setFont("Poppins-Bold", 12)
+    c.drawString(0, 0, "b")
+    c.setFont("Poppins-Bold", 14)
+    c.drawString(0, 0, "c")
+    tf = [text.count(" Tf ") for text in c._code]
+    # The font is set in the first and last text objects only, and text
+    # that looks like an operator is left alone
+    assert tf == [1, 0, 1]
+    assert "(a 12 Tf)" in c._code[0]
+    assert c.operator_counts["text"] == 3
+
+
+def test_same_drawing_as_the_plain_canvas():
+    def draw(c):
+        for color in (colors.black, colors.red, colors.red):
+            c.setStrokeColor(color)
+            c.setLineWidth(1)
+            c.rect(10, 10, 50, 50)
+
+    plain = canvas.Canvas(io.BytesIO())
+    draw(plain)
+    tracked = tracking_canvas()
+    draw(tracked)
+    rect = "n 10 10 50 50 re S"
+    red = ["1 0 0 RG", "1 w", rect]
+    assert plain._code == ["0 0 0 RG", "1 w", rect] + red + red
+    assert tracked._code == [rect, "1 0 0 RG", rect, rect]
@@ -0,0 +1,80 @@
+import io
+
+import pandas as pd
+
+from ingest import read_catalog
+from records import MAX_COPIES, expand_copies, iter_copies, normalize_catalog
+
+HEADER = "\ufeffדגם,צבע,מחיר,מותג,עובי,טבעוני,הארקה,הנחה,כמות,מידות1,מחיר1,מידות2,מחיר2"
+ROWS = [
+    "trail glove,black,349,XERO,4.5,yes,no,20,2,20-25,150.5,26-30,180.5",
+    "road,Red,1299.9,Vivo,4,TRUE,1,,,20-25,,,",
+    "sandal,blue,free,,thin,No,,15.5,0,,99.5,31-35,210.5",
+    "",
+    f"boot,green,,Lems,N/A,,yes,abc,{MAX_COPIES + 5},18-19,120.5,,",
+]
+
+
+def both(csv_data):
+    return (
+        normalize_catalog(pd.read_csv(io.StringIO(csv_data))),
+        list(read_catalog(csv_data)),
+    )
+
+
+def fields(tag):
+    return {name: getattr(tag, name) for name in tag.__slots__}
+
+
+def test_same_records_as_pandas():
+    csv_data = "\n".join([HEADER] + ROWS) + "\n"
+    pandas_tags, csv_tags = both(csv_data)
+    assert len(csv_tags) == len(pandas_tags) == 4
+    for pandas_tag, csv_tag in zip(pandas_tags, csv_tags):
+        assert fields(csv_tag) == fields(pandas_tag)
+        assert csv_tag.key() == pandas_tag.key()
+
+    first, second, third, fourth = csv_tags
+    assert first.model_name == "TRAIL GLOVE"
+    assert first.price == "349.00"
+    assert first.sole_thickness == "4.5"
+    assert (first.vegan, first.grounding) == (True, False)
+    assert first.discount == "20"
+    assert first.size_prices == [("20-25", "150.5"), ("26-30", "180.5")]
+    assert second.price == "1,299.90"
+    assert second.discount is None
+    assert third.price == "free"
+    assert third.sole_thickness == "N/A"
+    assert third.size_prices == [("31-35", "210.5")]
+    assert [tag.copies for tag in csv_tags] == [2, 1, 0, MAX_COPIES]
+    assert fourth.brand_name == "Lems"
+    assert fourth.price == "nan"
+
+
+def test_missing_columns():
+    pandas_tags, csv_tags = both("דגם\nA\n")
+    assert fields(csv_tags[0]) == fields(pandas_tags[0])
+    assert csv_tags[0].price == "N/A"
+    assert csv_tags[0].brand_name == "None"
+    assert csv_tags[0].size_prices == []
+
+
+def test_cells_kept_as_typed():
+    # pandas reads a column with blanks as floats, the csv parser does not
+    csv_data = "דגם,עובי,מידות1,מחיר1\nA,4,20-25,150\nB,,,\n"
+    pandas_tags, csv_tags = both(csv_data)
+    assert pandas_tags[0].size_prices == [("20-25", "150.0")]
+    assert csv_tags[0].size_prices == [("20-25", "150")]
+    assert pandas_tags[0].thickness_text == "4.0"
+    assert csv_tags[0].thickness_text == "4"
+    assert csv_tags[0].sole_thickness == pandas_tags[0].sole_thickness == "4.0"
+
+
+def test_copies():
+    csv_tags = list(read_catalog("דגם,כמות\nA,2\nB,0\nC,\n"))
+    assert [tag.model_name for tag in expand_copies(csv_tags)] == ["A", "A", "C"]
+    assert list(iter_copies(csv_tags)) == expand_copies(csv_tags)
+
+
+def test_without_header():
+    assert read_catalog("") is None
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from jobs import DONE, FAILED, QUEUED, JobRunner, QueueFull
+
+
+def wait_for(runner, job_id, status):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        job = runner.get(job_id)
+        if job is not None and job.status == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is not {status}")
+
+
+def test_problems_are_saved_before_the_job_runs(tmp_path):
+    runner = JobRunner(workers=1, job_dir=str(tmp_path))
+    started = threading.Event()
+    proceed = threading.Event()
+
+    def block(job):
+        started.set()
+        proceed.wait(5)
+
+    runner.submit("regular", block)
+    started.wait(5)
+    # Queued behind the running job, so only its first state is saved
+    job = runner.submit("kids", lambda job: None, {"price": 2})
+    assert runner.get(job.id).status == QUEUED
+    assert runner.get(job.id).problems == {"price": 2}
+    proceed.set()
+    assert wait_for(runner, job.id, DONE).to_dict()["problems"] == {"price": 2}
+
+
+def test_render_progress_and_failure(tmp_path):
+    runner = JobRunner(workers=1, job_dir=str(tmp_path))
+
+    def render(job):
+        job.etag = "0" * 64
+        job.progress(10, 10)
+
+    done = wait_for(runner, runner.submit("regular", render).id, DONE)
+    assert (done.rendered, done.total, done.etag) == (10, 10, "0" * 64)
+    assert done.finished is not None
+
+    def fail(job):
+        raise ValueError("Failed to process CSV")
+
+    failed = wait_for(runner, runner.submit("regular", fail).id, FAILED)
+    assert failed.error == "Failed to process CSV"
+
+
+def test_queue_limit(tmp_path):
+    runner = JobRunner(workers=1, queue_limit=1, job_dir=str(tmp_path))
+    proceed = threading.Event()
+    job = runner.submit("regular", lambda job: proceed.wait(5))
+    with pytest.raises(QueueFull):
+        runner.submit("regular", lambda job: None)
+    proceed.set()
+    wait_for(runner, job.id, DONE)
+
+
+def test_unknown_and_expired_jobs(tmp_path):
+    runner = JobRunner(workers=1, ttl=0, job_dir=str(tmp_path))
+    assert runner.get("../../etc/passwd") is None
+    assert runner.get("0" * 32) is None
+    job = runner.submit("regular", lambda job: None)
+    time.sleep(0.01)
+    assert runner.get(job.id) is None
@@ -0,0 +1,59 @@
+import io
+
+import pytest
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.units import cm
+from reportlab.pdfgen import canvas
+
+from layout import TAG_HEIGHT, TAG_WIDTH, GridLayout, render_grid
+
+
+def test_default_grid():
+    layout = GridLayout()
+    page_width, page_height = landscape(A4)
+    assert (layout.columns, layout.rows, layout.per_page) == (1, 5, 5)
+    # Top left first, then down the page
+    assert layout.slots[0] == (1 * cm, page_height - 1 * cm - TAG_HEIGHT)
+    assert layout.slots[1][1] == pytest.approx(layout.slots[0][1] - TAG_HEIGHT)
+    assert layout.slots[-1][1] >= 1 * cm
+
+
+def test_slots_with_gutter():
+    layout = GridLayout(
+        pagesize=A4, cell_width=6 * cm, cell_height=3 * cm, margin=1 * cm, gutter=cm
+    )
+    assert (layout.columns, layout.rows) == (2, 7)
+    assert layout.slots[:3] == [
+        pytest.approx((1 * cm, A4[1] - 4 * cm)),
+        pytest.approx((8 * cm, A4[1] - 4 * cm)),
+        pytest.approx((1 * cm, A4[1] - 8 * cm)),
+    ]
+
+
+def test_page_count():
+    layout = GridLayout()
+    assert [layout.page_count(n) for n in (0, 1, 5, 6, 10, 11)] == [1, 1, 1, 2, 2, 3]
+
+
+def test_cell_larger_than_page():
+    with pytest.raises(ValueError):
+        GridLayout(pagesize=A4, cell_width=TAG_WIDTH)
+
+
+def test_render_grid_fills_pages():
+    layout = GridLayout()
+    c = canvas.Canvas(io.BytesIO(), pagesize=layout.pagesize)
+    placed = []
+    reports = []
+
+    def draw_tag(c, x, y, cell_width, cell_height, tag):
+        placed.append((c.getPageNumber(), (x, y), tag))
+
+    rendered = render_grid(
+        c, layout, iter(range(12)), draw_tag, lambda *report: reports.append(report)
+    )
+    assert rendered == 12
+    assert [page for page, _, _ in placed] == [1] * 5 + [2] * 5 + [3] * 2
+    assert [slot for _, slot, _ in placed[5:10]] == layout.slots
+    # Lazily read tags are only counted once the last one is drawn
+    assert reports == [(5, None), (10, None), (12, 12)]
@@ -0,0 +1,77 @@
+from cache import RenderCache
+from layout import GridLayout
+from pages import PageSelection, load_manifest, save_manifest
+from records import TagRecord
+
+
+def tag(model_name):
+    return TagRecord(
+        model_name, "BLACK", "349.00", "XERO", "4.0", "4", False, False, None, []
+    )
+
+
+def draw_tag(c, x_start, y_start, cell_width, cell_height, tag):
+    pass
+
+
+def catalog(*models):
+    return [tag(model) for model in models]
+
+
+# Five tags a page
+LAYOUT = GridLayout()
+
+
+def select(tags, previous=None, changed_only=False, version="v1", layout=LAYOUT):
+    pages = PageSelection(version, previous, changed_only)
+    drawn = [tag.model_name for tag in pages.select(iter(tags), draw_tag, layout)]
+    return pages, drawn
+
+
+def test_every_page_is_new_without_a_previous_render():
+    pages, drawn = select(catalog(*"ABCDEFG"))
+    assert len(pages.page_keys) == 2
+    assert pages.changed == [0, 1]
+    assert drawn == list("ABCDEFG")
+
+
+def test_only_changed_pages_are_drawn():
+    first, _ = select(catalog(*"ABCDEFGHIJK"))
+    pages, drawn = select(catalog(*"ABCDEFGXIJK"), first.page_keys, True)
+    assert pages.changed == [1]
+    assert drawn == list("FGXIJ")
+    # The manifest covers every page, drawn or not
+    assert pages.page_keys[0] == first.page_keys[0]
+    assert pages.page_keys[2] == first.page_keys[2]
+
+    # Every page is still drawn unless only the changed ones are asked for
+    _, drawn = select(catalog(*"ABCDEFGXIJK"), first.page_keys)
+    assert drawn == list("ABCDEFGXIJK")
+
+
+def test_moved_and_added_pages_change():
+    first, _ = select(catalog(*"ABCDEFGHIJ"))
+    # A row inserted at the top moves every later tag
+    pages, _ = select(catalog(*"ZABCDEFGHIJ"), first.page_keys, True)
+    assert pages.changed == [0, 1, 2]
+    pages, drawn = select(catalog(*"ABCDEFGHIJK"), first.page_keys, True)
+    assert pages.changed == [2]
+    assert drawn == ["K"]
+
+
+def test_what_pages_are_drawn_with_is_fingerprinted():
+    first, _ = select(catalog(*"ABCDE"))
+    for options in (
+        dict(version="v2"),
+        dict(layout=GridLayout(cut_marks=True)),
+    ):
+        pages, _ = select(catalog(*"ABCDE"), first.page_keys, True, **options)
+        assert pages.changed == [0]
+
+
+def test_manifests(tmp_path):
+    manifests = RenderCache(cache_dir=str(tmp_path), suffix=".pages")
+    pages, _ = select(catalog(*"ABCDEFG"))
+    save_manifest(manifests, "etag", pages.page_keys)
+    assert load_manifest(manifests, "etag") == pages.page_keys
+    assert load_manifest(manifests, "other") is None
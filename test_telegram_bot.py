@@ -0,0 +1,173 @@
+import asyncio
+import http.server
+import json
+import threading
+
+import pytest
+
+from telegram_bot import HELP_TEXT, BotApi, BotApiError, TagBot
+
+CSV = "דגם,צבע,מחיר,מותג,כמות\nTRAIL,BLACK,349,XERO,1\n"
+
+
+class FakeApi:
+    """
+    Serves the updates in batches, one per getUpdates call, and records the
+    other calls the bot makes.
+    """
+
+    def __init__(self, batches, files=None):
+        self.batches = list(batches)
+        self.files = files or {}
+        self.offsets = []
+        self.calls = []
+        self.replied = asyncio.Event()
+
+    async def call(self, method, params=None, files=None, timeout=60):
+        if method == "getUpdates":
+            self.offsets.append(params.get("offset"))
+            if self.batches:
+                return self.batches.pop(0)
+            # Nothing more to send, like a long poll that times out
+            await asyncio.sleep(3600)
+        self.calls.append((method, params, files))
+        self.replied.set()
+        return {}
+
+    async def download(self, file_id):
+        if file_id not in self.files:
+            raise BotApiError("download: HTTP 404 Not Found")
+        return self.files[file_id]
+
+
+def message(update_id, chat_id, **fields):
+    return {
+        "update_id": update_id,
+        "message": dict(message_id=100 + update_id, chat={"id": chat_id}, **fields),
+    }
+
+
+def document(file_id, caption=None):
+    fields = {"document": {"file_id": file_id, "file_name": f"{file_id}.csv"}}
+    if caption is not None:
+        fields["caption"] = caption
+    return fields
+
+
+async def serve(api, replies, **options):
+    # Runs the bot until it has made the given number of calls
+    bot = TagBot(api, workers=1, **options)
+    task = asyncio.create_task(bot.run())
+    try:
+        while len(api.calls) < replies:
+            await asyncio.wait_for(api.replied.wait(), 60)
+            api.replied.clear()
+    finally:
+        task.cancel()
+        bot.close()
+    return api.calls
+
+
+def test_commands_and_unknown_templates():
+    api = FakeApi(
+        [
+            [message(1, 10, text="/start")],
+            [message(2, 20, **document("catalog", "adults"))],
+        ]
+    )
+    calls = asyncio.run(serve(api, 2))
+
+    replies = {params["chat_id"]: params for method, params, _ in calls}
+    assert replies[10]["text"] == HELP_TEXT
+    assert replies[20]["text"].startswith("Unknown template")
+    assert replies[20]["reply_to_message_id"] == 102
+    # Every update is confirmed on the next poll
+    assert api.offsets[:3] == [None, 2, 3]
+
+
+def test_renders_documents():
+    api = FakeApi(
+        [[message(1, 10, **document("catalog")), message(2, 20, **document("bad"))]],
+        {"catalog": CSV.encode("utf8"), "bad": b""},
+    )
+    calls = asyncio.run(serve(api, 2))
+
+    sent = {
+        params["chat_id"]: (method, params, files) for method, params, files in calls
+    }
+    method, params, files = sent[10]
+    assert method == "sendDocument"
+    assert params["reply_to_message_id"] == 101
+    file_name, pdf = files["document"]
+    assert file_name == "generated.pdf"
+    assert pdf.startswith(b"%PDF")
+    method, params, _ = sent[20]
+    assert method == "sendMessage"
+
+
+def test_chat_queue_limit():
+    api = FakeApi(
+        [
+            [
+                message(1, 10, **document("catalog")),
+                message(2, 10, **document("catalog")),
+            ]
+        ],
+        {"catalog": CSV.encode("utf8")},
+    )
+    calls = asyncio.run(serve(api, 2, chat_queue_limit=1))
+
+    methods = [
+        (method, params.get("reply_to_message_id")) for method, params, _ in calls
+    ]
+    # The second catalog is refused while the first one is rendering
+    assert ("sendMessage", 102) in methods
+    assert ("sendDocument", 101) in methods
+
+
+def test_failed_downloads_are_reported():
+    api = FakeApi([[message(1, 10, **document("expired"))]])
+    calls = asyncio.run(serve(api, 1))
+
+    assert calls[0][0] == "sendMessage"
+    assert calls[0][1]["text"] == "Failed to render the catalog"
+
+
+class StubBotApiHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Answers getFile with a file path, and the file itself with 404 as the
+    Bot API does once it is no longer available.
+    """
+
+    def do_POST(self):
+        body = {"ok": True, "result": {"file_path": "documents/file_1.csv"}}
+        if not self.path.endswith("/getFile"):
+            body = {"ok": False, "description": "Not Found: method not found"}
+        self.respond(200 if body["ok"] else 404, json.dumps(body).encode("utf8"))
+
+    def do_GET(self):
+        self.respond(404, b'{"ok":false,"error_code":404}')
+
+    def respond(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_api_http_errors():
+    server = http.server.HTTPServer(("127.0.0.1", 0), StubBotApiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api = BotApi("token", f"http://127.0.0.1:{server.server_port}")
+    try:
+        with pytest.raises(BotApiError, match="404"):
+            asyncio.run(api.download("file"))
+        # Method errors are described by the Bot API in the body
+        with pytest.raises(BotApiError, match="method not found"):
+            asyncio.run(api.call("noSuchMethod"))
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,51 @@
+from records import MAX_COPIES
+from validation import count_rows, validate_csv
+
+HEADER = "דגם,צבע,מחיר,מותג,עובי,כמות"
+
+
+def catalog(*rows, header=HEADER):
+    return "\n".join((header,) + rows) + "\n"
+
+
+def test_reports_every_problem_by_row():
+    csv_data = catalog(
+        "TRAIL,BLACK,349,NO SUCH BRAND,4,1",
+        "TRAIL,RED,free,,thick,",
+        "",
+        f"ROAD,BLUE,199,,4.5,{MAX_COPIES + 1}",
+    )
+    report = validate_csv(csv_data)
+    assert report.rows == 3
+    assert report.counts == {"price": 1, "thickness": 1, "brand": 1, "quantity": 1}
+    issues = {(issue["row"], issue["problem"]) for issue in report.issues}
+    assert issues == {(1, "brand"), (2, "price"), (2, "thickness"), (3, "quantity")}
+
+
+def test_counts_printed_copies():
+    csv_data = catalog(
+        "A,B,1,,4,3", "A,B,1,,4,", "A,B,1,,4,0", f"A,B,1,,4,{MAX_COPIES * 2}"
+    )
+    report = validate_csv(csv_data)
+    assert report.rows == 4
+    assert report.tags == 3 + 1 + 0 + MAX_COPIES
+    assert count_rows(csv_data) == 4
+
+
+def test_size_table_templates_skip_the_price():
+    header = "דגם,צבע,מחיר,מותג,מידות1,מחיר1"
+    csv_data = catalog("TRAIL,BLACK,,,20-25,150", "TRAIL,RED,,,26-30,", header=header)
+    for template in ("kids", "children"):
+        report = validate_csv(csv_data, template)
+        assert report.counts == {"size_pair": 1}
+    assert validate_csv(csv_data, "regular").counts == {"price": 2, "size_pair": 1}
+    assert validate_csv(csv_data).counts == {"price": 2, "size_pair": 1}
+
+
+def test_kids_discount_catalogs_check_the_price():
+    csv_data = catalog("TRAIL,BLACK,,,20", header="דגם,צבע,מחיר,מותג,הנחה")
+    assert validate_csv(csv_data, "kids").counts == {"price": 1}
+
+
+def test_without_header():
+    assert validate_csv("") is None
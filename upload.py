@@ -0,0 +1,174 @@
+"""
+Reads the posted catalog CSV from a request.
+
+The catalog can be posted three ways:
+
+- as the "data" field of a URL-encoded or multipart form, as before;
+- as a raw text/csv body, optionally sent with Content-Encoding: gzip, or
+  as an application/gzip body;
+- as the "file" part of a multipart form, gzip-compressed if its file name
+  ends in .gz or its content type says so.
+
+A batch request posts several catalogs as file parts of one multipart form,
+see read_batch_upload.
+
+Raw bodies and file parts are not decoded by the form parser. They are read
+in UPLOAD_BLOCK_SIZE blocks, decompressed and decoded block by block, so a
+compressed upload never exists uncompressed as bytes and is never
+percent-decoded.
+"""
+
+import codecs
+import os
+import re
+import zlib
+
+UPLOAD_BLOCK_SIZE = 64 * 1024
+# Largest catalog accepted, in bytes after decompression
+MAX_CATALOG_BYTES = int(os.environ.get("MAX_CATALOG_BYTES", 64 * 1024 * 1024))
+
+CSV_MIMETYPES = ("text/csv", "text/plain", "application/csv")
+GZIP_MIMETYPES = ("application/gzip", "application/x-gzip")
+
+
+class UploadError(ValueError):
+    status = 400
+
+
+class UploadTooLarge(UploadError):
+    status = 413
+
+
+def _gunzip(blocks, block_size):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    started = False
+    for block in blocks:
+        while block:
+            started = True
+            # Bounded output per call, however well the block compresses
+            yield decompressor.decompress(block, block_size)
+            block = decompressor.unconsumed_tail
+            if decompressor.eof:
+                # Concatenated gzip members, as written by gzip -c a b
+                block = decompressor.unused_data
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                started = False
+    if started:
+        raise UploadError("The gzip data is truncated")
+
+
+def _read_blocks(stream, block_size):
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            return
+        yield block
+
+
+def read_text(stream, gzipped=False, limit=MAX_CATALOG_BYTES):
+    """
+    Reads, decompresses and decodes a binary stream block by block.
+
+    :param stream: The binary stream, such as the request body.
+    :param gzipped: The stream is gzip-compressed.
+    :param limit: The most bytes accepted after decompression.
+    :return: The text, decoded as UTF-8 with an optional BOM.
+    :raises UploadError: When the data is not valid gzip or UTF-8.
+    :raises UploadTooLarge: When the data is larger than the limit.
+    """
+    blocks = _read_blocks(stream, UPLOAD_BLOCK_SIZE)
+    if gzipped:
+        blocks = _gunzip(blocks, UPLOAD_BLOCK_SIZE)
+
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    parts = []
+    size = 0
+    try:
+        for block in blocks:
+            size += len(block)
+            if size > limit:
+                raise UploadTooLarge(f"The catalog is larger than {limit} bytes")
+            parts.append(decoder.decode(block))
+        parts.append(decoder.decode(b"", final=True))
+    except zlib.error as e:
+        raise UploadError(f"The gzip data is invalid: {e}") from e
+    except UnicodeDecodeError as e:
+        raise UploadError(f"The catalog is not UTF-8: {e}") from e
+    return "".join(parts)
+
+
+def _is_gzipped_part(part):
+    return (
+        (part.filename or "").lower().endswith(".gz")
+        or part.mimetype in GZIP_MIMETYPES
+        or part.headers.get("Content-Encoding", "").lower() == "gzip"
+    )
+
+
+def read_csv_upload(request):
+    """
+    Reads the catalog CSV from the request body, a "file" part or the
+    "data" form field, in that order.
+
+    :param request: The Flask request.
+    :return: The CSV text, or None if the request has no catalog.
+    :raises UploadError: When the upload cannot be read.
+    """
+    gzipped = (
+        request.headers.get("Content-Encoding", "").lower() == "gzip"
+        or request.mimetype in GZIP_MIMETYPES
+    )
+    if request.mimetype in CSV_MIMETYPES + GZIP_MIMETYPES:
+        return read_text(request.stream, gzipped) or None
+    if gzipped:
+        raise UploadError("Only text/csv bodies can be sent gzip-compressed")
+
+    part = request.files.get("file")
+    if part is not None:
+        return read_text(part.stream, _is_gzipped_part(part)) or None
+
+    csv_data = request.form.get("data")
+    if csv_data and len(csv_data) > MAX_CATALOG_BYTES:
+        raise UploadTooLarge(f"The catalog is larger than {MAX_CATALOG_BYTES} bytes")
+    return csv_data or None
+
+
+def _part_name(file_name, index):
+    # The file name without its directory and .csv or .gz extensions
+    name = re.split(r"[\\/]", file_name or "")[-1]
+    name = re.sub(r"(\.csv)?(\.gz)?$", "", name, flags=re.I)
+    name = re.sub(r"[^\w.-]+", "_", name).strip("._")
+    return name or f"part{index}"
+
+
+def read_batch_upload(request):
+    """
+    Reads every file part of a multipart batch request, in the order they
+    were posted. The field name of a part is the template to render it
+    with, and its file name, without extensions, names it.
+
+    :param request: The Flask request.
+    :return: A list of (template, name, CSV text), names made unique.
+    :raises UploadError: When a part cannot be read, or the parts together
+        are larger than MAX_CATALOG_BYTES.
+    """
+    parts = []
+    names = set()
+    remaining = MAX_CATALOG_BYTES
+    for index, (template, part) in enumerate(request.files.items(multi=True), 1):
+        try:
+            csv_data = read_text(part.stream, _is_gzipped_part(part), remaining)
+        except UploadTooLarge:
+            raise UploadTooLarge(
+                f"The catalogs are larger than {MAX_CATALOG_BYTES} bytes together"
+            ) from None
+        remaining -= len(csv_data.encode("utf8"))
+
+        name = base = _part_name(part.filename, index)
+        suffix = 2
+        while name in names:
+            name = f"{base}-{suffix}"
+            suffix += 1
+        names.add(name)
+        parts.append((template, name, csv_data))
+    return parts
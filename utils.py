@@ -1,196 +1,315 @@
-import os
-import pandas as pd
-import io
-
 # import telebot
-from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import cm
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 
-# Register the Poppins font
-pdfmetrics.registerFont(TTFont("Poppins-Bold", "fonts/Poppins-Bold.ttf"))
-pdfmetrics.registerFont(TTFont("Poppins-Regular", "fonts/Poppins-Regular.ttf"))
-pdfmetrics.registerFont(TTFont("Montserrat-Bold", "fonts/Montserrat-Bold.ttf"))
-pdfmetrics.registerFont(TTFont("Montserrat-SemiBold", "fonts/Montserrat-SemiBold.ttf"))
-pdfmetrics.registerFont(TTFont("Montserrat-Regular", "fonts/Montserrat-Regular.ttf"))
-pdfmetrics.registerFont(TTFont("Montserrat-Medium", "fonts/Montserrat-Medium.ttf"))
+from assets import draw_asset, has_asset, log_asset_error
+from metrics import fit_font_size, string_width
+
+# Room the vegan or grounding icon takes on the color line
+ICON_ADVANCE = 0.66 * cm + 0.4 * cm
+# Widest a price is drawn before it is shrunk
+PRICE_BOX_WIDTH = 4 * cm
+# Text measured in one batch per document, see metrics.prime_tags
+MEASURED_TEXT = (
+    ("model_name", "Montserrat-Bold"),
+    ("color", "Montserrat-SemiBold"),
+    ("price", "Montserrat-SemiBold"),
+    ("model_name", "Poppins-Bold"),
+    ("color", "Poppins-Bold"),
+)
+
+
+def _draw_cell_border(c, cell_width, cell_height):
+    # Set the stroke color to light grey
+    light_grey = colors.Color(0.85, 0.85, 0.85)  # RGB values for light grey
+    c.setStrokeColor(light_grey)
+
+    # Set the line style to dotted
+    c.setDash(1, 2)  # 1 unit on, 2 units off for a dotted line pattern
+    c.rect(0, 0, cell_width, cell_height, stroke=1, fill=0)
+    c.setDash([])
 
 
-def draw_price_tag(c, x_start, y_start, cell_width, cell_height, row):
+def _draw_green_line(c, cell_height):
+    # Draw a vertical bright green line at 4.9 cm
+    line_x = 4.9 * cm
+    c.setStrokeColorCMYK(0.38, 0.04, 1.0, 0.0)  # Bright green color
+    c.setLineWidth(1)
+    c.line(line_x, 0.65 * cm, line_x, cell_height - 0.65 * cm)
+
+
+def _draw_store_logo(c, cell_height, asset="store_logo", logo_height=2.1 * cm):
+    # Draw the store logo at 21.7 cm (1.8 cm wide)
+    try:
+        draw_asset(
+            c,
+            asset,
+            21.7 * cm,
+            (cell_height - logo_height) / 2,
+            width=2.1 * cm,
+            height=logo_height,
+            preserveAspectRatio=True,
+        )
+    except Exception as e:
+        log_asset_error("store logo", e)
+
+
+def _draw_price_tag_static(c, cell_width, cell_height):
+    _draw_cell_border(c, cell_width, cell_height)
+    _draw_green_line(c, cell_height)
+    _draw_store_logo(c, cell_height)
+
+
+def _draw_discount_price_tag_static(c, cell_width, cell_height):
+    _draw_cell_border(c, cell_width, cell_height)
+
+    # Draw the background starting from 4.6 cm
+    try:
+        draw_asset(
+            c,
+            "BACKGROUND",
+            4.6 * cm,
+            0,
+            width=cell_width - 4.6 * cm,  # Adjust width to fit the rest of the cell
+            height=cell_height,
+            preserveAspectRatio=False,
+        )
+    except Exception as e:
+        log_asset_error("background image", e)
+
+    # Draw the brush stroke under the discount
+    try:
+        draw_asset(
+            c,
+            "BRUSH",
+            21.62 * cm,
+            cell_height / 2 - 0.2 * cm,
+            width=-4.7 * cm,
+            height=0.2 * cm,
+            preserveAspectRatio=False,
+        )
+    except Exception as e:
+        log_asset_error("background image", e)
+
+    _draw_store_logo(c, cell_height)
+
+
+def _draw_kids_price_tag_static(c, cell_width, cell_height):
+    _draw_cell_border(c, cell_width, cell_height)
+
+    # Draw the strip behind the model name starting from 5 cm
+    try:
+        draw_asset(
+            c,
+            "strip",
+            5 * cm,
+            cell_height - 1.9 * cm,
+            width=cell_width - 13 * cm,  # Adjust width to fit the rest of the cell
+            height=cell_height / 2,
+            preserveAspectRatio=False,
+        )
+    except Exception as e:
+        log_asset_error("background image", e)
+
+    _draw_store_logo(c, cell_height, "store_logo_kids", 3 * cm)
+
+
+def _draw_kids_discount_price_tag_static(c, cell_width, cell_height):
+    _draw_cell_border(c, cell_width, cell_height)
+    _draw_green_line(c, cell_height)
+    _draw_store_logo(c, cell_height)
+
+
+# The parts of each template that are the same on every tag
+STATIC_LAYERS = {
+    "price_tag": _draw_price_tag_static,
+    "discount_price_tag": _draw_discount_price_tag_static,
+    "kids_price_tag": _draw_kids_price_tag_static,
+    "kids_discount_price_tag": _draw_kids_discount_price_tag_static,
+}
+
+
+def draw_static_layer(c, template, x_start, y_start, cell_width, cell_height):
     """
-    Draws the price tag on the canvas.
+    Places the static layer of a template in a cell. The layer is compiled
+    into a form XObject the first time a document uses it, so every later
+    tag costs a single doForm call.
 
     :param c: The canvas object to draw on.
+    :param template: The STATIC_LAYERS key of the template.
     :param x_start: The starting x-coordinate for the cell.
     :param y_start: The starting y-coordinate for the cell.
     :param cell_width: The width of the cell.
     :param cell_height: The height of the cell.
-    :param row: The row data containing model, color, price, etc.
     """
-    # Extract the row data
-    model_name = str(row.get("דגם", "N/A")).upper()
-    color = str(row.get("צבע", "N/A")).upper()
-    price = str(row.get("מחיר", "N/A"))
-    brand_name = str(row.get("מותג"))
+    if getattr(c, "skip_static_layers", False):
+        # Set by preview.py, which lays the tag over a cached raster instead
+        return
+    form_name = f"{template}_{round(cell_width)}x{round(cell_height)}"
+    if not c.hasForm(form_name):
+        # Pad the bounding box so the border stroke is not clipped
+        c.beginForm(form_name, -1, -1, cell_width + 1, cell_height + 1)
+        STATIC_LAYERS[template](c, cell_width, cell_height)
+        c.endForm()
+
+    c.saveState()
+    c.translate(x_start, y_start)
+    c.doForm(form_name)
+    c.restoreState()
+
+
+def _fit_color(tag, max_width, icons=True):
+    """
+    Calculates the font size of the color so that the color, the sole
+    thickness and, if they are on the same line, the icons fit the width.
+    """
+    thickness_width = string_width(f"{tag.sole_thickness}mm", "Montserrat-Regular", 18)
+    icons_width = ICON_ADVANCE * (tag.vegan + tag.grounding) if icons else 0
+    return fit_font_size(
+        tag.color,
+        "Montserrat-SemiBold",
+        18,
+        max_width - thickness_width - icons_width - 5 - 0.25 * cm,
+    )
 
-    sole_thickness_value = row.get("עובי", "N/A")
-    vegan = str(row.get("טבעוני", "N/A")).upper()
-    grounding = str(row.get("הארקה", "N/A")).upper()
 
-    try:
-        # Convert the sole thickness to a float and format it with one digit after the dot
-        sole_thickness = f"{float(sole_thickness_value):.1f}"
-    except (ValueError, TypeError):
-        # Handle cases where sole_thickness_value is not a valid float
-        sole_thickness = "N/A"
+def draw_price_tag(c, x_start, y_start, cell_width, cell_height, tag):
+    """
+    Draws the price tag on the canvas.
+
+    :param c: The canvas object to draw on.
+    :param x_start: The starting x-coordinate for the cell.
+    :param y_start: The starting y-coordinate for the cell.
+    :param cell_width: The width of the cell.
+    :param cell_height: The height of the cell.
+    :param tag: The normalized TagRecord with model, color, price, etc.
+    """
+    # Unpack the normalized tag data
+    model_name = tag.model_name
+    color = tag.color
+    brand_name = tag.brand_name
+    sole_thickness = tag.sole_thickness
+
+    # Place the static border, backgrounds and store logo
+    draw_static_layer(c, "price_tag", x_start, y_start, cell_width, cell_height)
 
     # Draw the brand logo area (0 cm to 4.9 cm)
-    brand_logo_path = f"logos1/{brand_name}.png" if brand_name else None
-    if brand_logo_path and os.path.exists(brand_logo_path):
+    brand_logo_asset = brand_name if brand_name else None
+    if brand_logo_asset and has_asset(brand_logo_asset):
         try:
             max_logo_width = 4.2 * cm
             max_logo_height = cell_height - 0.6 * cm
             logo_x = x_start + (4.9 * cm - max_logo_width) / 2  # Center horizontally
             logo_y = y_start + (cell_height - max_logo_height) / 2  # Center vertically
-            c.drawImage(
-                brand_logo_path,
+            draw_asset(
+                c,
+                brand_logo_asset,
                 logo_x,
                 logo_y,
                 width=max_logo_width,
                 height=max_logo_height,
                 preserveAspectRatio=True,
-                mask="auto",
             )
         except Exception as e:
-            print(f"Error loading brand logo: {e}")
-
-    # Draw a vertical bright green line at 4.9 cm
-    line_x = x_start + 4.9 * cm
-    c.setDash([])  # Reset dash pattern
-    c.setStrokeColorCMYK(0.38, 0.04, 1.0, 0.0)  # Bright green color
-    c.setLineWidth(1)
-    c.line(line_x, y_start + 0.65 * cm, line_x, y_start + cell_height - 0.65 * cm)
+            log_asset_error("brand logo", e)
 
     # Draw the model name area starting from 5.6 cm
     model_x_start = x_start + 5.6 * cm
-    c.setFont("Montserrat-Bold", 25)
+    model_size = fit_font_size(model_name, "Montserrat-Bold", 25, 21.2 * cm - 5.6 * cm)
+    c.setFont("Montserrat-Bold", model_size)
     c.setFillColorRGB(67 / 255, 75 / 255, 49 / 255)  # Dark green color
     c.drawString(model_x_start, y_start + cell_height - 1.4 * cm, model_name)
 
-    c.setFont("Montserrat-SemiBold", 18)
+    # Fit the price first, the color line has to end before it
+    formatted_price = tag.price
+    price_size = fit_font_size(
+        formatted_price, "Montserrat-SemiBold", 18, PRICE_BOX_WIDTH
+    )
+    price_text_width = string_width(formatted_price, "Montserrat-SemiBold", price_size)
+    color_size = _fit_color(tag, 21 * cm - price_text_width - 5.9 * cm)
+
+    c.setFont("Montserrat-SemiBold", color_size)
     color_y_position = y_start + cell_height - 2.55 * cm
     c.drawString(model_x_start, color_y_position, color)
 
     # Draw the sole thickness next to the color
     c.setFont("Montserrat-Regular", 18)
-    thickness_x = model_x_start + c.stringWidth(color, "Montserrat-SemiBold", 18) + 5
-    formatted_thickness = (
-        f"{float(sole_thickness):.1f}mm"  # Ensure one digit after the dot
+    thickness_x = (
+        model_x_start + string_width(color, "Montserrat-SemiBold", color_size) + 5
     )
+    formatted_thickness = f"{sole_thickness}mm"
     c.drawString(thickness_x + 0.25 * cm, color_y_position, formatted_thickness)
 
     # Calculate the x-position after the sole thickness for the icons
-    current_x_position = thickness_x + c.stringWidth(
+    current_x_position = thickness_x + string_width(
         formatted_thickness, "Montserrat-Regular", 18
     )
 
     # Draw the vegan icon if applicable
-    if vegan == "YES":
+    if tag.vegan:
         # vegan_string = "המוצר אינו מכיל חומרים מהחי, אולם לא עבר בדיקת מעבדה לקבלת תו תקן טבעוני רשמי"
-        vegan_path = "logos1/VEGAN.png"  # Path to vegan logo
-        c.setFont("Montserrat-Regular", 18)
+        vegan_asset = "VEGAN"  # Preloaded vegan logo
         try:
-            c.drawImage(
-                vegan_path,
+            draw_asset(
+                c,
+                vegan_asset,
                 current_x_position,
                 color_y_position,  # Align vertically (slightly below the text)
                 width=2.1 * cm,
                 height=0.75 * cm,
                 preserveAspectRatio=True,
-                mask="auto",
             )
             current_x_position += (
                 0.66 * cm + 0.4 * cm
             )  # Update the position for the next icon
         except Exception as e:
-            print(f"Error loading vegan icon: {e}")
+            log_asset_error("vegan icon", e)
 
     # Draw the grounding icon if applicable
-    if grounding == "YES":
-        grounding_path = "logos1/GROUNDING.png"  # Path to grounding logo
+    if tag.grounding:
+        grounding_asset = "GROUNDING"  # Preloaded grounding logo
         try:
-            c.drawImage(
-                grounding_path,
+            draw_asset(
+                c,
+                grounding_asset,
                 current_x_position,
                 color_y_position,  # Align vertically (slightly below the text)
                 width=2.1 * cm,
                 height=0.75 * cm,
                 preserveAspectRatio=True,
-                mask="auto",
             )
         except Exception as e:
-            print(f"Error loading grounding icon: {e}")
+            log_asset_error("grounding icon", e)
 
     # Draw the price
     price_x = x_start + 21 * cm
-    try:
-        formatted_price = f"{float(price):,.2f}"
-    except ValueError:
-        formatted_price = price  # Fallback to original if conversion fails
 
-    price_y_position = y_start + cell_height / 2
-
-    shekel_icon_path = "logos1/shekel.png"  # Path to your shekel symbol PNG file
+    shekel_icon_asset = "shekel"  # Preloaded shekel symbol
     shekel_icon_height = 0.35 * cm  # 4 mm height
     shekel_icon_width = shekel_icon_height * 1.2  # Keep aspect ratio
 
-    font_size = 18
-    text_height = font_size * 0.6
-
-    price_text_width = c.stringWidth(formatted_price, "Montserrat-SemiBold", font_size)
-
     try:
         # Draw the shekel symbol PNG
-        c.drawImage(
-            shekel_icon_path,
+        draw_asset(
+            c,
+            shekel_icon_asset,
             price_x - price_text_width,
             color_y_position,  # Align vertically
             width=shekel_icon_width,
             height=shekel_icon_height,
             preserveAspectRatio=True,
-            mask="auto",
         )
 
         # Draw the formatted price next to the shekel symbol
         price_text_x = price_x + shekel_icon_width + 5  # Slight gap after icon
-        c.setFont("Montserrat-SemiBold", 18)
-        text_y_position = price_y_position - text_height / 2
+        c.setFont("Montserrat-SemiBold", price_size)
         c.drawRightString(price_text_x, color_y_position, formatted_price)
 
     except Exception as e:
-        print(f"Error loading shekel icon: {e}")
-
-    # Draw the store logo at 21.7 cm (1.8 cm wide)
-    store_logo_path = "logos1/store_logo.png"  # Path to store logo
-    store_logo_x = x_start + 21.7 * cm
-    try:
-        c.drawImage(
-            store_logo_path,
-            store_logo_x,
-            y_start + (cell_height - 2.1 * cm) / 2,
-            width=2.1 * cm,
-            height=2.1 * cm,
-            preserveAspectRatio=True,
-            mask="auto",
-        )
-    except Exception as e:
-        print(f"Error loading store logo: {e}")
+        log_asset_error("shekel icon", e)
 
 
-def draw_discount_price_tag(c, x_start, y_start, cell_width, cell_height, row):
+def draw_discount_price_tag(c, x_start, y_start, cell_width, cell_height, tag):
     """
     Draws the price tag with background on the canvas.
 
@@ -199,78 +318,62 @@ def draw_discount_price_tag(c, x_start, y_start, cell_width, cell_height, row):
     :param y_start: The starting y-coordinate for the cell.
     :param cell_width: The width of the cell.
     :param cell_height: The height of the cell.
-    :param row: The row data containing model, color, price, etc.
+    :param tag: The normalized TagRecord with model, color, price, etc.
     """
-    model_name = str(row.get("דגם", "N/A")).upper()
-    color = str(row.get("צבע", "N/A")).upper()
-    price = str(row.get("מחיר", "N/A"))
-    brand_name = str(row.get("מותג"))
-    discount = str(int(row.get("הנחה")))
-    sole_thickness_value = row.get("עובי", "N/A")
-    vegan = str(row.get("טבעוני", "N/A")).upper()
-    grounding = str(row.get("הארקה", "N/A")).upper()
-
-    try:
-        # Convert the sole thickness to a float and format it with one digit after the dot
-        sole_thickness = f"{float(sole_thickness_value):.1f}"
-    except (ValueError, TypeError):
-        # Handle cases where sole_thickness_value is not a valid float
-        sole_thickness = "N/A"
+    # Unpack the normalized tag data
+    model_name = tag.model_name
+    color = tag.color
+    brand_name = tag.brand_name
+    sole_thickness = tag.sole_thickness
+    discount = tag.discount
+
+    # Place the static border, backgrounds and store logo
+    draw_static_layer(
+        c, "discount_price_tag", x_start, y_start, cell_width, cell_height
+    )
 
     # Draw the brand logo area (0 cm to 4.9 cm)
-    brand_logo_path = f"logos1/{brand_name}.png" if brand_name else None
-    if brand_logo_path and os.path.exists(brand_logo_path):
+    brand_logo_asset = brand_name if brand_name else None
+    if brand_logo_asset and has_asset(brand_logo_asset):
         try:
             max_logo_width = 4.2 * cm
             max_logo_height = cell_height - 0.6 * cm
             logo_x = x_start + (4.9 * cm - max_logo_width) / 2  # Center horizontally
             logo_y = y_start + (cell_height - max_logo_height) / 2  # Center vertically
-            c.drawImage(
-                brand_logo_path,
+            draw_asset(
+                c,
+                brand_logo_asset,
                 logo_x,
                 logo_y,
                 width=max_logo_width,
                 height=max_logo_height,
                 preserveAspectRatio=True,
-                mask="auto",
             )
         except Exception as e:
-            print(f"Error loading brand logo: {e}")
-
-    # Draw the background starting from 4.9 cm
-    background_path = "logos1/BACKGROUND.png"  # Path to your background image file
-    try:
-        background_x = x_start + 4.6 * cm
-        c.drawImage(
-            background_path,
-            background_x,
-            y_start,
-            width=cell_width - 4.6 * cm,  # Adjust width to fit the rest of the cell
-            height=cell_height,
-            preserveAspectRatio=False,
-            mask="auto",
-        )
-    except Exception as e:
-        print(f"Error loading background image: {e}")
+            log_asset_error("brand logo", e)
 
     # Draw the model name area starting from 5.6 cm
     model_x_start = x_start + 5.6 * cm
-    c.setFont("Montserrat-Bold", 25)
-    c.setFillColorRGB(1, 1, 1)
-    c.drawString(model_x_start, y_start + cell_height - 1.4 * cm, model_name)
-
-    # Draw the "SALE -30%" text to the right of the model name
-    sale_text_x_start = (
-        model_x_start + c.stringWidth(f"-{discount}%", "Montserrat-Bold", 25) + 15
-    )
     sale_y_position = y_start + cell_height - 1.4 * cm
+    discount_text_width = string_width(f"-{discount}%", "Montserrat-Bold", 25)
 
-    discount_text_width = c.stringWidth(f"-{discount}%", "Montserrat-Bold", 25)
+    # The model name ends before the "SALE -30%" text
+    sale_x_start = (
+        21.45 * cm - discount_text_width - string_width("SALE", "Montserrat-Medium", 25)
+    )
+    model_size = fit_font_size(
+        model_name, "Montserrat-Bold", 25, sale_x_start - 0.4 * cm - 5.6 * cm
+    )
+    c.setFont("Montserrat-Bold", model_size)
+    c.setFillColorRGB(1, 1, 1)
+    c.drawString(model_x_start, sale_y_position, model_name)
 
     # Draw "SALE" with Montserrat Medium, white color
     c.setFont("Montserrat-Medium", 25)
     c.setFillColorRGB(1, 1, 1)
-    c.drawRightString(22.45 * cm - discount_text_width, sale_y_position, "SALE")
+    c.drawRightString(
+        x_start + 21.45 * cm - discount_text_width, sale_y_position, "SALE"
+    )
 
     # Draw "-30%" with Montserrat Bold, green color
     c.setFont("Montserrat-Bold", 25)
@@ -279,129 +382,96 @@ def draw_discount_price_tag(c, x_start, y_start, cell_width, cell_height, row):
     )  # Bright green color (c=38, m=4, y=100, k=0)
     c.drawRightString(x_start + 21.6 * cm, sale_y_position, f"-{discount}%")
 
-    # Draw the color and sole thickness below the model name
+    # Fit the price first, the color line has to end before it
+    formatted_price = tag.price
+    price_size = fit_font_size(
+        formatted_price, "Montserrat-SemiBold", 18, PRICE_BOX_WIDTH
+    )
+    price_text_width = string_width(formatted_price, "Montserrat-SemiBold", price_size)
+    color_size = _fit_color(tag, 21 * cm - price_text_width - 5.9 * cm)
 
-    c.setFont("Montserrat-SemiBold", 18)
+    # Draw the color and sole thickness below the model name
+    c.setFont("Montserrat-SemiBold", color_size)
     c.setFillColorRGB(1, 1, 1)
     color_y_position = y_start + cell_height - 2.55 * cm
     c.drawString(model_x_start, color_y_position, color)
 
     # Draw the sole thickness next to the color
     c.setFont("Montserrat-Regular", 18)
-    thickness_x = model_x_start + c.stringWidth(color, "Montserrat-SemiBold", 18) + 5
-    formatted_thickness = (
-        f"{float(sole_thickness):.1f}mm"  # Ensure one digit after the dot
+    thickness_x = (
+        model_x_start + string_width(color, "Montserrat-SemiBold", color_size) + 5
     )
+    formatted_thickness = f"{sole_thickness}mm"
     c.drawString(thickness_x + 0.25 * cm, color_y_position, formatted_thickness)
 
     # Calculate the x-position after the sole thickness for the icons
-    current_x_position = thickness_x + c.stringWidth(
+    current_x_position = thickness_x + string_width(
         formatted_thickness, "Montserrat-Regular", 18
     )
 
     # Draw the vegan icon if applicable
-    if vegan == "YES":
-        vegan_path = "logos1/vegan_white.png"  # Path to vegan logo
+    if tag.vegan:
+        vegan_asset = "vegan_white"  # Preloaded vegan logo
         try:
-            c.drawImage(
-                vegan_path,
+            draw_asset(
+                c,
+                vegan_asset,
                 current_x_position,
                 color_y_position,  # Align vertically (slightly below the text)
                 width=2.1 * cm,
                 height=0.75 * cm,
                 preserveAspectRatio=True,
-                mask="auto",
             )
             current_x_position += (
                 0.66 * cm + 0.4 * cm
             )  # Update the position for the next icon
         except Exception as e:
-            print(f"Error loading vegan icon: {e}")
+            log_asset_error("vegan icon", e)
 
     # Draw the grounding icon if applicable
-    if grounding == "YES":
-        grounding_path = "logos1/grounding_white.png"  # Path to grounding logo
+    if tag.grounding:
+        grounding_asset = "grounding_white"  # Preloaded grounding logo
         try:
-            c.drawImage(
-                grounding_path,
+            draw_asset(
+                c,
+                grounding_asset,
                 current_x_position,
                 color_y_position,  # Align vertically (slightly below the text)
                 width=2.1 * cm,
                 height=0.75 * cm,
                 preserveAspectRatio=True,
-                mask="auto",
             )
         except Exception as e:
-            print(f"Error loading grounding icon: {e}")
-
-    brush_path = "logos1/BRUSH.png"  # Path to your background image file
-    try:
-        brush_x = x_start + 21.62 * cm
-        c.drawImage(
-            brush_path,
-            brush_x,
-            y_start + cell_height / 2 - 0.2 * cm,
-            width=-4.7 * cm,  # Adjust width to fit the rest of the cell
-            height=0.2 * cm,
-            preserveAspectRatio=False,
-            mask="auto",
-        )
-    except Exception as e:
-        print(f"Error loading background image: {e}")
+            log_asset_error("grounding icon", e)
 
     # Draw the price at the right position, aligned with the color
     price_x = x_start + 21 * cm
-    try:
-        formatted_price = f"{float(price):,.2f}"
-    except ValueError:
-        formatted_price = price  # Fallback to original if conversion fails
 
-    shekel_icon_path = "logos1/white_Shekel.png"  # Path to your shekel symbol PNG file
+    shekel_icon_asset = "white_Shekel"  # Preloaded shekel symbol
     shekel_icon_height = 0.35 * cm  # 4 mm height
     shekel_icon_width = shekel_icon_height * 1.2  # Keep aspect ratio
 
-    font_size = 18
-    text_height = font_size * 0.6
-
-    price_text_width = c.stringWidth(formatted_price, "Montserrat-SemiBold", font_size)
-
     try:
         # Draw the shekel symbol PNG aligned with the color
-        c.drawImage(
-            shekel_icon_path,
+        draw_asset(
+            c,
+            shekel_icon_asset,
             price_x - price_text_width,
             color_y_position,  # Align vertically
             width=shekel_icon_width,
             height=shekel_icon_height,
             preserveAspectRatio=True,
-            mask="auto",
         )
 
         # Draw the formatted price next to the shekel symbol
         price_text_x = price_x + shekel_icon_width + 5  # Slight gap after icon
-        c.setFont("Montserrat-SemiBold", 18)
+        c.setFont("Montserrat-SemiBold", price_size)
         c.drawRightString(price_text_x, color_y_position, formatted_price)
     except Exception as e:
-        print(f"Error loading shekel icon: {e}")
-
-    # Draw the store logo at 21.7 cm (1.8 cm wide)
-    store_logo_path = "logos1/store_logo.png"  # Path to store logo
-    store_logo_x = x_start + 21.7 * cm
-    try:
-        c.drawImage(
-            store_logo_path,
-            store_logo_x,
-            y_start + (cell_height - 2.1 * cm) / 2,
-            width=2.1 * cm,
-            height=2.1 * cm,
-            preserveAspectRatio=True,
-            mask="auto",
-        )
-    except Exception as e:
-        print(f"Error loading store logo: {e}")
+        log_asset_error("shekel icon", e)
 
 
-def draw_kids_price_tag(c, x_start, y_start, cell_width, cell_height, row):
+def draw_kids_price_tag(c, x_start, y_start, cell_width, cell_height, tag):
     """
     Draws the price tag on the canvas.
 
@@ -410,74 +480,51 @@ def draw_kids_price_tag(c, x_start, y_start, cell_width, cell_height, row):
     :param y_start: The starting y-coordinate for the cell.
     :param cell_width: The width of the cell.
     :param cell_height: The height of the cell.
-    :param row: The row data containing model, color, price, etc.
+    :param tag: The normalized TagRecord with model, color, price, etc.
     """
-    # Extract the row data
-    print("used draw kids_price_tag")
-    model_name = str(row.get("דגם", "N/A")).upper()
-    color = str(row.get("צבע", "N/A")).upper()
-    price = str(row.get("מחיר", "N/A"))
-    brand_name = str(row.get("מותג"))
+    # Unpack the normalized tag data
+    model_name = tag.model_name
+    color = tag.color
+    brand_name = tag.brand_name
+    sole_thickness = tag.sole_thickness
 
-    sole_thickness_value = row.get("עובי", "N/A")
-    vegan = str(row.get("טבעוני", "N/A")).upper()
-    grounding = str(row.get("הארקה", "N/A")).upper()
-
-    try:
-        # Convert the sole thickness to a float and format it with one digit after the dot
-        sole_thickness = f"{float(sole_thickness_value):.1f}"
-    except (ValueError, TypeError):
-        # Handle cases where sole_thickness_value is not a valid float
-        sole_thickness = "N/A"
+    # Place the static border, backgrounds and store logo
+    draw_static_layer(c, "kids_price_tag", x_start, y_start, cell_width, cell_height)
 
     # Draw the brand logo area (0 cm to 4.9 cm)
-    brand_logo_path = f"logos1/{brand_name}.png" if brand_name else None
-    if brand_logo_path and os.path.exists(brand_logo_path):
+    brand_logo_asset = brand_name if brand_name else None
+    if brand_logo_asset and has_asset(brand_logo_asset):
         try:
             max_logo_width = 4.2 * cm
             max_logo_height = cell_height - 0.6 * cm
             logo_x = x_start + (4.9 * cm - max_logo_width) / 2  # Center horizontally
             logo_y = y_start + (cell_height - max_logo_height) / 2  # Center vertically
-            c.drawImage(
-                brand_logo_path,
+            draw_asset(
+                c,
+                brand_logo_asset,
                 logo_x,
                 logo_y,
                 width=max_logo_width,
                 height=max_logo_height,
                 preserveAspectRatio=True,
-                mask="auto",
             )
         except Exception as e:
-            print(f"Error loading brand logo: {e}")
-
-    # Draw the background starting from 4.9 cm
-    strip_path = "logos1/strip.png"  # Path to your background image file
-    try:
-        strip_x = x_start + 5 * cm
-        c.drawImage(
-            strip_path,
-            strip_x,
-            y_start + cell_height - 1.9 * cm,
-            width=cell_width - 13 * cm,  # Adjust width to fit the rest of the cell
-            height=cell_height / 2,
-            preserveAspectRatio=False,
-            mask="auto",
-        )
-    except Exception as e:
-        print(f"Error loading background image: {e}")
+            log_asset_error("brand logo", e)
 
     # Draw the model name area starting from 5.6 cm
     model_x_start = x_start + 5.6 * cm
-    c.setFont("Montserrat-Bold", 25)
+    model_size = fit_font_size(model_name, "Montserrat-Bold", 25, 16 * cm - 5.6 * cm)
+    c.setFont("Montserrat-Bold", model_size)
     c.setFillColorRGB(1, 1, 1)  # Dark green color
     c.drawString(model_x_start, y_start + cell_height - 1.4 * cm, model_name)
 
-    # if vegan == "YES":
-    #     vegan_path = "logos1/VEGAN.png"  # Path to store logo
+    # if tag.vegan:
+    #     vegan_asset = "VEGAN"  # Preloaded store logo
     #     vegan_x = x_start + 13.7 * cm
     #     try:
-    #         c.drawImage(
-    #             vegan_path,
+    #         draw_asset(
+    #             c,
+    #             vegan_asset,
     #             vegan_x,
     #             y_start + cell_height - 1.4 * cm,
     #             width=2.1 * cm,
@@ -488,12 +535,13 @@ def draw_kids_price_tag(c, x_start, y_start, cell_width, cell_height, row):
     #     except Exception as e:
     #         print(f"Error loading store logo: {e}")
 
-    # if grounding == "YES":
-    #     grounding_path = "logos1/grounding.png"  # Path to store logo
+    # if tag.grounding:
+    #     grounding_asset = "grounding"  # Preloaded store logo
     #     grounding_x = x_start + 14.7 * cm
     #     try:
-    #         c.drawImage(
-    #             grounding_path,
+    #         draw_asset(
+    #             c,
+    #             grounding_asset,
     #             grounding_x,
     #             y_start + cell_height - 1.4 * cm,
     #             width=2.1 * cm,
@@ -505,75 +553,64 @@ def draw_kids_price_tag(c, x_start, y_start, cell_width, cell_height, row):
     #         print(f"Error loading store logo: {e}")
 
     # Draw the color and sole thickness below the model name
-    c.setFont("Montserrat-SemiBold", 18)
+    color_size = _fit_color(tag, 16 * cm - 5.6 * cm)
+    c.setFont("Montserrat-SemiBold", color_size)
     c.setFillColorRGB(67 / 255, 75 / 255, 49 / 255)  # Dark green color
     color_y_position = y_start + cell_height - 2.55 * cm
     c.drawString(model_x_start, color_y_position, color)
 
     # Draw the sole thickness next to the color
     c.setFont("Montserrat-Regular", 18)
-    thickness_x = model_x_start + c.stringWidth(color, "Montserrat-SemiBold", 18) + 5
+    thickness_x = (
+        model_x_start + string_width(color, "Montserrat-SemiBold", color_size) + 5
+    )
     c.drawString(thickness_x + 0.25 * cm, color_y_position, f"{sole_thickness}mm")
 
-    formatted_thickness = (
-        f"{float(sole_thickness):.1f}mm"  # Ensure one digit after the dot
-    )
+    formatted_thickness = f"{sole_thickness}mm"
 
     # Calculate the x-position after the sole thickness for the icons
-    current_x_position = thickness_x + c.stringWidth(
+    current_x_position = thickness_x + string_width(
         formatted_thickness, "Montserrat-Regular", 18
     )
 
     # Draw the vegan icon if applicable
-    if vegan == "YES":
-        vegan_path = "logos1/VEGAN.png"  # Path to vegan logo
+    if tag.vegan:
+        vegan_asset = "VEGAN"  # Preloaded vegan logo
         try:
-            c.drawImage(
-                vegan_path,
+            draw_asset(
+                c,
+                vegan_asset,
                 current_x_position,
                 color_y_position,  # Align vertically (slightly below the text)
                 width=2.1 * cm,
                 height=0.75 * cm,
                 preserveAspectRatio=True,
-                mask="auto",
             )
             current_x_position += (
                 0.66 * cm + 0.4 * cm
             )  # Update the position for the next icon
         except Exception as e:
-            print(f"Error loading vegan icon: {e}")
+            log_asset_error("vegan icon", e)
 
     # Draw the grounding icon if applicable
-    if grounding == "YES":
-        grounding_path = "logos1/grounding.png"  # Path to grounding logo
+    if tag.grounding:
+        grounding_asset = "GROUNDING"  # Preloaded grounding logo
         try:
-            c.drawImage(
-                grounding_path,
+            draw_asset(
+                c,
+                grounding_asset,
                 current_x_position,
                 color_y_position,  # Align vertically (slightly below the text)
                 width=2.1 * cm,
                 height=0.75 * cm,
                 preserveAspectRatio=True,
-                mask="auto",
             )
         except Exception as e:
-            print(f"Error loading grounding icon: {e}")
-
-    valid_size_prices = []
-    for i in range(1, 5):
-        size_column = f"מידות{i}"
-        price_column = f"מחיר{i}"
-        size_range = str(row.get(size_column, "")).strip()
-        price_value = str(row.get(price_column, "")).strip()
-        if (
-            size_range
-            and price_value
-            and size_range.lower() != "nan"
-            and price_value.lower() != "nan"
-        ):
-            valid_size_prices.append((size_range, price_value))
-
-        # Only draw the table if there are valid size ranges
+            log_asset_error("grounding icon", e)
+
+    valid_size_prices = tag.size_prices
+
+    # Only draw the table if there are valid size ranges
     if valid_size_prices:
         # Set table position on the right side of the cell
         table_x_start = x_start + cell_width - 8 * cm
@@ -621,7 +658,6 @@ def draw_kids_price_tag(c, x_start, y_start, cell_width, cell_height, row):
             )
 
             # Draw the vertical line between columns
-            line_x = x_start + 4.9 * cm
             c.setDash([])  # Reset dash pattern
             c.setStrokeColorCMYK(0.38, 0.04, 1.0, 0.0)  # Bright green color
             c.setLineWidth(1)
@@ -635,24 +671,8 @@ def draw_kids_price_tag(c, x_start, y_start, cell_width, cell_height, row):
             # Move down for the next row
             table_y_start -= row_height
 
-    # Draw the store logo at 21.7 cm (1.8 cm wide)
-    store_logo_path = "logos1/store_logo_kids.png"  # Path to store logo
-    store_logo_x = x_start + 21.7 * cm
-    try:
-        c.drawImage(
-            store_logo_path,
-            store_logo_x,
-            y_start + (cell_height - 3 * cm) / 2,
-            width=2.1 * cm,
-            height=3 * cm,
-            preserveAspectRatio=True,
-            mask="auto",
-        )
-    except Exception as e:
-        print(f"Error loading store logo: {e}")
-
 
-def draw_kids_discount_price_tag(c, x_start, y_start, cell_width, cell_height, row):
+def draw_kids_discount_price_tag(c, x_start, y_start, cell_width, cell_height, tag):
     """
     Draws the price tag on the canvas.
 
@@ -661,151 +681,317 @@ def draw_kids_discount_price_tag(c, x_start, y_start, cell_width, cell_height, r
     :param y_start: The starting y-coordinate for the cell.
     :param cell_width: The width of the cell.
     :param cell_height: The height of the cell.
-    :param row: The row data containing model, color, price, etc.
+    :param tag: The normalized TagRecord with model, color, price, etc.
     """
-    # Extract the row data
-    model_name = str(row.get("דגם", "N/A")).upper()
-    color = str(row.get("צבע", "N/A")).upper()
-    price = str(row.get("מחיר", "N/A"))
-    brand_name = str(row.get("מותג"))
-
-    sole_thickness_value = row.get("עובי", "N/A")
-    vegan = str(row.get("טבעוני", "N/A")).upper()
-    grounding = str(row.get("הארקה", "N/A")).upper()
-
-    try:
-        # Convert the sole thickness to a float and format it with one digit after the dot
-        sole_thickness = f"{float(sole_thickness_value):.1f}"
-    except (ValueError, TypeError):
-        # Handle cases where sole_thickness_value is not a valid float
-        sole_thickness = "N/A"
+    # Unpack the normalized tag data
+    model_name = tag.model_name
+    color = tag.color
+    brand_name = tag.brand_name
+    sole_thickness = tag.sole_thickness
+
+    # Place the static border, backgrounds and store logo
+    draw_static_layer(
+        c, "kids_discount_price_tag", x_start, y_start, cell_width, cell_height
+    )
 
     # Draw the brand logo area (0 cm to 4.9 cm)
-    brand_logo_path = f"logos1/{brand_name}.png" if brand_name else None
-    if brand_logo_path and os.path.exists(brand_logo_path):
+    brand_logo_asset = brand_name if brand_name else None
+    if brand_logo_asset and has_asset(brand_logo_asset):
         try:
             max_logo_width = 4.2 * cm
             max_logo_height = cell_height - 0.6 * cm
             logo_x = x_start + (4.9 * cm - max_logo_width) / 2  # Center horizontally
             logo_y = y_start + (cell_height - max_logo_height) / 2  # Center vertically
-            c.drawImage(
-                brand_logo_path,
+            draw_asset(
+                c,
+                brand_logo_asset,
                 logo_x,
                 logo_y,
                 width=max_logo_width,
                 height=max_logo_height,
                 preserveAspectRatio=True,
-                mask="auto",
             )
         except Exception as e:
-            print(f"Error loading brand logo: {e}")
-
-    # Draw a vertical bright green line at 4.9 cm
-    line_x = x_start + 4.9 * cm
-    c.setDash([])  # Reset dash pattern
-    c.setStrokeColorCMYK(0.38, 0.04, 1.0, 0.0)  # Bright green color
-    c.setLineWidth(1)
-    c.line(line_x, y_start + 0.65 * cm, line_x, y_start + cell_height - 0.65 * cm)
+            log_asset_error("brand logo", e)
 
     # Draw the model name area starting from 5.6 cm
     model_x_start = x_start + 5.6 * cm
-    c.setFont("Montserrat-Bold", 25)
+    model_size = fit_font_size(model_name, "Montserrat-Bold", 25, 13.5 * cm - 5.6 * cm)
+    c.setFont("Montserrat-Bold", model_size)
     c.setFillColorRGB(67 / 255, 75 / 255, 49 / 255)  # Dark green color
     c.drawString(model_x_start, y_start + cell_height - 1.4 * cm, model_name)
 
-    if vegan == "YES":
-        vegan_path = "logos1/VEGAN.png"  # Path to store logo
+    if tag.vegan:
+        vegan_asset = "VEGAN"  # Preloaded store logo
         vegan_x = x_start + 13.7 * cm
         try:
-            c.drawImage(
-                vegan_path,
+            draw_asset(
+                c,
+                vegan_asset,
                 vegan_x,
                 y_start + cell_height - 1.4 * cm,
                 width=2.1 * cm,
                 height=0.62 * cm,
                 preserveAspectRatio=True,
-                mask="auto",
             )
         except Exception as e:
-            print(f"Error loading store logo: {e}")
+            log_asset_error("store logo", e)
 
-    if grounding == "YES":
-        grounding_path = "logos1/grounding.png"  # Path to store logo
+    if tag.grounding:
+        grounding_asset = "GROUNDING"  # Preloaded grounding logo
         grounding_x = x_start + 14.7 * cm
         try:
-            c.drawImage(
-                grounding_path,
+            draw_asset(
+                c,
+                grounding_asset,
                 grounding_x,
                 y_start + cell_height - 1.4 * cm,
                 width=2.1 * cm,
                 height=0.62 * cm,
                 preserveAspectRatio=True,
-                mask="auto",
             )
         except Exception as e:
-            print(f"Error loading store logo: {e}")
+            log_asset_error("store logo", e)
+
+    # Fit the price first, the color line has to end before it
+    formatted_price = tag.price
+    price_size = fit_font_size(
+        formatted_price, "Montserrat-SemiBold", 18, PRICE_BOX_WIDTH
+    )
+    price_text_width = string_width(formatted_price, "Montserrat-SemiBold", price_size)
+    color_size = _fit_color(tag, 20.5 * cm - price_text_width - 5.9 * cm, False)
 
     # Draw the color and sole thickness below the model name
-    c.setFont("Montserrat-SemiBold", 18)
+    c.setFont("Montserrat-SemiBold", color_size)
     color_y_position = y_start + cell_height - 2.55 * cm
     c.drawString(model_x_start, color_y_position, color)
 
     # Draw the sole thickness next to the color
     c.setFont("Montserrat-Regular", 18)
-    thickness_x = model_x_start + c.stringWidth(color, "Montserrat-SemiBold", 18) + 5
+    thickness_x = (
+        model_x_start + string_width(color, "Montserrat-SemiBold", color_size) + 5
+    )
     c.drawString(thickness_x + 0.25 * cm, color_y_position, f"{sole_thickness}mm")
 
     # Draw the price
     price_x = x_start + 20.5 * cm
-    try:
-        formatted_price = f"{float(price):,.2f}"
-    except ValueError:
-        formatted_price = price  # Fallback to original if conversion fails
 
     price_y_position = y_start + cell_height / 2
 
-    shekel_icon_path = "logos1/shekel.png"  # Path to your shekel symbol PNG file
+    shekel_icon_asset = "shekel"  # Preloaded shekel symbol
     shekel_icon_height = 0.35 * cm  # 4 mm height
     shekel_icon_width = shekel_icon_height * 1.2  # Keep aspect ratio
 
     font_size = 18
     text_height = font_size * 0.6
 
-    price_text_width = c.stringWidth(formatted_price, "Montserrat-SemiBold", font_size)
-
     try:
         # Draw the shekel symbol PNG
-        c.drawImage(
-            shekel_icon_path,
+        draw_asset(
+            c,
+            shekel_icon_asset,
             price_x - price_text_width,
             price_y_position - text_height / 2,  # Align vertically
             width=shekel_icon_width,
             height=shekel_icon_height,
             preserveAspectRatio=True,
-            mask="auto",
         )
 
         # Draw the formatted price next to the shekel symbol
         price_text_x = price_x + shekel_icon_width + 5  # Slight gap after icon
-        c.setFont("Montserrat-SemiBold", 18)
+        c.setFont("Montserrat-SemiBold", price_size)
         text_y_position = price_y_position - text_height / 2
         c.drawRightString(price_text_x, text_y_position, formatted_price)
 
     except Exception as e:
-        print(f"Error loading shekel icon: {e}")
+        log_asset_error("shekel icon", e)
 
-    # Draw the store logo at 21.7 cm (1.8 cm wide)
-    store_logo_path = "logos1/store_logo.png"  # Path to store logo
-    store_logo_x = x_start + 21.7 * cm
-    try:
-        c.drawImage(
-            store_logo_path,
-            store_logo_x,
-            y_start + (cell_height - 2.1 * cm) / 2,
-            width=2.1 * cm,
-            height=2.1 * cm,
-            preserveAspectRatio=True,
-            mask="auto",
-        )
-    except Exception as e:
-        print(f"Error loading store logo: {e}")
+
+def draw_children_price_tag(c, x_start, y_start, cell_width, cell_height, tag):
+    """
+    Draws the children price tag with the size/price table on the canvas.
+
+    :param c: The canvas object to draw on.
+    :param x_start: The starting x-coordinate for the cell.
+    :param y_start: The starting y-coordinate for the cell.
+    :param cell_width: The width of the cell.
+    :param cell_height: The height of the cell.
+    :param tag: The normalized TagRecord with model, color, price, etc.
+    """
+    model_name = tag.model_name
+    color = tag.color
+    # Printed as typed, unlike the other templates
+    sole_thickness = tag.thickness_text
+    brand_name = tag.brand_name
+
+    # Look up the preloaded brand logo
+    brand_logo_asset = brand_name if brand_name else None
+
+    # Draw cell border
+    c.setStrokeColor(colors.black)
+    c.setDash(1, 3)
+    c.rect(x_start, y_start, cell_width, cell_height, stroke=1, fill=0)
+
+    # Draw the brand logo on the left side with scaling if the logo exists
+    if brand_logo_asset and has_asset(brand_logo_asset):
+        try:
+            max_logo_width = 3.5 * cm
+            max_logo_height = 2.5 * cm
+            draw_asset(
+                c,
+                brand_logo_asset,
+                x_start + 0.4 * cm,
+                y_start + 0.4 * cm,
+                width=max_logo_width,
+                height=max_logo_height,
+                preserveAspectRatio=True,
+            )
+        except Exception as e:
+            log_asset_error("brand logo", e)
+    else:
+        # If logo does not exist, print the brand name as text
+        c.setFont("Poppins-Bold", 15)
+        c.drawString(x_start + 0.5 * cm, y_start + cell_height - 1.3 * cm, brand_name)
+
+    # Draw the model name at the top center using Poppins-Bold, between the
+    # brand logo and the size table, leaving room for the icons after it
+    model_name_position = x_start + cell_width / 2 - 1 * cm
+    left_room = model_name_position - (x_start + 4.2 * cm)
+    right_room = x_start + cell_width - 5.8 * cm - model_name_position
+    text_width = 2 * min(left_room, right_room)
+    if tag.vegan:
+        right_room -= 10 + 1.2 * cm + (1.5 * cm if tag.grounding else 0)
+        # The icons are placed after the name as if it were drawn at 36
+        right_room *= 32 / 36
+    model_size = fit_font_size(
+        model_name, "Poppins-Bold", 32, 2 * min(left_room, right_room)
+    )
+    c.setFont("Poppins-Bold", model_size)
+    c.drawCentredString(
+        model_name_position, y_start + cell_height - 1.3 * cm, model_name
+    )
+
+    # Add vegan "V" icon in green if applicable, right after the model name
+    vegan_icon_x = None
+    if tag.vegan:
+        try:
+            vegan_icon_asset = "VEGAN"  # Preloaded VEGAN logo
+            name_width = string_width(model_name, "Poppins-Bold", model_size * 36 / 32)
+            vegan_icon_x = model_name_position + name_width / 2 + 10
+            draw_asset(
+                c,
+                vegan_icon_asset,
+                vegan_icon_x,
+                y_start + cell_height - 1.4 * cm,
+                width=1.2 * cm,
+                height=1.2 * cm,
+                preserveAspectRatio=True,
+            )
+        except Exception as e:
+            log_asset_error("vegan icon", e)
+
+    # Add grounding icon next to the vegan icon if applicable
+    if tag.grounding and vegan_icon_x:
+        try:
+            grounding_icon_asset = "GROUNDING"  # Preloaded GROUNDING logo
+            grounding_icon_x = vegan_icon_x + 1.5 * cm
+            draw_asset(
+                c,
+                grounding_icon_asset,
+                grounding_icon_x,
+                y_start + cell_height - 1.4 * cm,
+                width=1.2 * cm,
+                height=1.2 * cm,
+                preserveAspectRatio=True,
+            )
+        except Exception as e:
+            log_asset_error("grounding icon", e)
+
+    # Calculate the total width of the color and sole thickness together
+    thickness_text = f" | {sole_thickness}mm"
+    thickness_width = string_width(thickness_text, "Poppins-Regular", 22)
+    color_size = fit_font_size(color, "Poppins-Bold", 22, text_width - thickness_width)
+    color_width = string_width(color, "Poppins-Bold", color_size)
+
+    # Total width of the combined text
+    total_text_width = color_width + thickness_width
+
+    # Calculate the starting point to center the combined text
+    start_x = x_start + (cell_width - total_text_width) / 2 - 1 * cm
+
+    # Draw the color in bold
+    c.setFont("Poppins-Bold", color_size)
+    c.drawString(start_x, y_start + 0.7 * cm, f"{color}")
+
+    # Draw the sole thickness in regular right after the color
+    c.setFont("Poppins-Regular", 22)
+    c.drawString(start_x + color_width, y_start + 0.7 * cm, thickness_text)
+
+    # Valid size ranges were collected during normalization
+    valid_size_prices = tag.size_prices
+
+    # Only draw the table if there are valid size ranges
+    if valid_size_prices:
+        # Set table position on the right side of the cell
+        table_x_start = x_start + cell_width - 5.5 * cm
+
+        # Adjust cell size and font size based on the number of valid size-price pairs
+        if len(valid_size_prices) == 4:
+            table_y_start = y_start + cell_height - 0.65 * cm
+            font_size = 14
+            row_height = 0.69 * cm
+        elif len(valid_size_prices) == 3:
+            table_y_start = y_start + cell_height - 0.675 * cm
+            font_size = 16
+            row_height = 0.95 * cm
+        else:
+            table_y_start = y_start + cell_height - 1 * cm
+            font_size = 18
+            row_height = 1.2 * cm
+
+        # Set stroke color and dash style for the table border
+        c.setStrokeColor(colors.grey)
+        c.setDash(1, 3)
+
+        # Draw size ranges and prices as table rows
+        for size_range, price_value in valid_size_prices:
+            # Set font size for size range
+            c.setFont("Poppins-Regular", font_size)
+
+            # Calculate the vertical position to center the text within the row
+            text_height = (
+                font_size * 0.3527
+            )  # Convert font size to points height (approximation)
+            vertical_center_y = table_y_start - (row_height - text_height) / 2
+
+            # Draw size range and price, centered vertically in the row
+            c.drawCentredString(
+                table_x_start + 1.2 * cm, vertical_center_y + 0.1 * cm, size_range
+            )
+
+            # Set font size for price value
+            c.setFont("Poppins-Bold", font_size)
+            c.drawCentredString(
+                table_x_start + 4.2 * cm,
+                vertical_center_y + 0.1 * cm,
+                f"{price_value}₪",
+            )
+
+            # Draw dotted rectangle around the table row
+            c.rect(
+                table_x_start - 0.2 * cm,
+                table_y_start - row_height / 2,
+                5.5 * cm,
+                row_height,
+            )
+
+            # Draw the vertical line between columns
+            c.line(
+                table_x_start + 2.75 * cm,  # Middle point of the row (split columns)
+                table_y_start + row_height / 2,
+                table_x_start + 2.75 * cm,
+                table_y_start - row_height / 2,
+            )
+
+            # Move down for the next row
+            table_y_start -= row_height
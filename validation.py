@@ -0,0 +1,262 @@
+"""
+Checks a catalog for rows that would print wrong before any of it is drawn.
+
+The CSV is split into columns and every column is checked as a whole; each
+distinct value is only checked once, so a brand or price repeated over
+thousands of rows costs one lookup. The problems are collected into a
+CatalogReport, which the web endpoints return as a JSON body or summarize in
+the X-Catalog-Problems header of the PDF response.
+"""
+
+import csv
+import io
+import itertools
+from collections import Counter
+
+from assets import has_asset
+from ingest import NA_VALUES, parse_number
+from records import (
+    BRAND_COLUMN,
+    DISCOUNT_COLUMN,
+    MAX_COPIES,
+    PRICE_COLUMN,
+    QUANTITY_COLUMN,
+    SIZE_COLUMNS,
+    SIZE_PRICE_COLUMNS,
+    THICKNESS_COLUMN,
+)
+
+# Problems listed one by one in the report; the rest are only counted
+MAX_REPORTED_ISSUES = 200
+
+PRICE = "price"
+THICKNESS = "thickness"
+BRAND = "brand"
+DISCOUNT = "discount"
+SIZE_PAIR = "size_pair"
+QUANTITY = "quantity"
+
+
+def _missing(value):
+    return value.strip() in NA_VALUES
+
+
+def _bad_price(value):
+    return _missing(value) or parse_number(value) is None
+
+
+def _bad_number(value):
+    return not _missing(value) and parse_number(value) is None
+
+
+def _unknown_brand(value):
+    return not _missing(value) and not has_asset(value)
+
+
+def _bad_quantity(value):
+    if _missing(value):
+        return False
+    copies = parse_number(value)
+    return copies is not None and copies > MAX_COPIES
+
+
+def _bad_discount(value):
+    if _missing(value):
+        return False
+    discount = parse_number(value)
+    return discount is None or not 0 < discount < 100
+
+
+class CatalogReport:
+    """
+    The problems found in a catalog, by row.
+    """
+
+    def __init__(self, rows, tags=None):
+        self.rows = rows
+        # Printed copies of all rows, the tags the catalog renders to
+        self.tags = rows if tags is None else tags
+        self.counts = {}
+        self.issues = []
+
+    def add(self, problem, column, rows, values):
+        """
+        :param problem: The kind of problem, such as "price".
+        :param column: The column the problem is in.
+        :param rows: The 1-based data row numbers that have the problem.
+        :param values: The offending value of every one of those rows.
+        """
+        if not rows:
+            return
+        self.counts[problem] = self.counts.get(problem, 0) + len(rows)
+        room = MAX_REPORTED_ISSUES - len(self.issues)
+        for row, value in itertools.islice(zip(rows, values), max(0, room)):
+            self.issues.append(
+                {"row": row, "column": column, "problem": problem, "value": value}
+            )
+
+    @property
+    def problem_count(self):
+        return sum(self.counts.values())
+
+    def summary(self):
+        """
+        The problem counts as a header value, such as "brand=12, price=3".
+        """
+        return ", ".join(
+            f"{problem}={count}" for problem, count in sorted(self.counts.items())
+        )
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "tags": self.tags,
+            "problem_count": self.problem_count,
+            "problems": self.counts,
+            "issues": sorted(self.issues, key=lambda issue: issue["row"]),
+            "truncated": self.problem_count > len(self.issues),
+        }
+
+
+def count_rows(csv_data):
+    """
+    Counts the data rows of the CSV text without splitting them into
+    columns.
+
+    :param csv_data: The CSV text.
+    :return: The number of data rows, blank lines not counted, or 0 if the
+        CSV cannot be read.
+    """
+    reader = csv.reader(io.StringIO(csv_data))
+    try:
+        next(reader, None)
+        return sum(1 for row in reader if row)
+    except csv.Error as e:
+        print(f"Error processing CSV: {e}")
+        return 0
+
+
+def read_columns(csv_data):
+    """
+    Splits the CSV text into columns.
+
+    :param csv_data: The CSV text.
+    :return: The number of data rows and a dict mapping every column name to
+        its list of cells, or None if the CSV has no header.
+    """
+    reader = csv.reader(io.StringIO(csv_data))
+    header = next(reader, None)
+    if not header:
+        return None
+    header[0] = header[0].lstrip("\ufeff")
+
+    # Blank lines are skipped, as when the catalog is rendered
+    rows = [row for row in reader if row]
+    cells = list(itertools.zip_longest(*rows, fillvalue=""))
+    columns = {}
+    for i, name in enumerate(header):
+        if name not in columns:
+            columns[name] = cells[i] if i < len(cells) else ("",) * len(rows)
+    return len(rows), columns
+
+
+def _check(report, problem, columns, column, is_bad):
+    values = columns.get(column)
+    if values is None:
+        return
+    verdicts = {value: is_bad(value) for value in set(values)}
+    rows = [i for i, value in enumerate(values, 1) if verdicts[value]]
+    report.add(problem, column, rows, [values[row - 1] for row in rows])
+
+
+def _check_size_pairs(report, columns):
+    for size_column, price_column in zip(SIZE_COLUMNS, SIZE_PRICE_COLUMNS):
+        sizes = columns.get(size_column)
+        prices = columns.get(price_column)
+        if sizes is None and prices is None:
+            continue
+        sizes = sizes or ("",) * report.rows
+        prices = prices or ("",) * report.rows
+        missing_size = {value: _missing(value) for value in set(sizes)}
+        missing_price = {value: _missing(value) for value in set(prices)}
+        bad_price = {value: _bad_number(value) for value in set(prices)}
+        # A size without a price, a price without a size, or a price that
+        # is not a number are all left off the tag
+        rows = [
+            i
+            for i, (size, price) in enumerate(zip(sizes, prices), 1)
+            if missing_size[size] != missing_price[price]
+            or (not missing_size[size] and bad_price[price])
+        ]
+        report.add(
+            SIZE_PAIR,
+            f"{size_column}/{price_column}",
+            rows,
+            [f"{sizes[row - 1]}/{prices[row - 1]}" for row in rows],
+        )
+
+
+def count_tags(rows, columns):
+    """
+    Counts the tags a catalog renders to: the quantity of every row, up to
+    MAX_COPIES, or one copy where it is missing or not a number, as when it
+    is drawn.
+    """
+    cells = columns.get(QUANTITY_COLUMN)
+    if cells is None:
+        return rows
+    tags = 0
+    for value, times in Counter(cells).items():
+        copies = parse_number(value)
+        tags += times * (
+            min(MAX_COPIES, max(0, int(copies))) if copies is not None else 1
+        )
+    return tags
+
+
+def prints_price(template, columns):
+    """
+    :param template: The template name, or None for any template.
+    :param columns: The column names of the catalog.
+    :return: Whether the template prints the price column. The children
+        template, and the kids template for catalogs without a discount
+        column, print a table of size prices instead, see
+        bot.template_draw_tag.
+    """
+    if template == "children":
+        return False
+    if template == "kids":
+        return DISCOUNT_COLUMN in columns
+    return True
+
+
+def validate_csv(csv_data, template=None):
+    """
+    Checks every row of the catalog for prices and sole thicknesses that are
+    not numbers, brands without a logo, discounts that are not a percentage,
+    quantities over MAX_COPIES and size ranges without a price or the other
+    way around.
+
+    :param csv_data: The CSV text.
+    :param template: The template the catalog is rendered with; prices are
+        only checked if it prints them. Every column is checked if None.
+    :return: The CatalogReport, or None if the CSV has no header.
+    """
+    try:
+        read = read_columns(csv_data)
+    except csv.Error as e:
+        print(f"Error processing CSV: {e}")
+        return None
+    if read is None:
+        return None
+
+    rows, columns = read
+    report = CatalogReport(rows, count_tags(rows, columns))
+    if prints_price(template, columns):
+        _check(report, PRICE, columns, PRICE_COLUMN, _bad_price)
+    _check(report, THICKNESS, columns, THICKNESS_COLUMN, _bad_number)
+    _check(report, BRAND, columns, BRAND_COLUMN, _unknown_brand)
+    _check(report, DISCOUNT, columns, DISCOUNT_COLUMN, _bad_discount)
+    _check(report, QUANTITY, columns, QUANTITY_COLUMN, _bad_quantity)
+    _check_size_pairs(report, columns)
+    return report
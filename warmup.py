@@ -0,0 +1,103 @@
+"""
+Warm start for the web server.
+
+Importing the renderer registers the fonts and decodes the logos; warm_up()
+then renders one dummy tag with every template so the font subsets, static
+layers and code paths are exercised before the first request, and the logos
+are re-encoded for previews and for every output profile that does not use
+them as loaded. Run in the gunicorn master (gunicorn --preload), the workers
+forked from it share all of this copy-on-write instead of each paying for it
+again.
+"""
+
+import gc
+import os
+import time
+
+from assets import ASSET_INDEX
+from bot import render_tags
+from ingest import read_catalog
+from preview import PREVIEW_DPI, can_preview, preview_profile
+from profiles import PROFILES
+from records import (
+    BRAND_COLUMN,
+    COLOR_COLUMN,
+    DISCOUNT_COLUMN,
+    MODEL_COLUMN,
+    PRICE_COLUMN,
+    SIZE_COLUMNS,
+    SIZE_PRICE_COLUMNS,
+    THICKNESS_COLUMN,
+    VEGAN_COLUMN,
+)
+from utils import (
+    draw_children_price_tag,
+    draw_discount_price_tag,
+    draw_kids_discount_price_tag,
+    draw_kids_price_tag,
+    draw_price_tag,
+)
+
+WARM_START = os.environ.get("WARM_START", "1").lower() in ("1", "true", "yes")
+
+# Filled in by warm_up() and reported by the readiness endpoint
+WARMUP = {"ready": False, "seconds": None, "pid": None}
+
+
+# One row with every field the templates draw
+DUMMY_ROW = {
+    MODEL_COLUMN: "warm up",
+    COLOR_COLUMN: "black",
+    PRICE_COLUMN: "399",
+    DISCOUNT_COLUMN: "20",
+    BRAND_COLUMN: "XERO",
+    THICKNESS_COLUMN: "5",
+    VEGAN_COLUMN: "yes",
+    SIZE_COLUMNS[0]: "20-22",
+    SIZE_PRICE_COLUMNS[0]: "199",
+}
+
+
+def _dummy_tag():
+    csv_data = ",".join(DUMMY_ROW) + "\n" + ",".join(DUMMY_ROW.values()) + "\n"
+    return next(iter(read_catalog(csv_data)))
+
+
+def warm_up(started=None):
+    """
+    Renders a dummy tag with every template and records how long the warm
+    start took.
+
+    :param started: The time.perf_counter() value to count from, such as
+        the start of the imports that load the fonts and logos. Defaults to
+        the start of this call.
+    :return: The WARMUP status dict.
+    """
+    started = started if started is not None else time.perf_counter()
+    tag = _dummy_tag()
+    for draw_tag in (
+        draw_price_tag,
+        draw_discount_price_tag,
+        draw_kids_price_tag,
+        draw_kids_discount_price_tag,
+        draw_children_price_tag,
+    ):
+        render_tags([tag], draw_tag)
+    profiles = list(PROFILES.values())
+    if can_preview():
+        profiles.append(preview_profile(PREVIEW_DPI))
+    for profile in profiles:
+        if profile.asset_variant is not None:
+            ASSET_INDEX.warm(profile.asset_variant)
+
+    # Keep the garbage collector from touching, and so copying, the
+    # objects the workers inherit
+    gc.freeze()
+
+    WARMUP.update(
+        ready=True,
+        seconds=round(time.perf_counter() - started, 3),
+        pid=os.getpid(),
+    )
+    print(f"Warm start finished in {WARMUP['seconds']}s")
+    return WARMUP